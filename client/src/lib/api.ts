@@ -106,10 +106,23 @@ export interface PollutionReport {
   image_key: string | null;
   image_size: number | null;
   mime_type: string | null;
+  display_key: string | null;
+  thumbnail_keys: Record<string, string> | null;
+  display_url: string | null;
+  thumbnail_urls: Record<string, string>;
   status: string;
   created_at: string;
 }
 
+export interface ReportCluster {
+  cell: string;
+  count: number;
+  lat: number;
+  lon: number;
+  bounds: [number, number, number, number];
+  statuses: Record<string, number>;
+}
+
 export interface SubmitReportPayload {
   description: string;
   lat: number;
@@ -133,17 +146,38 @@ export const reportApi = {
     return data.report;
   },
 
-  list: async (limit = 20, offset = 0): Promise<PollutionReport[]> => {
+  list: async (limit = 20): Promise<PollutionReport[]> => {
+    return (await reportApi.listPage(limit)).reports;
+  },
+
+  listPage: async (
+    limit = 20,
+    cursor?: string | null,
+  ): Promise<{ reports: PollutionReport[]; next_cursor: string | null }> => {
+    const params = new URLSearchParams({ limit: String(limit) });
+    if (cursor) params.set("cursor", cursor);
     const { data } = await api.get<{
       status: string;
       reports: PollutionReport[];
-    }>(`/user/reports?limit=${limit}&offset=${offset}`);
-    return data.reports;
+      next_cursor: string | null;
+    }>(`/user/reports?${params}`);
+    return { reports: data.reports, next_cursor: data.next_cursor };
   },
 
   delete: async (reportId: number): Promise<void> => {
     await api.delete(`/user/reports/${reportId}`);
   },
+
+  clusters: async (
+    bbox: [number, number, number, number],
+    zoom: number,
+  ): Promise<ReportCluster[]> => {
+    const { data } = await api.get<{
+      status: string;
+      data: ReportCluster[];
+    }>(`/reports/clusters?bbox=${bbox.join(",")}&zoom=${zoom}`);
+    return data.data;
+  },
 };
 
 // ─── User Profile & Health ─────────────────────────────────────────────────────
@@ -200,3 +234,59 @@ export const userApi = {
     return data.profile;
   },
 };
+
+// ─── Exposure Alerts ───────────────────────────────────────────────────────────
+
+export interface AlertSubscription {
+  id: number;
+  user_id: number;
+  label: string | null;
+  lat: number;
+  lon: number;
+  threshold: number | null;
+  threshold_source: "custom" | "health_profile";
+  effective_threshold: number;
+  active: boolean;
+  alert_state: string | null;
+  alerted_at: string | null;
+  created_at: string;
+}
+
+export interface AlertNotification {
+  id: number;
+  subscription_id: number | null;
+  node_id: number | null;
+  horizon: "now" | "6h" | "12h" | "24h";
+  aqi: number;
+  threshold: number;
+  risk_level: string;
+  read_at: string | null;
+  created_at: string;
+}
+
+export const alertsApi = {
+  listSubscriptions: async (): Promise<AlertSubscription[]> => {
+    const { data } = await api.get<{ data: AlertSubscription[] }>("/alerts/subscriptions");
+    return data.data;
+  },
+
+  subscribe: async (payload: { lat: number; lon: number; label?: string; threshold?: number | null }): Promise<AlertSubscription> => {
+    const { data } = await api.post<{ data: AlertSubscription }>("/alerts/subscriptions", payload);
+    return data.data;
+  },
+
+  unsubscribe: async (subscriptionId: number): Promise<void> => {
+    await api.delete(`/alerts/subscriptions/${subscriptionId}`);
+  },
+
+  notifications: async (after = 0): Promise<{ data: AlertNotification[]; last_id: number }> => {
+    const { data } = await api.get<{ data: AlertNotification[]; last_id: number }>(
+      `/alerts/notifications?after=${after}`,
+    );
+    return { data: data.data, last_id: data.last_id };
+  },
+
+  markRead: async (upTo: number): Promise<void> => {
+    await api.post("/alerts/notifications/read", { up_to: upTo });
+  },
+};
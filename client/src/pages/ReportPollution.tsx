@@ -111,14 +111,16 @@ export default function ReportPollution() {
                             </div>
 
                             {/* Image confirmation */}
-                            {submittedReport?.image_url && (
+                            {submittedReport?.image_key && (
                                 <div className="flex items-center justify-center gap-3 bg-slate-50 rounded-xs p-4 border border-slate-200">
-                                    <img
-                                        src={submittedReport.image_url}
-                                        alt="Submitted evidence"
-                                        className="w-20 h-20 rounded-xs object-cover border border-slate-200"
-                                        onError={(e) => { (e.target as HTMLImageElement).style.display = 'none' }}
-                                    />
+                                    {submittedReport.display_url && (
+                                        <img
+                                            src={submittedReport.display_url}
+                                            alt="Submitted evidence"
+                                            className="w-20 h-20 rounded-xs object-cover border border-slate-200"
+                                            onError={(e) => { (e.target as HTMLImageElement).style.display = 'none' }}
+                                        />
+                                    )}
                                     <div className="text-left">
                                         <p className="text-sm font-semibold text-slate-700">Image uploaded</p>
                                         <p className="text-xs text-slate-400 mt-0.5">
@@ -1,20 +1,27 @@
 """
 AirSense — XGBoost AQI Forecasting Pipeline
 Trains three separate regressors for +6h, +12h, +24h AQI prediction.
+
+pandas, scikit-learn, XGBoost, joblib and matplotlib are imported where they
+are used, so serving code that only loads models or classifies risk does not
+pay for the training stack at import time.
 """
 
+from __future__ import annotations
+
+import hashlib
 import json
+import mmap
 import warnings
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import joblib
 
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, mean_absolute_error
-from xgboost import XGBRegressor
+if TYPE_CHECKING:
+    import pandas as pd
+    from xgboost import XGBRegressor
 
 warnings.filterwarnings("ignore")
 
@@ -30,6 +37,11 @@ MODEL_PARAMS = dict(
     n_jobs=1,
 )
 
+METRICS_PATH = Path(__file__).parent / "performance_metrics.json"
+
+# Written by ML/tuning.py; overrides MODEL_PARAMS when present
+BEST_PARAMS_PATH = Path(__file__).parent / "best_params.json"
+
 FEATURE_COLS: list[str] = []  
 HORIZONS = {
     "6h":  6,
@@ -42,6 +54,8 @@ HORIZONS = {
 
 def load_and_preprocess(path: str) -> pd.DataFrame:
     """Load CSV, sort globally by timestamp, and engineer features."""
+    import pandas as pd
+
     df = pd.read_csv(path)
 
     required = {"lat", "lon", "pm25", "no2", "o3",
@@ -136,24 +150,45 @@ def add_targets(df: pd.DataFrame) -> pd.DataFrame:
 # 3. Model Training & Evaluation ─
 
 def _rmse(y_true, y_pred) -> float:
+    from sklearn.metrics import mean_squared_error
+
     return float(np.sqrt(mean_squared_error(y_true, y_pred)))
 
 
+def resolve_model_params() -> dict:
+    """MODEL_PARAMS overlaid with the tuned parameters from ML/tuning.py, if any."""
+    if not BEST_PARAMS_PATH.exists():
+        return dict(MODEL_PARAMS)
+    with open(BEST_PARAMS_PATH) as f:
+        return {**MODEL_PARAMS, **json.load(f)}
+
+
+def make_split_indices(n_rows: int) -> tuple[np.ndarray, np.ndarray]:
+    """Train/test row indices shared by every horizon and cached for evaluation."""
+    from sklearn.model_selection import train_test_split
+
+    return train_test_split(np.arange(n_rows), test_size=0.2, random_state=42, shuffle=True)
+
+
 def train_model(
     df: pd.DataFrame,
     feature_cols: list[str],
     target_col: str,
     horizon_label: str,
+    split: tuple[np.ndarray, np.ndarray] | None = None,
 ) -> XGBRegressor:
     """Train and evaluate one XGBRegressor; return the fitted model."""
+    from sklearn.metrics import mean_absolute_error
+    from xgboost import XGBRegressor
+
     X = df[feature_cols].values
     y = df[target_col].values
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, shuffle=True
-    )
+    train_idx, test_idx = split if split is not None else make_split_indices(len(df))
+    X_train, X_test = X[train_idx], X[test_idx]
+    y_train, y_test = y[train_idx], y[test_idx]
 
-    model = XGBRegressor(**MODEL_PARAMS)
+    model = XGBRegressor(**resolve_model_params())
     model.fit(X_train, y_train, eval_set=[(X_test, y_test)], verbose=False)
 
     y_pred = model.predict(X_test)
@@ -164,22 +199,25 @@ def train_model(
     return model, {"RMSE": rmse, "MAE": mae}
 
 
-def train_all_models(df: pd.DataFrame, feature_cols: list[str]) -> dict[str, XGBRegressor]:
+def train_all_models(
+    df: pd.DataFrame,
+    feature_cols: list[str],
+    split: tuple[np.ndarray, np.ndarray] | None = None,
+) -> dict[str, XGBRegressor]:
     """Train one model per forecast horizon and return them in a dict."""
     models: dict[str, XGBRegressor] = {}
     metrics: dict[str, dict] = {}
 
     print("── Training XGBoost AQI Forecast Models ──")
     for label in HORIZONS:
-        model, model_metrics = train_model(df, feature_cols, f"aqi_{label}", label)
+        model, model_metrics = train_model(df, feature_cols, f"aqi_{label}", label, split=split)
         models[label] = model
         metrics[label] = model_metrics
     print("── Training complete ──\n")
     
-    metrics_path = Path(__file__).parent / "performance_metrics.json"
-    with open(metrics_path, "w") as f:
+    with open(METRICS_PATH, "w") as f:
         json.dump(metrics, f, indent=4)
-    print(f"Metrics saved → {metrics_path}")
+    print(f"Metrics saved → {METRICS_PATH}")
 
     return models
 
@@ -233,17 +271,161 @@ def predict_future_risk(
 
 # 6. Model Persistence 
 
-def save_models(models: dict[str, XGBRegressor], prefix: str = "aqi_model") -> None:
-    """Persist each model to disk with joblib."""
+MODEL_DIR = Path(__file__).parent
+DEFAULT_PREFIX = str(MODEL_DIR / "aqi_model")
+MODEL_FORMATS = ("joblib", "ubj")
+
+def _manifest_path(prefix: str) -> Path:
+    return Path(f"{prefix}_manifest.json")
+
+
+def _sha256(buffer) -> str:
+    return hashlib.sha256(buffer).hexdigest()
+
+
+def _file_sha256(path: Path) -> str:
+    """Checksum a file through a read-only mmap (page cache, no private copy)."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        return _sha256(buf)
+
+
+def save_models(
+    models: dict[str, XGBRegressor],
+    prefix: str = DEFAULT_PREFIX,
+    fmt: str = "joblib",
+    feature_cols: list[str] | None = None,
+    metadata: dict | None = None,
+) -> None:
+    """
+    Persist each model to disk.
+
+    fmt="joblib" pickles the sklearn wrapper (legacy format).
+    fmt="ubj" writes XGBoost's native UBJSON booster per horizon plus a
+    ``<prefix>_manifest.json`` holding the feature list, horizons, training
+    metadata and a sha256 checksum of every booster file.
+    """
+    if fmt not in MODEL_FORMATS:
+        raise ValueError(f"Unknown model format {fmt!r}. Expected one of {MODEL_FORMATS}")
+
+    if fmt == "joblib":
+        import joblib
+
+        for label, model in models.items():
+            path = f"{prefix}_{label}.joblib"
+            joblib.dump(model, path)
+            print(f"Saved → {path}")
+        return
+
+    import xgboost
+
+    manifest = {
+        "format": "ubj",
+        "xgboost_version": xgboost.__version__,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "feature_cols": list(feature_cols or build_feature_list()),
+        "horizons": {label: HORIZONS[label] for label in models},
+        "metadata": metadata or {},
+        "models": {},
+    }
     for label, model in models.items():
-        path = f"{prefix}_{label}.joblib"
-        joblib.dump(model, path)
+        path = Path(f"{prefix}_{label}.ubj")
+        model.get_booster().save_model(str(path))
+        manifest["models"][label] = {
+            "file": path.name,
+            "sha256": _file_sha256(path),
+            "bytes": path.stat().st_size,
+        }
         print(f"Saved → {path}")
 
+    manifest_path = _manifest_path(prefix)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    print(f"Saved → {manifest_path}")
 
-def load_models(prefix: str = "aqi_model") -> dict[str, XGBRegressor]:
-    """Load all three models from disk."""
-    return {label: joblib.load(f"{prefix}_{label}.joblib") for label in HORIZONS}
+
+def load_manifest(prefix: str = DEFAULT_PREFIX) -> dict:
+    """Read the JSON manifest written by ``save_models(fmt="ubj")``."""
+    with open(_manifest_path(prefix)) as f:
+        return json.load(f)
+
+
+def load_models(
+    prefix: str = DEFAULT_PREFIX,
+    fmt: str | None = None,
+    verify: bool = True,
+) -> dict[str, XGBRegressor]:
+    """
+    Load all three models from disk.
+
+    With fmt=None the native format is used when a manifest exists, falling
+    back to joblib otherwise. Native boosters are checksummed through a
+    read-only mmap and handed to XGBoost by path, so no Python-side copy of
+    the file is made; XGBoost parses it into its own (per-process) tree
+    structures. Loading in the WSGI master before forking (gunicorn
+    --preload) shares those pages copy-on-write between workers.
+    """
+    if fmt is None:
+        fmt = "ubj" if _manifest_path(prefix).exists() else "joblib"
+    if fmt not in MODEL_FORMATS:
+        raise ValueError(f"Unknown model format {fmt!r}. Expected one of {MODEL_FORMATS}")
+
+    if fmt == "joblib":
+        import joblib
+
+        return {label: joblib.load(f"{prefix}_{label}.joblib") for label in HORIZONS}
+
+    manifest = load_manifest(prefix)
+    base_dir = _manifest_path(prefix).parent
+
+    from xgboost import XGBRegressor
+
+    models: dict[str, XGBRegressor] = {}
+    for label, entry in manifest["models"].items():
+        path = base_dir / entry["file"]
+        if verify and _file_sha256(path) != entry["sha256"]:
+            raise ValueError(f"Checksum mismatch for {entry['file']} — model file is corrupt or stale")
+
+        model = XGBRegressor()
+        model.load_model(str(path))
+        models[label] = model
+    return models
+
+
+def save_split(
+    df: pd.DataFrame,
+    feature_cols: list[str],
+    split: tuple[np.ndarray, np.ndarray],
+    prefix: str = DEFAULT_PREFIX,
+) -> None:
+    """
+    Cache the train/test indices next to the models, together with the
+    held-out feature matrix and targets for every horizon, so evaluation
+    never has to re-run preprocessing or re-derive the split.
+    """
+    train_idx, test_idx = split
+    path = Path(f"{prefix}_split.npz")
+    np.savez(
+        path,
+        train_idx=train_idx,
+        test_idx=test_idx,
+        X_test=df[feature_cols].values[test_idx],
+        Y_test=df[[f"aqi_{label}" for label in HORIZONS]].values[test_idx],
+        labels=np.array(list(HORIZONS)),
+        feature_cols=np.array(feature_cols),
+    )
+    print(f"Saved → {path}")
+
+
+def load_split(prefix: str = DEFAULT_PREFIX) -> dict | None:
+    """Return the cached split written by ``save_split``, or None if absent."""
+    path = Path(f"{prefix}_split.npz")
+    if not path.exists():
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        split = {key: data[key] for key in data.files}
+    split["labels"] = [str(label) for label in split["labels"]]
+    split["feature_cols"] = [str(col) for col in split["feature_cols"]]
+    return split
 
 
 # 7. Feature Importance Plot 
@@ -254,6 +436,9 @@ def plot_feature_importance(
     top_n: int = 15,
 ) -> None:
     """Side-by-side bar charts of feature importance for all three horizons."""
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
     fig, axes = plt.subplots(1, len(models), figsize=(6 * len(models), 6))
     fig.suptitle("XGBoost Feature Importances — AQI Forecast", fontsize=14, y=1.02)
 
@@ -285,11 +470,19 @@ def main() -> None:
     # Define features
     feature_cols = build_feature_list()
 
-    # Train
-    models = train_all_models(df, feature_cols)
+    # Train — one split shared by all horizons
+    split = make_split_indices(len(df))
+    models = train_all_models(df, feature_cols, split=split)
 
-    # Persist
+    # Persist — legacy joblib pickles plus the native UBJSON + manifest format
     save_models(models)
+    save_models(
+        models,
+        fmt="ubj",
+        feature_cols=feature_cols,
+        metadata={"rows": len(df), "params": resolve_model_params()},
+    )
+    save_split(df, feature_cols, split)
 
     # Feature importance chart
     plot_feature_importance(models, feature_cols)
@@ -0,0 +1,73 @@
+"""
+Benchmark model load time and memory: joblib pickles vs native UBJSON.
+
+Each format is loaded in a fresh interpreter so import cost and RSS are not
+polluted by the other run. Run from the server directory after training:
+
+    python -m ML.bench_model_load --repeat 5
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from ML.aqi_forecast import DEFAULT_PREFIX, MODEL_FORMATS
+
+_CHILD = r"""
+import json, resource, sys, time
+t0 = time.perf_counter()
+from ML.aqi_forecast import load_models
+t1 = time.perf_counter()
+models = load_models(prefix=sys.argv[1], fmt=sys.argv[2])
+t2 = time.perf_counter()
+with open("/proc/self/statm") as f:
+    rss_pages = int(f.read().split()[1])
+import os
+print(json.dumps({
+    "import_s": t1 - t0,
+    "load_s": t2 - t1,
+    "rss_mb": rss_pages * os.sysconf("SC_PAGE_SIZE") / 2**20,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "models": len(models),
+}))
+"""
+
+
+def _run_once(prefix: str, fmt: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD, prefix, fmt],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def benchmark(prefix: str = DEFAULT_PREFIX, repeat: int = 5) -> dict[str, dict]:
+    """Return median timings and RSS for every model format."""
+    results: dict[str, dict] = {}
+    for fmt in MODEL_FORMATS:
+        runs = [_run_once(prefix, fmt) for _ in range(repeat)]
+        results[fmt] = {
+            key: round(statistics.median(r[key] for r in runs), 4)
+            for key in ("import_s", "load_s", "rss_mb", "peak_rss_mb")
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--prefix", default=DEFAULT_PREFIX)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = benchmark(args.prefix, args.repeat)
+    print(f"{'format':<8} {'import (s)':>11} {'load (s)':>9} {'RSS (MB)':>9} {'peak (MB)':>10}")
+    for fmt, r in results.items():
+        print(f"{fmt:<8} {r['import_s']:>11.4f} {r['load_s']:>9.4f} {r['rss_mb']:>9.1f} {r['peak_rss_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
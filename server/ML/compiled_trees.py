@@ -0,0 +1,221 @@
+"""
+Pure-NumPy evaluator for the trained AQI boosters.
+
+The XGBoost forests for every horizon are flattened into one set of node
+arrays (feature index, threshold, left/right child, default direction, leaf
+value). Leaves point back at themselves, so evaluation is a fixed number of
+vectorised gather steps over a (rows × trees) matrix of node ids. Leaf values
+are then summed per horizon the way XGBoost does it — sequentially, in tree
+order, in float32, starting from the base score — so predictions match
+``XGBRegressor.predict`` bit for bit rather than to within rounding.
+
+Importing this module needs only NumPy — serving processes can predict
+without importing xgboost, sklearn or joblib. Compile the trained models with:
+
+    python -m ML.compiled_trees --out ML/aqi_forest.npz
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_FOREST_PATH = Path(__file__).parent / "aqi_forest.npz"
+
+_ARRAYS = ("feature", "threshold", "left", "right", "default_left", "value", "roots", "tree_horizon", "base_score")
+
+
+class CompiledForest:
+    """Flat, horizon-stacked tree ensemble evaluated with NumPy only."""
+
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        left: np.ndarray,
+        right: np.ndarray,
+        default_left: np.ndarray,
+        value: np.ndarray,
+        roots: np.ndarray,
+        tree_horizon: np.ndarray,
+        base_score: np.ndarray,
+        labels: list[str],
+        feature_cols: list[str],
+        max_depth: int,
+    ):
+        self.feature = feature.astype(np.int32)
+        self.threshold = threshold.astype(np.float32)
+        self.left = left.astype(np.int32)
+        self.right = right.astype(np.int32)
+        self.default_left = default_left.astype(bool)
+        self.value = value.astype(np.float32)
+        self.roots = roots.astype(np.int32)
+        self.tree_horizon = tree_horizon.astype(np.int32)
+        self.base_score = base_score.astype(np.float32)
+        self.labels = list(labels)
+        self.feature_cols = list(feature_cols)
+        self.max_depth = int(max_depth)
+
+        # Column index of every horizon's trees, in boosting order
+        self._horizon_trees = [np.flatnonzero(self.tree_horizon == h) for h in range(len(self.labels))]
+
+    # Evaluation
+
+    def predict(self, X) -> np.ndarray:
+        """Return predictions of shape (rows, horizons), columns in ``labels`` order."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], len(self.roots)))
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            go_left = np.where(np.isnan(x), self.default_left[node], x < self.threshold[node])
+            node = np.where(go_left, self.left[node], self.right[node])
+
+        leaves = self.value[node]
+        preds = np.empty((X.shape[0], len(self.labels)), dtype=np.float64)
+        for h, trees in enumerate(self._horizon_trees):
+            # cumsum adds left to right in the input dtype, like XGBoost's float32 accumulator
+            terms = np.empty((X.shape[0], len(trees) + 1), dtype=np.float32)
+            terms[:, 0] = self.base_score[h]
+            terms[:, 1:] = leaves[:, trees]
+            preds[:, h] = np.cumsum(terms, axis=1, dtype=np.float32)[:, -1]
+        return preds
+
+    def predict_dict(self, X) -> dict[str, np.ndarray]:
+        """Same as ``predict`` but keyed by horizon label."""
+        preds = self.predict(X)
+        return {label: preds[:, i] for i, label in enumerate(self.labels)}
+
+    # Persistence
+
+    def save(self, path: str | Path = DEFAULT_FOREST_PATH) -> None:
+        meta = {"labels": self.labels, "feature_cols": self.feature_cols, "max_depth": self.max_depth}
+        np.savez(path, meta=np.array(json.dumps(meta)), **{name: getattr(self, name) for name in _ARRAYS})
+
+    @classmethod
+    def load(cls, path: str | Path = DEFAULT_FOREST_PATH) -> "CompiledForest":
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            arrays = {name: data[name] for name in _ARRAYS}
+        return cls(**arrays, **meta)
+
+
+# Compilation (needs xgboost; only used by the offline tool)
+
+def _parse_base_score(raw: str) -> float:
+    # XGBoost >= 3 serialises base_score as a vector, e.g. "[5.2E1]"
+    return float(str(raw).strip("[]").split(",")[0])
+
+
+def compile_models(models: dict, feature_cols: list[str]) -> CompiledForest:
+    """Flatten fitted XGBRegressor / Booster objects keyed by horizon label."""
+    feature, threshold, left, right, default_left, value = [], [], [], [], [], []
+    roots, tree_horizon, base_score = [], [], []
+    max_depth = 0
+    offset = 0
+
+    labels = list(models)
+    for h, label in enumerate(labels):
+        model = models[label]
+        booster = model.get_booster() if hasattr(model, "get_booster") else model
+        learner = json.loads(booster.save_raw(raw_format="json"))["learner"]
+
+        if learner["gradient_booster"]["name"] != "gbtree":
+            raise ValueError(f"Only gbtree boosters can be compiled, got {learner['gradient_booster']['name']!r}")
+
+        trees = learner["gradient_booster"]["model"]["trees"]
+        # Respect early stopping the same way XGBRegressor.predict does
+        best_iteration = booster.attr("best_iteration") if hasattr(model, "get_booster") else None
+        if best_iteration is not None:
+            trees = trees[: int(best_iteration) + 1]
+
+        base_score.append(_parse_base_score(learner["learner_model_param"]["base_score"]))
+
+        for tree in trees:
+            lc = np.asarray(tree["left_children"], dtype=np.int64)
+            rc = np.asarray(tree["right_children"], dtype=np.int64)
+            is_leaf = lc == -1
+            own = np.arange(len(lc)) + offset
+
+            feature.append(np.where(is_leaf, 0, tree["split_indices"]))
+            threshold.append(np.asarray(tree["split_conditions"], dtype=np.float32))
+            left.append(np.where(is_leaf, own, lc + offset))
+            right.append(np.where(is_leaf, own, rc + offset))
+            default_left.append(np.asarray(tree["default_left"], dtype=bool))
+            # Leaf weights are stored in split_conditions for leaf nodes
+            value.append(np.where(is_leaf, np.asarray(tree["split_conditions"], dtype=np.float32), 0.0))
+
+            roots.append(offset)
+            tree_horizon.append(h)
+            max_depth = max(max_depth, _tree_depth(lc, rc))
+            offset += len(lc)
+
+    return CompiledForest(
+        feature=np.concatenate(feature),
+        threshold=np.concatenate(threshold),
+        left=np.concatenate(left),
+        right=np.concatenate(right),
+        default_left=np.concatenate(default_left),
+        value=np.concatenate(value),
+        roots=np.asarray(roots),
+        tree_horizon=np.asarray(tree_horizon),
+        base_score=np.asarray(base_score),
+        labels=labels,
+        feature_cols=feature_cols,
+        max_depth=max_depth,
+    )
+
+
+def _tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+    depth, frontier = 0, [0]
+    while True:
+        frontier = [c for n in frontier for c in (left[n], right[n]) if c != -1]
+        if not frontier:
+            return depth
+        depth += 1
+
+
+def validate(forest: CompiledForest, models: dict, X, tol: float = 1e-5) -> float:
+    """Compare against ``model.predict`` for every horizon; return the max abs diff."""
+    compiled = forest.predict(X)
+    worst = 0.0
+    for i, label in enumerate(forest.labels):
+        reference = np.asarray(models[label].predict(np.asarray(X)), dtype=np.float64)
+        diff = np.abs(compiled[:, i] - reference)
+        if not np.all(diff <= tol):
+            raise ValueError(f"[{label}] compiled forest diverges from XGBoost (max diff {diff.max():.3g})")
+        worst = max(worst, float(diff.max()))
+    return worst
+
+
+def main() -> None:
+    import argparse
+    import time
+
+    from ML.aqi_forecast import DATA_PATH, DEFAULT_PREFIX, add_targets, build_feature_list, load_and_preprocess, load_models
+
+    parser = argparse.ArgumentParser(description="Compile trained AQI boosters into NumPy arrays.")
+    parser.add_argument("--prefix", default=DEFAULT_PREFIX)
+    parser.add_argument("--out", default=str(DEFAULT_FOREST_PATH))
+    args = parser.parse_args()
+
+    feature_cols = build_feature_list()
+    models = load_models(prefix=args.prefix)
+    forest = compile_models(models, feature_cols)
+
+    X = add_targets(load_and_preprocess(DATA_PATH))[feature_cols].values
+    max_diff = validate(forest, models, X)
+    forest.save(args.out)
+
+    start = time.perf_counter()
+    forest.predict(X[:1])
+    single_us = (time.perf_counter() - start) * 1e6
+    print(f"Compiled {len(forest.roots)} trees / {len(forest.value)} nodes → {args.out}")
+    print(f"Validated on {len(X)} rows: max |diff| = {max_diff:.2e}, single-row predict {single_us:.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
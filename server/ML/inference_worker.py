@@ -0,0 +1,232 @@
+"""
+Standalone AQI inference worker shared by all WSGI workers on a host.
+
+The worker loads the forecast models once and serves feature rows over a
+Unix domain socket. Requests that arrive within a short window (a few ms)
+are coalesced into one batched predict, so concurrent forecast traffic from
+many web workers costs one model call instead of one per request.
+
+    python -m ML.inference_worker --socket /tmp/airsense-infer.sock
+
+Point the web app at it with AQI_INFERENCE_SOCKET=/tmp/airsense-infer.sock.
+
+Wire format (all integers big-endian uint32):
+    on connect, server → client : len + JSON {"labels": [...], "feature_cols": [...]}
+    request,    client → server : n_rows, n_cols, float32[n_rows * n_cols]
+    response,   server → client : n_rows, n_labels, float64[n_rows * n_labels]
+
+A request whose n_cols does not match ``feature_cols`` or whose n_rows
+exceeds the server's max_rows is refused by closing the connection before it
+reaches the batcher, so it cannot fail the other requests in its window.
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+DEFAULT_SOCKET = os.getenv("AQI_INFERENCE_SOCKET", "/tmp/airsense-infer.sock")
+
+_HEADER = struct.Struct("!II")
+_LENGTH = struct.Struct("!I")
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("Inference socket closed")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+# 1. Model Loading
+
+def load_predictor():
+    """
+    Return ``(predict, labels, feature_cols)`` where ``predict(X)`` gives an
+    array of shape (rows, len(labels)). Prefers the compiled NumPy forest.
+    """
+    from ML.compiled_trees import DEFAULT_FOREST_PATH, CompiledForest
+
+    if DEFAULT_FOREST_PATH.exists():
+        forest = CompiledForest.load(DEFAULT_FOREST_PATH)
+        return forest.predict, forest.labels, forest.feature_cols
+
+    from ML.aqi_forecast import build_feature_list, load_models
+
+    models = load_models()
+    labels = list(models)
+
+    def predict(X):
+        return np.column_stack([models[label].predict(X) for label in labels])
+
+    return predict, labels, build_feature_list()
+
+
+# 2. Micro-batching
+
+class MicroBatcher:
+    """Collects concurrent requests and runs them through one predict call."""
+
+    def __init__(self, predict, window_ms: float = 2.0, max_rows: int = 4096):
+        self.predict = predict
+        self.window_s = window_ms / 1000.0
+        self.max_rows = max_rows
+        self._queue: queue.Queue = queue.Queue()
+        self.batches = 0
+        self.requests = 0
+        threading.Thread(target=self._run, name="aqi-microbatcher", daemon=True).start()
+
+    def submit(self, X: np.ndarray) -> Future:
+        future: Future = Future()
+        self._queue.put((X, future))
+        return future
+
+    def _run(self) -> None:
+        while True:
+            pending = [self._queue.get()]
+            rows = len(pending[0][0])
+            deadline = time.monotonic() + self.window_s
+            while rows < self.max_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                rows += len(item[0])
+
+            try:
+                preds = self.predict(np.concatenate([X for X, _ in pending]))
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.requests += len(pending)
+            offset = 0
+            for X, future in pending:
+                future.set_result(preds[offset:offset + len(X)])
+                offset += len(X)
+
+
+# 3. Socket Server
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        server: InferenceServer = self.server
+        hello = json.dumps({"labels": server.labels, "feature_cols": server.feature_cols}).encode()
+        self.request.sendall(_LENGTH.pack(len(hello)) + hello)
+
+        while True:
+            try:
+                n_rows, n_cols = _HEADER.unpack(_recv_exact(self.request, _HEADER.size))
+                if n_cols != len(server.feature_cols) or n_rows > server.max_rows:
+                    print(f"[infer] refused request of {n_rows}x{n_cols} "
+                          f"(expected {len(server.feature_cols)} columns, at most {server.max_rows} rows)")
+                    return
+                payload = _recv_exact(self.request, n_rows * n_cols * 4)
+            except ConnectionError:
+                return
+
+            X = np.frombuffer(payload, dtype=np.float32).reshape(n_rows, n_cols)
+            try:
+                preds = np.ascontiguousarray(server.batcher.submit(X).result(), dtype=np.float64)
+            except Exception as e:
+                print(f"[infer] predict failed: {e}")
+                return
+            self.request.sendall(_HEADER.pack(*preds.shape) + preds.tobytes())
+
+
+class InferenceServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, window_ms: float = 2.0, max_rows: int = 4096):
+        predict, self.labels, self.feature_cols = load_predictor()
+        self.max_rows = max_rows
+        self.batcher = MicroBatcher(predict, window_ms=window_ms, max_rows=max_rows)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o660)
+
+
+# 4. Client (used by maps.services)
+
+class InferenceClient:
+    """Thread-safe client; each calling thread keeps its own connection."""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, timeout: float = 5.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        (length,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+        hello = json.loads(_recv_exact(sock, length))
+        self._local.sock, self._local.labels = sock, hello["labels"]
+        return sock
+
+    def _close(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+        self._local.sock = None
+
+    def predict(self, X) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+
+        # One retry covers a worker restart between calls
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None) or self._connect()
+            try:
+                sock.sendall(_HEADER.pack(*X.shape) + X.tobytes())
+                n_rows, n_labels = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+                payload = _recv_exact(sock, n_rows * n_labels * 8)
+                return np.frombuffer(payload, dtype=np.float64).reshape(n_rows, n_labels)
+            except OSError:
+                self._close()
+                if attempt:
+                    raise
+
+    def predict_dict(self, X) -> dict[str, np.ndarray]:
+        preds = self.predict(X)
+        return {label: preds[:, i] for i, label in enumerate(self._local.labels)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-batching AQI inference worker.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--window-ms", type=float, default=float(os.getenv("AQI_BATCH_WINDOW_MS", 2.0)))
+    parser.add_argument("--max-rows", type=int, default=4096)
+    args = parser.parse_args()
+
+    server = InferenceServer(args.socket, window_ms=args.window_ms, max_rows=args.max_rows)
+    print(f"[infer] Serving {server.labels} on {args.socket} (window {args.window_ms} ms)")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
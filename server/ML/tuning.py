@@ -0,0 +1,333 @@
+"""
+AirSense — Hyperparameter search for the AQI forecast models.
+
+Evaluates parameter sets with expanding-window time-series cross-validation
+(no shuffling, with a gap so shifted targets never overlap the test window)
+and runs trials in parallel across a process pool. Every finished trial is
+appended to a JSONL results file, so an interrupted search resumes where it
+stopped; results are keyed by parameters, fold count and a fingerprint of the
+dataset, so changing either starts a fresh search in the same file. The best parameters are written to ML/best_params.json, which
+``aqi_forecast.resolve_model_params`` picks up for the next training run.
+
+    python -m ML.tuning --mode random --n-trials 200 --workers 8 --budget-hours 6
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import random
+import statistics
+import time
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+from xgboost import XGBRegressor
+from xgboost.callback import TrainingCallback
+
+from ML.aqi_forecast import (
+    BEST_PARAMS_PATH,
+    DATA_PATH,
+    HORIZONS,
+    MODEL_PARAMS,
+    _rmse,
+    add_targets,
+    build_feature_list,
+    load_and_preprocess,
+)
+
+warnings.filterwarnings("ignore")
+
+RESULTS_PATH = Path(__file__).parent / "tuning_results.jsonl"
+
+SEARCH_SPACE = {
+    "n_estimators": [200, 400, 800],
+    "max_depth": [3, 4, 6, 8],
+    "learning_rate": [0.02, 0.05, 0.1],
+    "subsample": [0.7, 0.8, 1.0],
+    "colsample_bytree": [0.6, 0.8, 1.0],
+    "min_child_weight": [1, 3, 5],
+}
+
+
+# 1. Splits & Parameter Space
+
+def expanding_window_splits(
+    n_rows: int,
+    n_splits: int = 5,
+    gap: int = max(HORIZONS.values()),
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Return (train_idx, test_idx) pairs over time-ordered rows.
+
+    Fold k trains on everything before block k and tests on block k. The last
+    ``gap`` training rows are dropped because their targets look ``gap`` steps
+    ahead, into the test window.
+    """
+    block = n_rows // (n_splits + 1)
+    if block <= gap:
+        raise ValueError(
+            f"Not enough rows ({n_rows}) for {n_splits} folds with a gap of {gap}. "
+            "Use fewer splits or more data."
+        )
+
+    splits = []
+    for k in range(1, n_splits + 1):
+        test_start = k * block
+        test_end = n_rows if k == n_splits else test_start + block
+        splits.append((np.arange(0, test_start - gap), np.arange(test_start, test_end)))
+    return splits
+
+
+def iter_param_sets(mode: str, n_trials: int | None = None, seed: int = 42) -> list[dict]:
+    """
+    Expand SEARCH_SPACE into concrete parameter sets. Grid mode runs the full
+    grid unless ``n_trials`` caps it; random mode samples ``n_trials``
+    (default 100) distinct sets.
+    """
+    keys = sorted(SEARCH_SPACE)
+    if mode == "grid":
+        combos = [dict(zip(keys, values)) for values in itertools.product(*(SEARCH_SPACE[k] for k in keys))]
+        if n_trials and n_trials < len(combos):
+            print(
+                f"[tune]  WARNING: --n-trials {n_trials} truncates the {len(combos)}-combination grid; "
+                "only the first sets in grid order will run"
+            )
+            return combos[:n_trials]
+        return combos
+
+    n_trials = n_trials or 100
+
+    rng = random.Random(seed)
+    seen, combos = set(), []
+    max_combos = np.prod([len(v) for v in SEARCH_SPACE.values()])
+    while len(combos) < min(n_trials, max_combos):
+        params = {k: rng.choice(SEARCH_SPACE[k]) for k in keys}
+        key = trial_key(params)
+        if key not in seen:
+            seen.add(key)
+            combos.append(params)
+    return combos
+
+
+def trial_key(params: dict, context: str = "") -> str:
+    """Resume key for a trial: its parameters within one search ``context``."""
+    payload = json.dumps({"params": params, "context": context}, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def search_context(X: np.ndarray, Y: np.ndarray, n_splits: int, gap: int) -> str:
+    """Fingerprint of what a trial's score depends on besides its parameters."""
+    digest = hashlib.sha1()
+    for array in (X, Y):
+        digest.update(str(array.shape).encode())
+        digest.update(np.ascontiguousarray(array).tobytes())
+    digest.update(f"splits={n_splits};gap={gap}".encode())
+    return digest.hexdigest()[:16]
+
+
+# 2. Trial Execution (runs inside pool workers)
+
+_X: np.ndarray | None = None
+_Y: np.ndarray | None = None
+
+
+def _init_worker(X: np.ndarray, Y: np.ndarray) -> None:
+    """Ship the feature/target matrices to each worker once, not per trial."""
+    global _X, _Y
+    _X, _Y = X, Y
+
+
+class _Deadline(TrainingCallback):
+    """Stop boosting as soon as the search budget runs out."""
+
+    def __init__(self, deadline: float):
+        super().__init__()
+        self.deadline = deadline
+
+    def after_iteration(self, model, epoch, evals_log) -> bool:
+        return time.time() > self.deadline
+
+
+def run_trial(
+    params: dict,
+    splits: list[tuple[np.ndarray, np.ndarray]],
+    deadline: float,
+    prune_curve: list[float] | None = None,
+    early_stopping_rounds: int = 30,
+    val_frac: float = 0.15,
+) -> dict:
+    """
+    Cross-validate one parameter set over every fold and horizon.
+
+    XGBoost stops adding trees once the tail of each training window stops
+    improving. The trial itself is pruned when its running mean RMSE after
+    fold k is worse than ``prune_curve[k]`` (the best trial's running mean
+    scaled by a tolerance) and abandoned when ``deadline`` passes, including
+    part-way through fitting a model.
+    """
+    start = time.time()
+    labels = list(HORIZONS)
+    fold_scores: list[dict[str, float]] = []
+    best_iterations: list[int] = []
+    timeout = {"params": params, "status": "timeout"}
+
+    for train_idx, test_idx in splits:
+        n_val = max(1, int(len(train_idx) * val_frac))
+        fit_idx, val_idx = train_idx[:-n_val], train_idx[-n_val:]
+
+        scores = {}
+        for h, label in enumerate(labels):
+            if time.time() > deadline:
+                return {**timeout, "elapsed_s": time.time() - start}
+            model = XGBRegressor(
+                **{**MODEL_PARAMS, **params},
+                early_stopping_rounds=early_stopping_rounds,
+                callbacks=[_Deadline(deadline)],
+            )
+            model.fit(
+                _X[fit_idx], _Y[fit_idx, h],
+                eval_set=[(_X[val_idx], _Y[val_idx, h])],
+                verbose=False,
+            )
+            if time.time() > deadline:
+                # Boosting was cut short; the score would not be comparable
+                return {**timeout, "elapsed_s": time.time() - start}
+            scores[label] = _rmse(_Y[test_idx, h], model.predict(_X[test_idx]))
+            best_iterations.append(int(model.best_iteration))
+        fold_scores.append(scores)
+
+        running = statistics.mean(s for fold in fold_scores for s in fold.values())
+        if prune_curve is not None and running > prune_curve[len(fold_scores) - 1]:
+            return {
+                "params": params, "status": "pruned", "score": running,
+                "folds": fold_scores, "elapsed_s": time.time() - start,
+            }
+
+    return {
+        "params": params,
+        "status": "complete",
+        "score": statistics.mean(s for fold in fold_scores for s in fold.values()),
+        "per_horizon": {label: statistics.mean(f[label] for f in fold_scores) for label in labels},
+        "folds": fold_scores,
+        "best_n_estimators": int(statistics.median(best_iterations)) + 1,
+        "elapsed_s": time.time() - start,
+    }
+
+
+# 3. Search Driver
+
+def load_results(path: Path = RESULTS_PATH, context: str = "") -> dict[str, dict]:
+    """
+    Read finished trials of search ``context`` keyed by trial_key. Timed-out
+    trials, and trials from other datasets or fold counts, are not reused.
+    """
+    results: dict[str, dict] = {}
+    if not path.exists():
+        return results
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("context", "") == context and record["status"] in ("complete", "pruned"):
+                results[record["key"]] = record
+    return results
+
+
+def _best(results: dict[str, dict]) -> dict | None:
+    complete = [r for r in results.values() if r["status"] == "complete"]
+    return min(complete, key=lambda r: r["score"]) if complete else None
+
+
+def _prune_curve(best: dict | None, prune_factor: float) -> list[float] | None:
+    """Best trial's running mean RMSE after each fold, scaled by ``prune_factor``."""
+    if best is None:
+        return None
+    fold_means = [statistics.mean(fold.values()) for fold in best["folds"]]
+    return [prune_factor * statistics.mean(fold_means[: k + 1]) for k in range(len(fold_means))]
+
+
+def run_search(
+    mode: str = "random",
+    n_trials: int | None = None,
+    workers: int = 4,
+    budget_s: float = 8 * 3600,
+    n_splits: int = 5,
+    prune_factor: float = 1.25,
+    results_path: Path = RESULTS_PATH,
+) -> dict | None:
+    """Run (or resume) a search and return the best finished trial."""
+    df = add_targets(load_and_preprocess(DATA_PATH))
+    X = df[build_feature_list()].values
+    Y = df[[f"aqi_{label}" for label in HORIZONS]].values
+    gap = max(HORIZONS.values())
+    splits = expanding_window_splits(len(df), n_splits=n_splits, gap=gap)
+    context = search_context(X, Y, n_splits, gap)
+
+    results = load_results(results_path, context)
+    pending = [p for p in iter_param_sets(mode, n_trials) if trial_key(p, context) not in results]
+    print(f"[tune]  {len(results)} trials already done, {len(pending)} to run on {workers} workers")
+
+    deadline = time.time() + budget_s
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X, Y)) as pool, \
+            open(results_path, "a") as out:
+        in_flight = {}
+        while pending or in_flight:
+            # Keep exactly `workers` trials queued so the budget cut-off is prompt
+            while pending and len(in_flight) < workers and time.time() < deadline:
+                params = pending.pop(0)
+                prune_curve = _prune_curve(_best(results), prune_factor)
+                future = pool.submit(run_trial, params, splits, deadline, prune_curve)
+                in_flight[future] = params
+
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                params = in_flight.pop(future)
+                record = {"key": trial_key(params, context), "context": context, **future.result()}
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                if record["status"] != "timeout":
+                    results[record["key"]] = record
+                print(f"[tune]  {record['status']:>8}  score={record.get('score', float('nan')):.4f}  {params}")
+
+    best = _best(results)
+    if best:
+        best_params = {**best["params"], "n_estimators": best["best_n_estimators"]}
+        with open(BEST_PARAMS_PATH, "w") as f:
+            json.dump(best_params, f, indent=4)
+        print(f"[tune]  Best CV RMSE {best['score']:.4f} → {BEST_PARAMS_PATH}")
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time-series CV hyperparameter search for AQI models.")
+    parser.add_argument("--mode", choices=["grid", "random"], default="random")
+    parser.add_argument(
+        "--n-trials", type=int, default=None,
+        help="trials to run (random mode default 100; grid mode runs the full grid unless set)",
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--budget-hours", type=float, default=8.0)
+    parser.add_argument("--n-splits", type=int, default=5)
+    parser.add_argument("--results", type=Path, default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    run_search(
+        mode=args.mode,
+        n_trials=args.n_trials,
+        workers=args.workers,
+        budget_s=args.budget_hours * 3600,
+        n_splits=args.n_splits,
+        results_path=args.results,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Alerts package — forecast exposure alerts for subscribed locations."""
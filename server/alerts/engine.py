@@ -0,0 +1,296 @@
+"""
+Forecast-driven exposure alert fan-out.
+
+After each forecast refresh (a sensor batch was ingested, or every
+ALERT_INTERVAL_SECONDS), one pass:
+
+  1. builds the forecast for every node once (``build_forecast``);
+  2. loads every active subscription with its user's health profile in one
+     query;
+  3. in NumPy, matches each subscription to its nearest node, derives the
+     threshold (explicit, or from the health profile), and finds the worst
+     forecast AQI across now/+6h/+12h/+24h;
+  4. dedupes against the subscription's last alert: a subscription is
+     notified when it first crosses its threshold, when the risk level
+     changes, or when it stays above for longer than ALERT_COOLDOWN_HOURS;
+     falling back below re-arms it;
+  5. writes the notifications to ``alert_notifications`` and the new alert
+     state in the same transaction (two set-based statements).
+
+Only one web worker runs a pass at a time: the transaction-scoped advisory
+lock is taken before the forecast is built, so workers that lose the race
+skip the inference too. Run a pass from a scheduler with:
+
+    python -m alerts.engine
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+from db.db_setup import get_db_connection
+from maps.services import FORECAST_HORIZONS, build_forecast, classify_risk, get_latest_per_node
+
+INTERVAL_SECONDS = float(os.getenv("ALERT_INTERVAL_SECONDS", 900))
+MIN_INTERVAL_SECONDS = float(os.getenv("ALERT_MIN_INTERVAL_SECONDS", 60))
+COOLDOWN_SECONDS = float(os.getenv("ALERT_COOLDOWN_HOURS", 6)) * 3600
+MAX_DISTANCE_KM = float(os.getenv("ALERT_MAX_DISTANCE_KM", 10))
+
+HORIZONS = ["now"] + FORECAST_HORIZONS
+
+# AQI at which an alert fires, by health profile (see classify_risk: Medium > 50, High > 150)
+DEFAULT_THRESHOLD = 150.0
+ELEVATED_THRESHOLD = 125.0      # allergies, inhaler, smoker, high outdoor exposure
+SENSITIVE_THRESHOLD = 100.0     # asthma, COPD, heart condition, pregnancy, frequent breathing difficulty
+
+PROFILE_COLUMNS = [
+    "has_asthma", "has_copd", "has_heart_condition", "is_pregnant",
+    "has_allergies", "takes_inhaler",
+    "smoking_status", "outdoor_exposure", "breathing_difficulty",
+]
+
+_ADVISORY_LOCK_ID = 427_002
+_KM_PER_DEGREE = 111.32
+# Subscriptions x nodes distance cells computed per chunk (bounds memory)
+_DISTANCE_CELLS = 2_000_000
+
+
+def profile_thresholds(profiles: dict[str, np.ndarray]) -> np.ndarray:
+    """Vectorised threshold per row from health-profile columns (missing profile = all None)."""
+    def flag(column):
+        return np.asarray(profiles[column], dtype=object) == True  # noqa: E712 (None -> False)
+
+    def equals(column, value):
+        return np.asarray(profiles[column], dtype=object) == value
+
+    sensitive = (
+        flag("has_asthma") | flag("has_copd") | flag("has_heart_condition") | flag("is_pregnant")
+        | equals("breathing_difficulty", "Often")
+    )
+    elevated = (
+        flag("has_allergies") | flag("takes_inhaler") | equals("smoking_status", "Current")
+        | equals("outdoor_exposure", "High") | equals("breathing_difficulty", "Sometimes")
+    )
+    return np.where(sensitive, SENSITIVE_THRESHOLD, np.where(elevated, ELEVATED_THRESHOLD, DEFAULT_THRESHOLD))
+
+
+def threshold_for_profile(profile: dict | None) -> float:
+    """Threshold a subscription without an explicit one gets for this health profile."""
+    profile = profile or {}
+    return float(profile_thresholds({c: np.array([profile.get(c)], dtype=object) for c in PROFILE_COLUMNS})[0])
+
+
+def nearest_nodes(sub_lat, sub_lon, node_lat, node_lon) -> tuple[np.ndarray, np.ndarray]:
+    """(index of the nearest node, distance in km) for every subscription (equirectangular)."""
+    n_nodes = len(node_lat)
+    chunk = max(1, _DISTANCE_CELLS // max(n_nodes, 1))
+    index = np.empty(len(sub_lat), dtype=np.int64)
+    dist_sq = np.empty(len(sub_lat))
+    for start in range(0, len(sub_lat), chunk):
+        lat = sub_lat[start:start + chunk, None]
+        lon = sub_lon[start:start + chunk, None]
+        d_lat = lat - node_lat[None, :]
+        d_lon = (lon - node_lon[None, :]) * np.cos(np.radians(lat))
+        d2 = d_lat * d_lat + d_lon * d_lon
+        best = d2.argmin(axis=1)
+        index[start:start + chunk] = best
+        dist_sq[start:start + chunk] = d2[np.arange(len(best)), best]
+    return index, np.sqrt(dist_sq) * _KM_PER_DEGREE
+
+
+def evaluate(subs: dict[str, np.ndarray], forecast: list[dict], now: float) -> dict[str, np.ndarray]:
+    """
+    Decide, for every subscription at once, whether to notify and what its
+    alert state becomes. ``subs`` holds equal-length columns: id, user_id,
+    lat, lon, threshold (NaN = from profile), alert_state, alerted_at (epoch
+    seconds, 0 = never) and PROFILE_COLUMNS.
+    """
+    node_lat = np.array([f["lat"] for f in forecast], dtype=float)
+    node_lon = np.array([f["lon"] for f in forecast], dtype=float)
+    aqi = np.array([[f[f"aqi_{h}"] for h in HORIZONS] for f in forecast], dtype=float)
+
+    nearest, distance = nearest_nodes(subs["lat"], subs["lon"], node_lat, node_lon)
+    sub_aqi = aqi[nearest]                                   # subscriptions x horizons
+    worst = sub_aqi.argmax(axis=1)
+    peak = sub_aqi[np.arange(len(worst)), worst]
+
+    threshold = np.where(np.isnan(subs["threshold"]), profile_thresholds(subs), subs["threshold"])
+    over = (peak >= threshold) & (distance <= MAX_DISTANCE_KM)
+
+    level = np.array([classify_risk(v) for v in peak], dtype=object)
+    previous = subs["alert_state"]
+    notify = over & ((previous != level) | (now - subs["alerted_at"] >= COOLDOWN_SECONDS))
+    clear = ~over & (previous != None)  # noqa: E711 (elementwise on an object array)
+
+    return {
+        "notify": notify,
+        "clear": clear,
+        "node_index": nearest,
+        "horizon": np.array(HORIZONS, dtype=object)[worst],
+        "peak": peak,
+        "threshold": threshold,
+        "level": level,
+    }
+
+
+_SUBSCRIPTIONS_SQL = f"""
+    SELECT s.id, s.user_id, s.lat, s.lon, s.threshold, s.alert_state,
+           COALESCE(extract(epoch FROM s.alerted_at), 0),
+           {", ".join("hp." + c for c in PROFILE_COLUMNS)}
+    FROM alert_subscriptions s
+    LEFT JOIN user_health_profiles hp ON hp.user_id = s.user_id
+    WHERE s.active;
+"""
+
+_SUB_COLUMNS = ["id", "user_id", "lat", "lon", "threshold", "alert_state", "alerted_at"] + PROFILE_COLUMNS
+
+
+def _columns(rows: list[tuple]) -> dict[str, np.ndarray]:
+    cols = dict(zip(_SUB_COLUMNS, (np.array(c, dtype=object) for c in zip(*rows))))
+    for name in ("lat", "lon", "alerted_at"):
+        cols[name] = cols[name].astype(float)
+    cols["threshold"] = np.array([np.nan if t is None else t for t in cols["threshold"]], dtype=float)
+    return cols
+
+
+class AlertEngine:
+    def __init__(self, interval_seconds: float = INTERVAL_SECONDS, min_interval_seconds: float = MIN_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self.min_interval_seconds = min_interval_seconds
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._last_run = 0.0
+        self._metrics = {"passes": 0, "skipped_locked": 0, "subscriptions": 0, "notified": 0,
+                         "errors": 0, "last_pass_ms": None}
+
+    def run_once(self) -> int:
+        """One fan-out pass. Returns the number of notifications written."""
+        start = time.perf_counter()
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT pg_try_advisory_xact_lock(%s);", (_ADVISORY_LOCK_ID,))
+                if not cur.fetchone()[0]:
+                    conn.rollback()
+                    self._metrics["skipped_locked"] += 1
+                    return 0
+
+                # Held while the forecast is built (on other pooled connections)
+                forecast = build_forecast(get_latest_per_node())
+                rows = []
+                if forecast:
+                    cur.execute(_SUBSCRIPTIONS_SQL)
+                    rows = cur.fetchall()
+                notified = 0
+                if rows:
+                    subs = _columns(rows)
+                    result = evaluate(subs, forecast, time.time())
+                    notified = self._write(cur, subs, result, forecast)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+        self._metrics["passes"] += 1
+        self._metrics["subscriptions"] = len(rows)
+        self._metrics["notified"] += notified
+        self._metrics["last_pass_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return notified
+
+    @staticmethod
+    def _write(cur, subs: dict, result: dict, forecast: list[dict]) -> int:
+        notify, clear = result["notify"], result["clear"]
+        if notify.any():
+            node_ids = np.array([f.get("node_id") for f in forecast], dtype=object)
+            cur.execute(
+                """
+                INSERT INTO alert_notifications
+                    (user_id, subscription_id, node_id, horizon, aqi, threshold, risk_level)
+                SELECT * FROM unnest(%s::int[], %s::bigint[], %s::int[], %s::text[],
+                                     %s::real[], %s::real[], %s::text[]);
+                """,
+                (
+                    subs["user_id"][notify].tolist(),
+                    subs["id"][notify].tolist(),
+                    node_ids[result["node_index"][notify]].tolist(),
+                    result["horizon"][notify].tolist(),
+                    result["peak"][notify].round(1).tolist(),
+                    result["threshold"][notify].tolist(),
+                    result["level"][notify].tolist(),
+                ),
+            )
+
+        changed = notify | clear
+        if changed.any():
+            cur.execute(
+                """
+                UPDATE alert_subscriptions s
+                SET alert_state = u.state,
+                    alerted_at = CASE WHEN u.notified THEN now() ELSE s.alerted_at END
+                FROM unnest(%s::bigint[], %s::text[], %s::bool[]) AS u(id, state, notified)
+                WHERE s.id = u.id;
+                """,
+                (
+                    subs["id"][changed].tolist(),
+                    np.where(notify, result["level"], None)[changed].tolist(),
+                    notify[changed].tolist(),
+                ),
+            )
+        return int(notify.sum())
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval_seconds)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            # Coalesce bursts of ingest batches into one pass
+            remaining = self.min_interval_seconds - (time.monotonic() - self._last_run)
+            if remaining > 0 and self._stop.wait(remaining):
+                return
+            self._wake.clear()
+            self._last_run = time.monotonic()
+            try:
+                self.run_once()
+            except Exception as e:
+                self._metrics["errors"] += 1
+                print(f"Alert fan-out failed: {e}")
+
+    def wake(self) -> None:
+        """Request a pass (e.g. after new readings were ingested)."""
+        self._wake.set()
+
+    def start(self) -> None:
+        """Start the background fan-out thread (idempotent)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="alert-engine", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self) -> dict:
+        return dict(self._metrics)
+
+
+alerts = AlertEngine()
+
+
+def main() -> None:
+    from db.db_setup import initialize_connection_pool
+
+    initialize_connection_pool()
+    print(f"Wrote {alerts.run_once()} notifications.")
+    print(alerts.stats())
+
+
+if __name__ == "__main__":
+    main()
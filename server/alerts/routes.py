@@ -0,0 +1,128 @@
+"""Blueprint routes for forecast exposure alerts."""
+
+import math
+from datetime import datetime
+
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import get_jwt_identity, jwt_required
+
+from extensions import session_limit
+
+from .services import (
+    create_subscription,
+    delete_subscription,
+    get_notifications,
+    list_subscriptions,
+    mark_notifications_read,
+)
+
+alerts_bp = Blueprint("alerts", __name__, url_prefix="/api/alerts")
+
+
+def _serialize(records: list[dict]) -> list[dict]:
+    return [
+        {k: v.isoformat() if isinstance(v, datetime) else v for k, v in record.items()}
+        for record in records
+    ]
+
+
+@alerts_bp.route("/subscriptions", methods=["GET"])
+@jwt_required()
+def get_subscriptions():
+    """
+    GET /api/alerts/subscriptions
+    Returns the current user's alert locations with the threshold in effect
+    for each (explicit, or derived from the health profile).
+    """
+    user_id = int(get_jwt_identity())
+    try:
+        subs = list_subscriptions(user_id)
+        return jsonify({"status": "success", "count": len(subs), "data": _serialize(subs)}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@alerts_bp.route("/subscriptions", methods=["POST"])
+@jwt_required()
+def add_subscription():
+    """
+    POST /api/alerts/subscriptions
+    Body: { lat, lon, label?, threshold? }. Omit threshold to alert at the
+    level implied by the user's health profile.
+    """
+    user_id = int(get_jwt_identity())
+    data = request.json or {}
+    try:
+        lat, lon = float(data["lat"]), float(data["lon"])
+        threshold = float(data["threshold"]) if data.get("threshold") is not None else None
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"status": "error", "message": "lat and lon are required numbers; threshold must be a number"}), 400
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return jsonify({"status": "error", "message": "lat/lon out of range"}), 400
+    if threshold is not None and not (math.isfinite(threshold) and threshold > 0):
+        return jsonify({"status": "error", "message": "threshold must be a positive number"}), 400
+
+    label = data.get("label")
+    try:
+        sub = create_subscription(user_id, lat, lon, label=label[:100] if label else None, threshold=threshold)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    return jsonify({"status": "success", "data": _serialize([sub])[0]}), 201
+
+
+@alerts_bp.route("/subscriptions/<int:subscription_id>", methods=["DELETE"])
+@jwt_required()
+def remove_subscription(subscription_id: int):
+    """DELETE /api/alerts/subscriptions/<id> — stop alerts for a location."""
+    user_id = int(get_jwt_identity())
+    try:
+        if not delete_subscription(subscription_id, user_id):
+            return jsonify({"status": "error", "message": "Subscription not found"}), 404
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    return jsonify({"status": "success"}), 200
+
+
+@alerts_bp.route("/notifications", methods=["GET"])
+@session_limit()
+@jwt_required()
+def list_notifications():
+    """
+    GET /api/alerts/notifications?after=<id>&limit=50
+    Returns alerts newer than ``after`` (oldest first). Pass the last id
+    seen as ``after`` on the next call; an empty list means nothing changed.
+    """
+    user_id = int(get_jwt_identity())
+    try:
+        after = int(request.args.get("after", 0))
+        limit = max(1, min(int(request.args.get("limit", 50)), 200))
+    except ValueError:
+        return jsonify({"status": "error", "message": "after and limit must be integers"}), 400
+
+    try:
+        data = get_notifications(user_id, after, limit)
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    return jsonify({
+        "status": "success", "count": len(data), "data": _serialize(data),
+        "last_id": data[-1]["id"] if data else after,
+    }), 200
+
+
+@alerts_bp.route("/notifications/read", methods=["POST"])
+@session_limit()
+@jwt_required()
+def read_notifications():
+    """POST /api/alerts/notifications/read  Body: { up_to: <id> } — mark alerts up to id as read."""
+    user_id = int(get_jwt_identity())
+    try:
+        up_to = int((request.json or {})["up_to"])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"status": "error", "message": "up_to is required"}), 400
+    try:
+        updated = mark_notifications_read(user_id, up_to)
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    return jsonify({"status": "success", "updated": updated}), 200
@@ -0,0 +1,124 @@
+"""DB service functions for alert subscriptions and the notification outbox."""
+
+from db.db_setup import get_db_connection
+from user.services import get_health_profile
+from .engine import threshold_for_profile
+
+MAX_SUBSCRIPTIONS_PER_USER = 10
+
+SUBSCRIPTION_KEYS = ["id", "user_id", "label", "lat", "lon", "threshold", "active", "alert_state", "alerted_at", "created_at"]
+NOTIFICATION_KEYS = ["id", "subscription_id", "node_id", "horizon", "aqi", "threshold", "risk_level", "read_at", "created_at"]
+
+
+def _with_effective_threshold(subscriptions: list[dict], user_id: int) -> list[dict]:
+    """Fill ``effective_threshold``: the explicit threshold or the one the health profile implies."""
+    derived = threshold_for_profile(get_health_profile(user_id))
+    for sub in subscriptions:
+        sub["threshold_source"] = "custom" if sub["threshold"] is not None else "health_profile"
+        sub["effective_threshold"] = sub["threshold"] if sub["threshold"] is not None else derived
+    return subscriptions
+
+
+def list_subscriptions(user_id: int) -> list[dict]:
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                f"SELECT {', '.join(SUBSCRIPTION_KEYS)} FROM alert_subscriptions WHERE user_id = %s ORDER BY id;",
+                (user_id,),
+            )
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+    return _with_effective_threshold([dict(zip(SUBSCRIPTION_KEYS, r)) for r in rows], user_id)
+
+
+def create_subscription(user_id: int, lat: float, lon: float, label: str | None = None,
+                        threshold: float | None = None) -> dict:
+    """
+    Subscribe ``user_id`` to alerts for a location. Without ``threshold`` the
+    alert level follows the user's health profile. Raises ValueError when the
+    user already has MAX_SUBSCRIPTIONS_PER_USER subscriptions.
+    """
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            # Serialise concurrent creates for the same user so the cap holds
+            cur.execute("SELECT id FROM users WHERE id = %s FOR UPDATE;", (user_id,))
+            cur.execute("SELECT count(*) FROM alert_subscriptions WHERE user_id = %s;", (user_id,))
+            if cur.fetchone()[0] >= MAX_SUBSCRIPTIONS_PER_USER:
+                raise ValueError(f"At most {MAX_SUBSCRIPTIONS_PER_USER} alert locations are allowed")
+            cur.execute(
+                f"""
+                INSERT INTO alert_subscriptions (user_id, label, lat, lon, threshold)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING {', '.join(SUBSCRIPTION_KEYS)};
+                """,
+                (user_id, label, lat, lon, threshold),
+            )
+            row = cur.fetchone()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+    return _with_effective_threshold([dict(zip(SUBSCRIPTION_KEYS, row))], user_id)[0]
+
+
+def delete_subscription(subscription_id: int, user_id: int) -> bool:
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                "DELETE FROM alert_subscriptions WHERE id = %s AND user_id = %s;",
+                (subscription_id, user_id),
+            )
+            deleted = cur.rowcount > 0
+            conn.commit()
+            return deleted
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+
+def get_notifications(user_id: int, after: int = 0, limit: int = 50) -> list[dict]:
+    """Notifications newer than id ``after``, oldest first, so clients can fetch only what changed."""
+    with get_db_connection(readonly=True) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                f"""
+                SELECT {', '.join(NOTIFICATION_KEYS)} FROM alert_notifications
+                WHERE user_id = %s AND id > %s
+                ORDER BY id
+                LIMIT %s;
+                """,
+                (user_id, after, limit),
+            )
+            return [dict(zip(NOTIFICATION_KEYS, r)) for r in cur.fetchall()]
+        finally:
+            cur.close()
+
+
+def mark_notifications_read(user_id: int, up_to: int) -> int:
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                """
+                UPDATE alert_notifications SET read_at = now()
+                WHERE user_id = %s AND id <= %s AND read_at IS NULL;
+                """,
+                (user_id, up_to),
+            )
+            updated = cur.rowcount
+            conn.commit()
+            return updated
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
@@ -0,0 +1,302 @@
+"""
+In-process JWT revocation cache backing ``token_in_blocklist_loader``.
+
+Every protected request asks whether its ``jti`` was revoked. Answering that
+from ``token_blocklist`` costs a round trip per request, so each worker keeps:
+
+  * a Bloom filter of every unexpired revoked jti. A miss means "definitely
+    not revoked", which is the answer for nearly every request;
+  * an LRU of confirmed revocations for Bloom hits;
+  * a background thread that pulls rows newer than its watermark every
+    BLOCKLIST_REFRESH_SECONDS and periodically deletes rows whose tokens
+    have expired anyway.
+
+Only a Bloom false positive that is not in the LRU reaches the database.
+Revocations made by other workers become visible within one refresh
+interval; revocations made by this worker are visible immediately.
+
+Purge expired rows from a scheduler instead of (or as well as) the workers:
+
+    python -m auth.blocklist --purge
+"""
+
+import argparse
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from db.db_setup import get_db_connection
+from db.queries import execute_named
+
+REFRESH_SECONDS = float(os.getenv("BLOCKLIST_REFRESH_SECONDS", 5))
+PURGE_SECONDS = float(os.getenv("BLOCKLIST_PURGE_SECONDS", 3600))
+LRU_SIZE = int(os.getenv("BLOCKLIST_LRU_SIZE", 10000))
+BLOOM_CAPACITY = int(os.getenv("BLOCKLIST_BLOOM_CAPACITY", 100000))
+BLOOM_ERROR_RATE = float(os.getenv("BLOCKLIST_BLOOM_ERROR_RATE", 0.001))
+
+# Re-read this much history on each refresh so rows committed slightly
+# out of revoked_at order are not skipped
+_REFRESH_OVERLAP = timedelta(seconds=30)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on one blake2b digest)."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class RevocationCache:
+    def __init__(
+        self,
+        refresh_seconds: float = REFRESH_SECONDS,
+        purge_seconds: float = PURGE_SECONDS,
+        lru_size: int = LRU_SIZE,
+        bloom_capacity: int = BLOOM_CAPACITY,
+        bloom_error_rate: float = BLOOM_ERROR_RATE,
+    ):
+        self.refresh_seconds = refresh_seconds
+        self.purge_seconds = purge_seconds
+        self.lru_size = lru_size
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+
+        self._lock = threading.Lock()
+        self._bloom = BloomFilter(bloom_capacity, bloom_error_rate)
+        self._lru: OrderedDict[str, None] = OrderedDict()
+        self._watermark: datetime | None = None
+        self._loaded = False
+        self._last_purge = time.monotonic()
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+        self._metrics = {
+            "bloom_negative": 0,
+            "lru_hits": 0,
+            "db_lookups": 0,
+            "false_positives": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "purged": 0,
+        }
+
+    # ─── Lookups ──────────────────────────────────────────────────────────────
+
+    def _remember(self, jti: str) -> None:
+        self._lru[jti] = None
+        self._lru.move_to_end(jti)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def is_revoked(self, jti: str) -> bool:
+        with self._lock:
+            if self._loaded:
+                if jti not in self._bloom:
+                    self._metrics["bloom_negative"] += 1
+                    return False
+                if jti in self._lru:
+                    self._lru.move_to_end(jti)
+                    self._metrics["lru_hits"] += 1
+                    return True
+            self._metrics["db_lookups"] += 1
+
+        # Bloom hit outside the LRU (or cache not loaded yet): ask the table
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            try:
+                execute_named(cur, "token_is_revoked", (jti,))
+                revoked = cur.fetchone() is not None
+            finally:
+                conn.rollback()
+                cur.close()
+
+        with self._lock:
+            if revoked:
+                self._remember(jti)
+            elif self._loaded:
+                self._metrics["false_positives"] += 1
+        return revoked
+
+    def revoke(self, jti: str) -> None:
+        """Record a revocation this worker just committed, without waiting for a refresh."""
+        with self._lock:
+            self._bloom.add(jti)
+            self._remember(jti)
+
+    # ─── Refresh / purge ──────────────────────────────────────────────────────
+
+    def _fetch(self, cur, since: datetime | None) -> list[tuple]:
+        clause, params = "", []
+        if since is not None:
+            clause, params = "AND revoked_at >= %s", [since - _REFRESH_OVERLAP]
+        cur.execute(
+            f"""
+            SELECT jti, revoked_at FROM token_blocklist
+            WHERE (expires_at IS NULL OR expires_at > now()) {clause}
+            ORDER BY revoked_at;
+            """,
+            params,
+        )
+        return cur.fetchall()
+
+    def reload(self) -> None:
+        """Rebuild the Bloom filter and LRU from every unexpired row."""
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            try:
+                rows = self._fetch(cur, None)
+            finally:
+                conn.rollback()
+                cur.close()
+
+        bloom = BloomFilter(max(self.bloom_capacity, 2 * len(rows)), self.bloom_error_rate)
+        for jti, _ in rows:
+            bloom.add(jti)
+
+        with self._lock:
+            self._bloom = bloom
+            self._lru.clear()
+            for jti, _ in rows[-self.lru_size:]:
+                self._lru[jti] = None
+            self._watermark = rows[-1][1] if rows else None
+            self._loaded = True
+            self._metrics["refreshes"] += 1
+
+    def refresh(self) -> None:
+        """Pull revocations newer than the watermark (full reload on first call)."""
+        if not self._loaded:
+            self.reload()
+            return
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            try:
+                rows = self._fetch(cur, self._watermark)
+            finally:
+                conn.rollback()
+                cur.close()
+
+        with self._lock:
+            if self._bloom.count + len(rows) <= self._bloom.capacity:
+                for jti, revoked_at in rows:
+                    # Overlapping windows return the same rows again; count each key once
+                    if jti not in self._bloom:
+                        self._bloom.add(jti)
+                    self._remember(jti)
+                    self._watermark = max(self._watermark or revoked_at, revoked_at)
+                self._metrics["refreshes"] += 1
+                return
+
+        # A Bloom filter cannot grow; rebuild it larger from the table
+        self.reload()
+
+    def purge(self) -> int:
+        """Delete rows whose tokens have expired, then rebuild so the filter sheds them too."""
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute("DELETE FROM token_blocklist WHERE expires_at < now();")
+                deleted = cur.rowcount
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+        self._last_purge = time.monotonic()
+        self._metrics["purged"] += deleted
+        if deleted:
+            self.reload()
+        return deleted
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_seconds):
+            try:
+                if time.monotonic() - self._last_purge >= self.purge_seconds:
+                    self.purge()
+                self.refresh()
+            except Exception as e:
+                self._metrics["refresh_errors"] += 1
+                print(f"Token blocklist refresh failed: {e}")
+
+    def start(self) -> None:
+        """Load the cache and start the background refresher (idempotent)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        try:
+            self.reload()
+        except Exception as e:
+            # Until the first successful refresh every check goes to the table
+            print(f"Token blocklist initial load failed: {e}")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="token-blocklist", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loaded": self._loaded,
+                "entries": self._bloom.count,
+                "bloom_capacity": self._bloom.capacity,
+                "lru_size": len(self._lru),
+                "watermark": self._watermark.isoformat() if self._watermark else None,
+                **self._metrics,
+            }
+
+
+revocations = RevocationCache()
+
+
+def register_blocklist(jwt) -> None:
+    """
+    Wire the cache into a flask_jwt_extended JWTManager. Call
+    ``revocations.start()`` once the connection pool exists.
+    """
+
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload: dict) -> bool:
+        return revocations.is_revoked(jwt_payload["jti"])
+
+
+def main() -> None:
+    from db.db_setup import initialize_connection_pool
+
+    parser = argparse.ArgumentParser(description="Token blocklist maintenance.")
+    parser.add_argument("--purge", action="store_true", help="delete rows for tokens that have expired")
+    args = parser.parse_args()
+
+    initialize_connection_pool()
+    if args.purge:
+        print(f"Purged {revocations.purge()} expired blocklist rows.")
+    else:
+        revocations.reload()
+        print(revocations.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Password hashing off the request thread.
+
+bcrypt is deliberately slow (~250 ms of CPU at cost 12). Run inline, a login
+storm keeps request threads busy hashing and, through the GIL, stalls every
+other request in the worker. Hashes and checks are dispatched to a small
+process pool instead; the request thread just waits on a future (releasing
+the GIL). At most PASSWORD_QUEUE_SIZE operations may be queued or running per
+worker; beyond that callers get ``PasswordPoolBusy`` and the route answers
+503 rather than piling up latency. A pool inherited through fork() or left
+broken by a dead process (OOM kill) is replaced instead of reused.
+
+The cost factor comes from BCRYPT_ROUNDS. A successful login whose stored
+hash used a different cost is rehashed in the same pool call, so raising
+(or lowering) the cost migrates users as they sign in.
+
+Measure sustained logins per second per core for a given cost:
+
+    python -m auth.passwords --bench --rounds 12 --seconds 10
+"""
+
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+WORKERS = int(os.getenv("PASSWORD_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+QUEUE_SIZE = int(os.getenv("PASSWORD_QUEUE_SIZE", WORKERS * 8))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("PASSWORD_QUEUE_TIMEOUT_SECONDS", 2))
+
+# bcrypt only reads the first 72 bytes; bcrypt>=5 raises instead of truncating,
+# so truncate explicitly to keep accepting hashes made by older versions
+_MAX_PASSWORD_BYTES = 72
+
+
+class PasswordPoolBusy(Exception):
+    """Too many hash/check operations are already queued in this worker."""
+
+
+def _encode(password: str) -> bytes:
+    return password.encode("utf-8")[:_MAX_PASSWORD_BYTES]
+
+
+def hash_cost(pw_hash: str) -> int | None:
+    """Cost factor of a ``$2b$12$...`` hash, or None if it is not a bcrypt hash."""
+    parts = pw_hash.split("$")
+    return int(parts[2]) if len(parts) > 3 and parts[2].isdigit() else None
+
+
+# ─── Run in the pool processes ────────────────────────────────────────────────
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(_encode(password), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _verify(pw_hash: str, password: str, rounds: int) -> tuple[bool, str | None]:
+    """(matches, new hash if the stored cost differs from ``rounds``)."""
+    try:
+        ok = bcrypt.checkpw(_encode(password), pw_hash.encode("utf-8"))
+    except ValueError:      # malformed stored hash
+        return False, None
+    if ok and hash_cost(pw_hash) != rounds:
+        return True, _hash(password, rounds)
+    return ok, None
+
+
+# ─── Web worker side ──────────────────────────────────────────────────────────
+
+class PasswordHasher:
+    def __init__(self, rounds: int = ROUNDS, workers: int = WORKERS, queue_size: int = QUEUE_SIZE):
+        self.rounds = rounds
+        self.workers = workers
+        self.queue_size = queue_size
+        self._pool: ProcessPoolExecutor | None = None
+        self._pool_pid: int | None = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._metrics = {"hashes": 0, "checks": 0, "rehashes": 0, "rejected": 0, "busy_ms": 0.0, "pool_restarts": 0}
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            # A pool inherited through fork() belongs to the parent
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                )
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _discard_pool(self, broken: ProcessPoolExecutor) -> None:
+        """Drop ``broken`` so the next call starts a fresh pool (no-op if already replaced)."""
+        with self._lock:
+            if self._pool is not broken:
+                return
+            self._pool = None
+            self._metrics["pool_restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=QUEUE_TIMEOUT_SECONDS):
+            self._metrics["rejected"] += 1
+            raise PasswordPoolBusy("Too many sign-in attempts in progress; try again shortly.")
+        start = time.perf_counter()
+        try:
+            pool = self._executor()
+            try:
+                return pool.submit(fn, *args).result()
+            except BrokenProcessPool:
+                # A pool process died; hashing is idempotent, so retry once on a fresh pool
+                self._discard_pool(pool)
+                return self._executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+            self._metrics["busy_ms"] += (time.perf_counter() - start) * 1000
+
+    def hash(self, password: str) -> str:
+        """bcrypt hash of ``password`` at the configured cost."""
+        self._metrics["hashes"] += 1
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, pw_hash: str, password: str) -> tuple[bool, str | None]:
+        """
+        Check ``password`` against ``pw_hash``. Returns (matches, new_hash);
+        ``new_hash`` is set when the stored hash used another cost and should
+        replace it.
+        """
+        self._metrics["checks"] += 1
+        ok, new_hash = self._run(_verify, pw_hash, password, self.rounds)
+        if new_hash:
+            self._metrics["rehashes"] += 1
+        return ok, new_hash
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            **self._metrics,
+        }
+
+
+passwords = PasswordHasher()
+
+
+# ─── Benchmark ────────────────────────────────────────────────────────────────
+
+def bench(rounds: int, seconds: float, workers: int) -> None:
+    pw_hash = _hash("benchmark-password", rounds)
+
+    # Inline: one thread, one core
+    count, deadline = 0, time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        _verify(pw_hash, "benchmark-password", rounds)
+        count += 1
+    inline = count / seconds
+
+    # Pool: keep every worker busy with 2 checks in flight each
+    hasher = PasswordHasher(rounds=rounds, workers=workers, queue_size=workers * 2)
+    pool = hasher._executor()
+    wait([pool.submit(_hash, "warm-up", 4) for _ in range(workers)])   # spawn the processes first
+    count, pending, deadline = 0, set(), time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline or pending:
+        while time.perf_counter() < deadline and len(pending) < workers * 2:
+            pending.add(pool.submit(_verify, pw_hash, "benchmark-password", rounds))
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        count += len(done)
+    pooled = count / (time.perf_counter() - start)
+    hasher.stop()
+
+    print(f"bcrypt cost {rounds}: {1000 / inline:.1f} ms per check")
+    print(f"  inline     {inline:>8.1f} logins/s (1 core)")
+    print(f"  pool x{workers:<3}  {pooled:>8.1f} logins/s ({pooled / workers:.1f} per core)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Password hashing pool.")
+    parser.add_argument("--bench", action="store_true", help="measure logins/s inline and through the pool")
+    parser.add_argument("--rounds", type=int, default=ROUNDS)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.rounds, args.seconds, args.workers)
+    else:
+        print(passwords.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
 from flask import Blueprint, request, jsonify
 import psycopg2
 from db.db_setup import get_db_connection
+from db.queries import execute_named
+from auth.blocklist import revocations
+from auth.passwords import PasswordPoolBusy, passwords
 import re
 import os
-from extensions import bcrypt, limiter
+from extensions import limiter, session_limit
 import datetime
 from flask_jwt_extended import (
     jwt_required,
@@ -32,34 +35,43 @@ def is_valid_email(email):
     
     
 def is_token_revoked(jti):
-    """Check if the current jti is revoked"""
+    """Check if the current jti is revoked (served from the in-process blocklist cache)"""
+    return revocations.is_revoked(jti)
+
+
+def add_token_to_blocklist(jti, token_type, user_id=None, expires_at=None):
+    """Add a jti to the blocklist table and this worker's cache"""
     with get_db_connection() as conn:
         cur = conn.cursor()
         try:
-            cur.execute("SELECT 1 FROM token_blocklist WHERE jti=%s;", (jti,))
-            exists = cur.fetchone() is not None
+            execute_named(
+                cur, "token_revoke",
+                (jti, token_type, user_id, datetime.datetime.utcnow(), expires_at)
+            )
+            conn.commit()
         except Exception as e:
             conn.rollback()
             return jsonify({"error": str(e)}), 400
         finally:
             cur.close()
 
-    return exists
+    revocations.revoke(jti)
 
 
-def add_token_to_blocklist(jti, token_type, user_id=None):
-    """Add a jti to the blocklist table"""
+def rehash_password(user_id, old_hash, new_hash):
+    """Store a hash recomputed at the current BCRYPT_ROUNDS (best effort; login proceeds regardless)"""
     with get_db_connection() as conn:
         cur = conn.cursor()
         try:
+            # Skip if the password changed since it was read
             cur.execute(
-                "INSERT INTO token_blocklist (jti, token_type, user_id, revoked_at) VALUES (%s, %s, %s, %s) ON CONFLICT DO NOTHING;",
-                (jti, token_type, user_id, datetime.datetime.utcnow())
+                "UPDATE users SET password = %s WHERE id = %s AND password = %s;",
+                (new_hash, user_id, old_hash)
             )
             conn.commit()
         except Exception as e:
             conn.rollback()
-            return jsonify({"error": str(e)}), 400
+            print(f"Could not rehash password for user {user_id}: {e}")
         finally:
             cur.close()
 
@@ -82,7 +94,10 @@ def signup():
     if not is_valid_email(email=email):
         return jsonify({"error": "Invalid Email"}), 400
 
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+    try:
+        hashed_password = passwords.hash(password)
+    except PasswordPoolBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
     
     with get_db_connection() as conn:
         cur = conn.cursor()
@@ -120,7 +135,7 @@ def signin():
     with get_db_connection() as conn:
         cur = conn.cursor()
         try:
-            cur.execute("SELECT id, password FROM users WHERE username=%s;", (username,))
+            execute_named(cur, "user_credentials_by_username", (username,))
             user = cur.fetchone()
         except Exception as e:
             conn.rollback()
@@ -131,8 +146,14 @@ def signin():
     if not user:
         return jsonify({"error": "Invalid username or password"}), 401
     user_id, pw_hash = user
-    if not bcrypt.check_password_hash(pw_hash, password):
+    try:
+        ok, new_hash = passwords.verify(pw_hash, password)
+    except PasswordPoolBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
+    if not ok:
         return jsonify({"error": "Invalid username or password"}), 401
+    if new_hash:
+        rehash_password(user_id, pw_hash, new_hash)
 
     access_token = create_access_token(identity=str(user_id), fresh=True)
     refresh_token = create_refresh_token(identity=str(user_id))
@@ -145,15 +166,13 @@ def signin():
 
 
 @auth_bp.route('/refresh', methods=['POST'])
+@session_limit()
 @jwt_required(refresh=True)
 def refresh_access_token():
     """Use refresh token to get the access token"""
     identity = get_jwt_identity()
-    jti = get_jwt()['jti']
 
-    if is_token_revoked(jti=jti):
-        return jsonify({"message": "Token revoked"}), 401
-    
+    # Revoked refresh tokens are rejected by the JWTManager blocklist loader
     new_access_token = create_access_token(identity=identity)
     response = jsonify({"message" : "Access token refreshed", "access_token": new_access_token})
     
@@ -161,6 +180,7 @@ def refresh_access_token():
 
 
 @auth_bp.route('/me', methods=['GET'])
+@session_limit()
 @jwt_required()
 def get_current_user():
     """Get the current user"""
@@ -176,7 +196,9 @@ def logout():
     jti = jwt['jti']
     identity = get_jwt_identity()
 
-    add_token_to_blocklist(jti=jti, token_type="access", user_id=identity)
+    expires_at = datetime.datetime.fromtimestamp(jwt['exp'], tz=datetime.timezone.utc) if 'exp' in jwt else None
+
+    add_token_to_blocklist(jti=jti, token_type="access", user_id=identity, expires_at=expires_at)
 
     response = jsonify({"message": "Logout successful"})
 
@@ -15,14 +15,36 @@ class BaseConfig:
     CORS_SUPPORTS_CREDENTIALS = False
     CORS_ALLOW_HEADERS = ["Content-Type", "Authorization", "X-Requested-With"]
     CORS_METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
-    CORS_EXPOSE_HEADERS = ["Content-Type"]
+    CORS_EXPOSE_HEADERS = [
+        "Content-Type",
+        "X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset", "Retry-After",
+    ]
 
     # Token expiry minutes
     JWT_ACCESS_TOKEN_EXPIRES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRES", 1600))
     JWT_REFRESH_TOKEN_EXPIRES = int(os.getenv("JWT_REFRESH_TOKEN_EXPIRES", 604800))
 
+    # Database connection pool
+    DB_POOL_MIN_CONN = int(os.getenv("DB_POOL_MIN_CONN", 1))
+    DB_POOL_MAX_CONN = int(os.getenv("DB_POOL_MAX_CONN", 20))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 5))                     # seconds to wait for a free connection
+    DB_POOL_MAX_AGE = float(os.getenv("DB_POOL_MAX_AGE", 1800))                  # recycle connections older than this
+    DB_POOL_CHECK_IDLE_AFTER = float(os.getenv("DB_POOL_CHECK_IDLE_AFTER", 30))  # SELECT 1 on checkout after this idle time
+
+    # Read replica (DATABASE_REPLICA_URL); read-only callers fall back to the primary
+    DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", 30))                      # seconds of replay lag tolerated
+    DB_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL", 5))  # re-measure lag at most this often
+    DB_REPLICA_RETRY_AFTER = float(os.getenv("DB_REPLICA_RETRY_AFTER", 30))              # skip an unhealthy replica this long
+
     # RATE LIMIT defaults
-    RATELIMIT_DEFAULT = "15 per minute"
+    RATELIMIT_DEFAULT = os.getenv("RATELIMIT_DEFAULT", "15 per minute")                # per route, undecorated routes
+    RATELIMIT_API_BUDGET = os.getenv("RATELIMIT_API_BUDGET", "300 per minute")         # shared by api_cost() routes
+    RATELIMIT_SESSION = os.getenv("RATELIMIT_SESSION", "120 per minute")               # session_limit() routes: polled or per-page reads
+    RATELIMIT_STRATEGY = os.getenv("RATELIMIT_STRATEGY", "sliding-window-counter")     # two counters per key, no per-hit log
+    RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "memory://")            # redis://... to share across workers
+    RATELIMIT_IN_MEMORY_FALLBACK_ENABLED = True                                        # keep limiting if the shared store is down
+    RATELIMIT_HEADERS_ENABLED = True
+    RATELIMIT_KEY_PREFIX = "airsense"
 
 class DevConfig(BaseConfig):
     """Development config: Allow non-HTTPS and non-CSRF protect"""
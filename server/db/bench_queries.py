@@ -0,0 +1,82 @@
+"""
+Benchmark text vs prepared execution of the registered hot statements.
+
+Runs each statement N times on one connection as plain text and as
+PREPARE/EXECUTE and reports the mean round trip and the server-side
+planning time saved, projected to a given request rate:
+
+    python -m db.bench_queries --iterations 2000 --rps 200
+"""
+
+import argparse
+import statistics
+import time
+from datetime import datetime
+
+from .db_setup import get_db_connection, initialize_connection_pool
+from . import queries
+
+# Representative parameters for statements that take them
+SAMPLE_PARAMS = {
+    "aq_by_node": (1,),
+    "token_is_revoked": ("00000000-0000-0000-0000-000000000000",),
+    "user_credentials_by_username": ("benchmark-user",),
+    "user_by_id": (1,),
+    "health_profile_by_user": (1,),
+    "reports_by_user": (1, 21),
+    "reports_by_user_after": (1, datetime(2100, 1, 1), 2**31 - 1, 21),
+}
+
+READ_ONLY = ["aq_latest_per_node", "aq_by_node", "token_is_revoked",
+             "user_credentials_by_username", "user_by_id", "health_profile_by_user", "reports_by_user",
+             "reports_by_user_after"]
+
+
+def _time_calls(cur, name: str, params: tuple, iterations: int, prepared: bool) -> list[float]:
+    queries.PREPARED_ENABLED = prepared
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        queries.execute_named(cur, name, params)
+        cur.fetchall()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _planning_ms(cur, name: str, params: tuple) -> float:
+    sql, order = queries._TEXT_QUERIES[name]
+    cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql, [params[i] for i in order])
+    return float(cur.fetchone()[0][0]["Planning Time"])
+
+
+def run(iterations: int, rps: float) -> None:
+    print(f"{'statement':<30} {'text µs':>9} {'prep µs':>9} {'saved µs':>9} {'plan ms':>8} {'CPU s/h saved':>14}")
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            for name in READ_ONLY:
+                params = SAMPLE_PARAMS.get(name, ())
+                text = statistics.mean(_time_calls(cur, name, params, iterations, prepared=False))
+                prep = statistics.mean(_time_calls(cur, name, params, iterations, prepared=True))
+                saved = text - prep
+                print(
+                    f"{name:<30} {text * 1e6:>9.1f} {prep * 1e6:>9.1f} {saved * 1e6:>9.1f} "
+                    f"{_planning_ms(cur, name, params):>8.3f} {saved * rps * 3600:>14.1f}"
+                )
+            conn.rollback()
+        finally:
+            cur.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Prepared vs text statement benchmark.")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--rps", type=float, default=200.0, help="request rate used for the hourly projection")
+    args = parser.parse_args()
+
+    initialize_connection_pool()
+    run(args.iterations, args.rps)
+
+
+if __name__ == "__main__":
+    main()
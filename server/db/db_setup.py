@@ -1,38 +1,85 @@
+import math
 import psycopg2
-from psycopg2 import pool
 import os
+import time
 from dotenv import load_dotenv
-from .schmea import SCHEMA_LIST
+from psycopg2.pool import PoolError
+from .pool import ConnectionPool
 from contextlib import contextmanager
 
 load_dotenv()
 
 postgreSQL_pool = None
+replica_pool = None
 
-def initialize_connection_pool():
+# Replica routing state: lag is re-measured at most every lag_check_interval
+# seconds and an unhealthy replica is skipped until skip_until
+_replica = {
+    "max_lag": 30.0,
+    "lag_check_interval": 5.0,
+    "retry_after": 30.0,
+    "lag_s": None,
+    "checked_at": 0.0,
+    "skip_until": 0.0,
+    "last_error": None,
+    "replica_checkouts": 0,
+    "fallbacks": 0,
+}
+
+# 0 when the standby is streaming and has replayed everything it received
+# (an idle primary would otherwise look "behind" by the time since its last
+# commit). With no WAL receiver running, "replayed everything received" says
+# nothing about freshness, so fall back to the age of the last replayed
+# commit, and to infinity if nothing was replayed since startup.
+_REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+             AND EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE pid IS NOT NULL) THEN 0
+        ELSE COALESCE(
+            EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())::float8,
+            'Infinity'::float8
+        )
+    END;
+"""
+
+def _dsn_with_ssl(database_url, ssl_config):
+    if '?' in database_url:
+        return f"{database_url}&sslmode={ssl_config}"
+    return f"{database_url}?sslmode={ssl_config}"
+
+def initialize_connection_pool(config=None):
     """
     Create connection pool, appending SSL mode directly to DSN to avoid keyword conflicts.
     Priority 1: DATABASE_URL (Production/Render/Supabase Pooler)
     Priority 2: Individual Params (Local Development)
+
+    Pool sizing, checkout timeout and connection max age come from the
+    DB_POOL_* keys of ``config`` (the Flask app config), defaulting to BaseConfig.
+    When DATABASE_REPLICA_URL is set a second pool of the same size is opened
+    for ``get_db_connection(readonly=True)``.
     """
-    global postgreSQL_pool
-    
+    global postgreSQL_pool, replica_pool
+    from config import BaseConfig
+
+    config = config if config is not None else {}
+
+    def setting(key):
+        return config.get(key, getattr(BaseConfig, key))
+
     is_prod = os.getenv("FLASK_ENV") == "production"
     ssl_config = "require" if is_prod else "disable"
 
     pool_kwargs = {
-        "minconn": 1,
-        "maxconn": 20,
+        "minconn": setting("DB_POOL_MIN_CONN"),
+        "maxconn": setting("DB_POOL_MAX_CONN"),
+        "timeout": setting("DB_POOL_TIMEOUT"),
+        "max_age": setting("DB_POOL_MAX_AGE"),
+        "check_idle_after": setting("DB_POOL_CHECK_IDLE_AFTER"),
     }
 
     if os.getenv('DATABASE_URL'):
-        database_url = os.getenv('DATABASE_URL')
-        
-        if '?' in database_url:
-            final_dsn = f"{database_url}&sslmode={ssl_config}"
-        else:
-            final_dsn = f"{database_url}?sslmode={ssl_config}"
-            
+        final_dsn = _dsn_with_ssl(os.getenv('DATABASE_URL'), ssl_config)
         print(f"Initializing pool using DSN (SSL: {ssl_config})...")
         pool_kwargs["dsn"] = final_dsn
 
@@ -50,37 +97,105 @@ def initialize_connection_pool():
         return
 
     try:
-        postgreSQL_pool = pool.ThreadedConnectionPool(**pool_kwargs)
-        print("Connection pool created successfully")
+        postgreSQL_pool = ConnectionPool(**pool_kwargs)
+        print(f"Connection pool created successfully ({pool_kwargs['minconn']} pre-warmed, max {pool_kwargs['maxconn']})")
     except psycopg2.Error as e:
         print(f"Error initializing connection pool: {e}")
 
+    _replica["max_lag"] = setting("DB_REPLICA_MAX_LAG")
+    _replica["lag_check_interval"] = setting("DB_REPLICA_LAG_CHECK_INTERVAL")
+    _replica["retry_after"] = setting("DB_REPLICA_RETRY_AFTER")
+
+    if os.getenv('DATABASE_REPLICA_URL'):
+        replica_kwargs = {k: v for k, v in pool_kwargs.items() if k in ("maxconn", "timeout", "max_age", "check_idle_after")}
+        # An unreachable replica must not block startup; reads fall back to the primary
+        replica_kwargs["minconn"] = 0
+        replica_kwargs["dsn"] = _dsn_with_ssl(os.getenv('DATABASE_REPLICA_URL'), ssl_config)
+        try:
+            replica_pool = ConnectionPool(**replica_kwargs)
+            print(f"Replica pool created (max {replica_kwargs['maxconn']}, max lag {_replica['max_lag']}s)")
+        except psycopg2.Error as e:
+            print(f"Error initializing replica pool: {e}")
+
+def _mark_replica_unhealthy(reason):
+    _replica["skip_until"] = time.monotonic() + _replica["retry_after"]
+    _replica["last_error"] = reason
+
+def _checkout_replica():
+    """Return a replica connection within the lag budget, or None to use the primary."""
+    if replica_pool is None or time.monotonic() < _replica["skip_until"]:
+        return None
+
+    try:
+        conn = replica_pool.getconn()
+    except (psycopg2.Error, PoolError) as e:
+        _mark_replica_unhealthy(f"checkout failed: {e}")
+        return None
+
+    now = time.monotonic()
+    if now - _replica["checked_at"] >= _replica["lag_check_interval"]:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(_REPLICA_LAG_SQL)
+                _replica["lag_s"] = float(cur.fetchone()[0])
+            conn.rollback()
+            _replica["checked_at"] = now
+        except psycopg2.Error as e:
+            replica_pool.putconn(conn, close=True)
+            _mark_replica_unhealthy(f"lag check failed: {e}")
+            return None
+
+    if _replica["lag_s"] is not None and _replica["lag_s"] > _replica["max_lag"]:
+        replica_pool.putconn(conn)
+        _mark_replica_unhealthy(f"replication lag {_replica['lag_s']:.1f}s exceeds {_replica['max_lag']}s")
+        return None
+
+    _replica["replica_checkouts"] += 1
+    return conn
+
 @contextmanager
-def get_db_connection():
-    """Context manager for database connections with safety check"""
+def get_db_connection(readonly=False):
+    """
+    Context manager for database connections with safety check.
+
+    ``readonly=True`` routes to the replica pool when one is configured,
+    reachable and within DB_REPLICA_MAX_LAG, and to the primary otherwise.
+    Read-only callers must tolerate data that is up to that many seconds old.
+    """
     if postgreSQL_pool is None:
         raise RuntimeError("Database connection pool is not initialized.")
 
-    conn = postgreSQL_pool.getconn()
+    source, conn = postgreSQL_pool, None
+    if readonly:
+        conn = _checkout_replica()
+        if conn is not None:
+            source = replica_pool
+        elif replica_pool is not None:
+            _replica["fallbacks"] += 1
+    if conn is None:
+        conn = postgreSQL_pool.getconn()
+
     try:
         yield conn
     finally:
-        postgreSQL_pool.putconn(conn=conn)
+        source.putconn(conn=conn)
 
-def initialize_database_and_create_tables():
-    """Create all tables on startup"""
-    try:
-        with get_db_connection() as conn:
-            cur = conn.cursor()
-            try:
-                for create_table in SCHEMA_LIST:
-                    cur.execute(create_table)
-                conn.commit()
-                print("Tables check completed.")
-            except psycopg2.Error as e:
-                print(f"Database Schema Error: {e}")
-                conn.rollback()
-            finally:
-                cur.close()
-    except RuntimeError as e:
-        print(f"Skipping table creation: {e}")
\ No newline at end of file
+def get_pool_stats() -> dict | None:
+    """Pool gauges (size, utilisation, wait and checkout times) for the health endpoint."""
+    return postgreSQL_pool.stats() if postgreSQL_pool is not None else None
+
+def get_replica_stats() -> dict | None:
+    """Replica pool gauges plus last measured lag and primary fallbacks, or None without a replica."""
+    if replica_pool is None:
+        return None
+    stats = replica_pool.stats()
+    stats.update({
+        # Infinity (receiver down, nothing replayed) is not valid JSON
+        "lag_s": _replica["lag_s"] if _replica["lag_s"] is None or math.isfinite(_replica["lag_s"]) else None,
+        "max_lag_s": _replica["max_lag"],
+        "healthy": time.monotonic() >= _replica["skip_until"],
+        "last_error": _replica["last_error"],
+        "replica_checkouts": _replica["replica_checkouts"],
+        "fallbacks": _replica["fallbacks"],
+    })
+    return stats
@@ -0,0 +1,232 @@
+"""
+Versioned schema migrations.
+
+Each migration runs once, in its own transaction, and is recorded in the
+``schema_version`` table. Apply pending migrations from a deploy step
+(never from the web workers):
+
+    python -m db.migrations            # apply everything pending
+    python -m db.migrations --status   # show applied / pending versions
+
+App startup only calls ``check_schema_version``, a single SELECT.
+
+To change the schema, append a new ``(version, name, apply)`` entry to
+MIGRATIONS; never edit one that has already shipped.
+"""
+
+import argparse
+
+import psycopg2
+from psycopg2 import errors
+
+from . import partitions
+from .db_setup import get_db_connection, initialize_connection_pool
+from .schmea import (
+    ALTER_AIR_QUALITY_ADD_GEOHASH,
+    ALTER_POLLUTION_REPORTS_ADD_DERIVED_IMAGES,
+    ALTER_POLLUTION_REPORTS_ADD_GEOHASH,
+    ALTER_POLLUTION_REPORTS_ADD_IMAGE_CLAIM,
+    ALTER_POLLUTION_REPORTS_CREATED_AT_NOT_NULL,
+    BACKFILL_POLLUTION_REPORTS_CREATED_AT,
+    CREATE_FUNCTION_GEOHASH_ENCODE,
+    CREATE_INDEX_ALERT_NOTIFICATIONS_USER,
+    CREATE_INDEX_ALERT_SUBSCRIPTIONS_USER,
+    CREATE_INDEX_AIR_QUALITY_GEOHASH,
+    CREATE_INDEX_POLLUTION_REPORTS_CREATED,
+    CREATE_INDEX_POLLUTION_REPORTS_GEOHASH,
+    CREATE_INDEX_POLLUTION_REPORTS_IMAGE_KEY,
+    CREATE_INDEX_POLLUTION_REPORTS_UNPROCESSED,
+    CREATE_INDEX_POLLUTION_REPORTS_USER_CREATED,
+    CREATE_INDEX_S3_DELETION_OUTBOX_DUE,
+    CREATE_TABLE_ALERT_NOTIFICATIONS,
+    CREATE_TABLE_ALERT_SUBSCRIPTIONS,
+    CREATE_TABLE_S3_DELETION_OUTBOX,
+    CREATE_TABLE_SCHEMA_VERSION,
+    SCHEMA_LIST,
+)
+
+# Serialises concurrent `db.migrations` runs (e.g. two deploys racing)
+_ADVISORY_LOCK_ID = 427_001
+
+schema_status = {"current": None, "expected": None, "up_to_date": False}
+
+
+def _sql(*statements: str):
+    """Build a migration step that executes ``statements`` in order."""
+    def apply(cur) -> None:
+        for statement in statements:
+            cur.execute(statement)
+    return apply
+
+
+def _baseline(cur) -> None:
+    # Every statement is IF NOT EXISTS, so this also adopts databases
+    # created by the old create-on-boot path without touching their data
+    _sql(*SCHEMA_LIST)(cur)
+    if partitions.is_partitioned(cur):
+        partitions.ensure_partitions(cur)
+
+
+def _token_blocklist_expiry(cur) -> None:
+    from config import BaseConfig
+
+    cur.execute("ALTER TABLE token_blocklist ADD COLUMN IF NOT EXISTS expires_at timestamptz;")
+    # Older rows never recorded the token's exp; no token outlives the refresh lifetime
+    cur.execute(
+        """
+        UPDATE token_blocklist
+        SET expires_at = (revoked_at AT TIME ZONE 'UTC') + make_interval(secs => %s)
+        WHERE expires_at IS NULL;
+        """,
+        (BaseConfig.JWT_REFRESH_TOKEN_EXPIRES,),
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_token_blocklist_revoked_at ON token_blocklist (revoked_at);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_token_blocklist_expires_at ON token_blocklist (expires_at);")
+
+
+MIGRATIONS = [
+    (1, "baseline schema", _baseline),
+    (2, "token_blocklist expiry for cache refresh and purge", _token_blocklist_expiry),
+    (3, "air_quality_data geohash column and index", _sql(
+        CREATE_FUNCTION_GEOHASH_ENCODE,
+        ALTER_AIR_QUALITY_ADD_GEOHASH,
+        CREATE_INDEX_AIR_QUALITY_GEOHASH,
+    )),
+    (4, "s3_deletion_outbox", _sql(
+        CREATE_TABLE_S3_DELETION_OUTBOX,
+        CREATE_INDEX_S3_DELETION_OUTBOX_DUE,
+    )),
+    (5, "unique pollution_reports.image_key", _sql(CREATE_INDEX_POLLUTION_REPORTS_IMAGE_KEY)),
+    (6, "pollution_reports derived image keys", _sql(
+        ALTER_POLLUTION_REPORTS_ADD_DERIVED_IMAGES,
+        CREATE_INDEX_POLLUTION_REPORTS_UNPROCESSED,
+    )),
+    (7, "pollution_reports geohash column and index", _sql(
+        ALTER_POLLUTION_REPORTS_ADD_GEOHASH,
+        CREATE_INDEX_POLLUTION_REPORTS_GEOHASH,
+    )),
+    (8, "alert subscriptions and notifications", _sql(
+        CREATE_TABLE_ALERT_SUBSCRIPTIONS,
+        CREATE_INDEX_ALERT_SUBSCRIPTIONS_USER,
+        CREATE_TABLE_ALERT_NOTIFICATIONS,
+        CREATE_INDEX_ALERT_NOTIFICATIONS_USER,
+    )),
+    (9, "pollution_reports keyset pagination indexes", _sql(
+        BACKFILL_POLLUTION_REPORTS_CREATED_AT,
+        ALTER_POLLUTION_REPORTS_CREATED_AT_NOT_NULL,
+        CREATE_INDEX_POLLUTION_REPORTS_USER_CREATED,
+        CREATE_INDEX_POLLUTION_REPORTS_CREATED,
+    )),
+    (10, "pollution_reports image processing claim", _sql(ALTER_POLLUTION_REPORTS_ADD_IMAGE_CLAIM)),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _applied_versions(cur) -> set[int]:
+    cur.execute("SELECT version FROM schema_version;")
+    return {row[0] for row in cur.fetchall()}
+
+
+def pending_migrations() -> list[tuple]:
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(CREATE_TABLE_SCHEMA_VERSION)
+            applied = _applied_versions(cur)
+            conn.commit()
+            return [m for m in MIGRATIONS if m[0] not in applied]
+        finally:
+            cur.close()
+
+
+def migrate(target: int | None = None) -> list[int]:
+    """Apply pending migrations up to ``target`` (default: latest). Returns the versions applied."""
+    target = LATEST_VERSION if target is None else target
+    applied_now = []
+
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(CREATE_TABLE_SCHEMA_VERSION)
+            conn.commit()
+
+            for version, name, apply in MIGRATIONS:
+                if version > target:
+                    break
+                try:
+                    cur.execute("SELECT pg_advisory_xact_lock(%s);", (_ADVISORY_LOCK_ID,))
+                    # Re-read under the lock: another runner may have got here first
+                    if version in _applied_versions(cur):
+                        conn.rollback()
+                        continue
+                    apply(cur)
+                    cur.execute(
+                        "INSERT INTO schema_version (version, name) VALUES (%s, %s);",
+                        (version, name),
+                    )
+                    conn.commit()
+                    applied_now.append(version)
+                    print(f"Applied migration {version}: {name}")
+                except Exception:
+                    conn.rollback()
+                    print(f"Migration {version} ({name}) failed; rolled back.")
+                    raise
+        finally:
+            cur.close()
+
+    return applied_now
+
+
+def check_schema_version() -> dict:
+    """
+    Startup check: one query, no DDL. Records the result in ``schema_status``
+    (reported by /health) and warns when migrations are pending.
+    """
+    schema_status["expected"] = LATEST_VERSION
+    try:
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT max(version) FROM schema_version;")
+                current = cur.fetchone()[0] or 0
+            except errors.UndefinedTable:
+                current = 0
+            finally:
+                conn.rollback()
+                cur.close()
+    except (RuntimeError, psycopg2.Error) as e:
+        print(f"Skipping schema version check: {e}")
+        return schema_status
+
+    schema_status["current"] = current
+    schema_status["up_to_date"] = current >= LATEST_VERSION
+    if current < LATEST_VERSION:
+        print(
+            f"WARNING: database schema is at version {current}, code expects {LATEST_VERSION}. "
+            "Run `python -m db.migrations` before serving traffic."
+        )
+    return schema_status
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Apply versioned database migrations.")
+    parser.add_argument("--status", action="store_true", help="list pending migrations and exit")
+    parser.add_argument("--target", type=int, default=None, help="stop after this version")
+    args = parser.parse_args()
+
+    initialize_connection_pool()
+
+    if args.status:
+        pending = pending_migrations()
+        print(f"Latest version: {LATEST_VERSION}; pending: {[m[0] for m in pending] or 'none'}")
+        for version, name, _ in pending:
+            print(f"  {version}: {name}")
+        return
+
+    applied = migrate(args.target)
+    print(f"Applied {len(applied)} migration(s)." if applied else "Schema is up to date.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Monthly partition maintenance for air_quality_data.
+
+Pre-creates partitions for upcoming months and detaches + drops partitions
+older than the retention window, so expiring a month of readings is a
+metadata operation instead of a bulk DELETE. Readings that arrive for a month
+without a partition land in the default partition; the next run creates that
+month and moves them across, and the default partition is purged by the same
+retention window. Run it from a scheduler:
+
+    python -m db.partitions
+    python -m db.partitions --convert-legacy   # one-off, for pre-partitioning databases
+"""
+
+import argparse
+import os
+import re
+from datetime import date
+
+import psycopg2
+from dotenv import load_dotenv
+
+from .db_setup import get_db_connection, initialize_connection_pool
+
+load_dotenv()
+
+PARENT_TABLE = "air_quality_data"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+PARTITION_PATTERN = re.compile(rf"^{PARENT_TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+RETENTION_MONTHS = int(os.getenv("AIR_QUALITY_RETENTION_MONTHS", 12))
+PARTITIONS_AHEAD = int(os.getenv("AIR_QUALITY_PARTITIONS_AHEAD", 3))
+
+
+def _add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def is_partitioned(cur) -> bool:
+    cur.execute("SELECT relkind FROM pg_class WHERE relname = %s;", (PARENT_TABLE,))
+    row = cur.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def _stored_columns(cur, table: str) -> str:
+    """Comma-separated non-generated columns of ``table`` (generated ones are recomputed on insert)."""
+    cur.execute(
+        """
+        SELECT column_name FROM information_schema.columns
+        WHERE table_name = %s AND is_generated = 'NEVER'
+        ORDER BY ordinal_position;
+        """,
+        (table,),
+    )
+    return ", ".join(name for (name,) in cur.fetchall())
+
+
+def _create_month(cur, month: date) -> int:
+    """
+    Create the partition for ``month``. Postgres refuses to add a range the
+    default partition still holds rows for, so any such rows are moved into
+    the new partition in the same transaction. Returns the rows moved.
+    """
+    name = partition_name(month)
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (name,))
+    if cur.fetchone()[0]:
+        return 0
+
+    bounds = (month.isoformat(), _add_months(month, 1).isoformat())
+    # Savepoint so one bad month is reported without aborting the surrounding transaction
+    cur.execute("SAVEPOINT create_partition;")
+    try:
+        # Held until commit: no reading for this month can reach the default between the move and the CREATE
+        cur.execute(f"LOCK TABLE {DEFAULT_PARTITION} IN SHARE ROW EXCLUSIVE MODE;")
+        cur.execute(
+            f"""
+            CREATE TEMP TABLE _partition_move AS
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION}
+                WHERE timestamp >= %s AND timestamp < %s
+                RETURNING *
+            )
+            SELECT * FROM moved;
+            """,
+            bounds,
+        )
+        moved = cur.rowcount
+        cur.execute(
+            f"""
+            CREATE TABLE {name}
+            PARTITION OF {PARENT_TABLE}
+            FOR VALUES FROM (%s) TO (%s);
+            """,
+            bounds,
+        )
+        if moved:
+            columns = _stored_columns(cur, PARENT_TABLE)
+            cur.execute(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM _partition_move;")
+            print(f"Moved {moved} rows from {DEFAULT_PARTITION} into {name}")
+        cur.execute("DROP TABLE _partition_move;")
+        cur.execute("RELEASE SAVEPOINT create_partition;")
+        return moved
+    except psycopg2.Error as e:
+        cur.execute("ROLLBACK TO SAVEPOINT create_partition;")
+        print(f"Could not create partition {name}: {e}")
+        return 0
+
+
+def list_partitions(cur) -> list[tuple[str, date]]:
+    """Return (name, month) for every monthly partition, oldest first."""
+    cur.execute(
+        """
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child  ON child.oid  = pg_inherits.inhrelid
+        WHERE parent.relname = %s;
+        """,
+        (PARENT_TABLE,),
+    )
+    partitions = []
+    for (name,) in cur.fetchall():
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            partitions.append((name, date(int(match[1]), int(match[2]), 1)))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def ensure_partitions(
+    cur,
+    months_ahead: int = PARTITIONS_AHEAD,
+    start: date | None = None,
+    retention_months: int = RETENTION_MONTHS,
+) -> None:
+    """
+    Create the default partition and monthly partitions from ``start``
+    through ``months_ahead``, plus a partition for every month within the
+    retention window that has rows sitting in the default partition.
+    """
+    current = date.today().replace(day=1)
+    month = (start or current).replace(day=1)
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT;")
+
+    cur.execute(
+        f"SELECT DISTINCT date_trunc('month', timestamp)::date FROM {DEFAULT_PARTITION} WHERE timestamp >= %s;",
+        (_add_months(current, -retention_months).isoformat(),),
+    )
+    stranded = {row[0] for row in cur.fetchall()}
+
+    months = set()
+    while month <= _add_months(current, months_ahead):
+        months.add(month)
+        month = _add_months(month, 1)
+    for month in sorted(months | stranded):
+        _create_month(cur, month)
+
+
+def drop_expired_partitions(cur, retention_months: int = RETENTION_MONTHS) -> list[str]:
+    """
+    Detach and drop monthly partitions that end before the retention cutoff,
+    and delete default-partition rows older than it.
+    """
+    cutoff = _add_months(date.today().replace(day=1), -retention_months)
+    dropped = []
+    for name, month in list_partitions(cur):
+        if _add_months(month, 1) <= cutoff:
+            cur.execute(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name};")
+            cur.execute(f"DROP TABLE {name};")
+            dropped.append(name)
+
+    cur.execute(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < %s;", (cutoff.isoformat(),))
+    if cur.rowcount:
+        dropped.append(f"{DEFAULT_PARTITION} ({cur.rowcount} rows)")
+    return dropped
+
+
+def convert_legacy_table(cur) -> None:
+    """
+    Move rows from an unpartitioned air_quality_data (created before
+    partitioning) into the partitioned layout. The old table is kept as
+    air_quality_data_legacy for manual removal once verified.
+    """
+    from .schmea import (
+        ALTER_AIR_QUALITY_ADD_GEOHASH,
+        CREATE_INDEX_AIR_QUALITY_GEOHASH,
+        CREATE_INDEX_AIR_QUALITY_NODE_TIMESTAMP,
+        CREATE_TABLE_AIR_QUALITY_DATA,
+    )
+
+    cur.execute(f"ALTER TABLE {PARENT_TABLE} RENAME TO {PARENT_TABLE}_legacy;")
+    cur.execute(f"ALTER TABLE {PARENT_TABLE}_legacy RENAME CONSTRAINT {PARENT_TABLE}_pkey TO {PARENT_TABLE}_legacy_pkey;")
+    cur.execute("ALTER INDEX IF EXISTS idx_air_quality_node_timestamp RENAME TO idx_air_quality_legacy_node_timestamp;")
+    cur.execute("ALTER INDEX IF EXISTS idx_air_quality_geohash_timestamp RENAME TO idx_air_quality_legacy_geohash_timestamp;")
+    cur.execute(CREATE_TABLE_AIR_QUALITY_DATA)
+    cur.execute(CREATE_INDEX_AIR_QUALITY_NODE_TIMESTAMP)
+
+    # Copy only stored columns; generated ones (geohash) are recomputed on insert
+    cur.execute(
+        "SELECT 1 FROM information_schema.columns WHERE table_name = %s AND column_name = 'geohash';",
+        (f"{PARENT_TABLE}_legacy",),
+    )
+    if cur.fetchone() is not None:
+        cur.execute(ALTER_AIR_QUALITY_ADD_GEOHASH)
+        cur.execute(CREATE_INDEX_AIR_QUALITY_GEOHASH)
+    columns = _stored_columns(cur, f"{PARENT_TABLE}_legacy")
+
+    cur.execute(f"SELECT min(timestamp) FROM {PARENT_TABLE}_legacy;")
+    oldest = cur.fetchone()[0]
+    ensure_partitions(cur, start=oldest.date() if oldest else None)
+    cur.execute(
+        f"INSERT INTO {PARENT_TABLE} ({columns}) SELECT {columns} FROM {PARENT_TABLE}_legacy WHERE timestamp IS NOT NULL;"
+    )
+
+
+def run_maintenance(
+    retention_months: int = RETENTION_MONTHS,
+    months_ahead: int = PARTITIONS_AHEAD,
+    convert_legacy: bool = False,
+) -> None:
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            if not is_partitioned(cur):
+                if not convert_legacy:
+                    print(f"{PARENT_TABLE} is not partitioned; rerun with --convert-legacy to migrate it.")
+                    return
+                convert_legacy_table(cur)
+                print(f"Converted {PARENT_TABLE} to monthly partitions (old rows kept in {PARENT_TABLE}_legacy)")
+
+            ensure_partitions(cur, months_ahead=months_ahead, retention_months=retention_months)
+            dropped = drop_expired_partitions(cur, retention_months=retention_months)
+            conn.commit()
+            print(f"Partitions ensured {months_ahead} months ahead; dropped {len(dropped)} expired: {dropped}")
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain monthly air_quality_data partitions.")
+    parser.add_argument("--retention-months", type=int, default=RETENTION_MONTHS)
+    parser.add_argument("--months-ahead", type=int, default=PARTITIONS_AHEAD)
+    parser.add_argument("--convert-legacy", action="store_true")
+    args = parser.parse_args()
+
+    initialize_connection_pool()
+    run_maintenance(args.retention_months, args.months_ahead, args.convert_legacy)
+
+
+if __name__ == "__main__":
+    main()
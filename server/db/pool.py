@@ -0,0 +1,231 @@
+"""
+Blocking connection pool used behind ``db_setup.get_db_connection``.
+
+Unlike ``psycopg2.pool.ThreadedConnectionPool`` this pool:
+  * waits (up to ``timeout`` seconds) for a free connection instead of
+    raising PoolError the moment it is exhausted;
+  * pre-warms ``minconn`` connections at startup;
+  * validates connections on checkout and recycles them once they exceed
+    ``max_age`` seconds, so a connection dropped by the pooler is replaced
+    instead of surfacing as a 500. Recently used connections get a free
+    socket poll (a server that hung up leaves the socket readable); only
+    those that look closed, or sat idle past ``check_idle_after``, pay for
+    a ``SELECT 1``. Opening a replacement is retried once;
+  * keeps wait-time, checkout-duration and utilisation metrics.
+"""
+
+import select
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions, pool
+
+
+class PoolTimeout(pool.PoolError):
+    """Raised when no connection becomes available within the pool timeout."""
+
+
+class PooledConnection(extensions.connection):
+    """psycopg2 connection carrying the bookkeeping the pool needs."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.checked_out_at = None
+        # Names of statements PREPAREd on this session (see db/queries.py);
+        # None once the session turned out not to keep them
+        self.prepared: set[str] | None = set()
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        minconn: int,
+        maxconn: int,
+        timeout: float = 5.0,
+        max_age: float = 1800.0,
+        check_idle_after: float = 30.0,
+        connection_factory=PooledConnection,
+        **connect_kwargs,
+    ):
+        if minconn > maxconn:
+            raise ValueError("minconn must not exceed maxconn")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_age = max_age
+        self.check_idle_after = check_idle_after
+        self._connection_factory = connection_factory
+        self._connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle: list[PooledConnection] = []
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+
+        self._metrics = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "recycled": 0,
+            "failed_checks": 0,
+            "wait_s_total": 0.0,
+            "wait_s_max": 0.0,
+            "checkout_s_total": 0.0,
+            "checkout_s_max": 0.0,
+        }
+
+        # Pre-warm; a failure here should be visible at startup, not on first request
+        for _ in range(minconn):
+            self._idle.append(self._connect())
+            self._size += 1
+
+    def _connect(self) -> PooledConnection:
+        return psycopg2.connect(connection_factory=self._connection_factory, **self._connect_kwargs)
+
+    def _connect_with_retry(self) -> PooledConnection:
+        try:
+            return self._connect()
+        except psycopg2.OperationalError:
+            # One retry covers a pooler restart or a connection reset mid-handshake
+            return self._connect()
+
+    @staticmethod
+    def _socket_readable(conn: PooledConnection) -> bool:
+        """
+        An idle session should have nothing to read. Data or EOF means the
+        server sent a termination notice or closed the socket.
+        """
+        try:
+            readable, _, _ = select.select([conn.fileno()], [], [], 0)
+        except (OSError, ValueError, psycopg2.Error):
+            return True
+        return bool(readable)
+
+    def _check(self, conn: PooledConnection) -> str | None:
+        """Why ``conn`` must be replaced ("recycled" / "failed_checks"), or None if usable."""
+        if conn.closed:
+            return "failed_checks"
+        now = time.monotonic()
+        if now - conn.created_at > self.max_age:
+            return "recycled"
+        if now - conn.last_used < self.check_idle_after and not self._socket_readable(conn):
+            return None
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return None
+        except psycopg2.Error:
+            return "failed_checks"
+
+    def getconn(self) -> PooledConnection:
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        with self._cond:
+            if self._closed:
+                raise pool.PoolError("connection pool is closed")
+            self._waiting += 1
+            try:
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        if not self._idle and self._size >= self.maxconn:
+                            self._metrics["timeouts"] += 1
+                            raise PoolTimeout(
+                                f"No database connection available within {self.timeout}s "
+                                f"({self._size}/{self.maxconn} in use)"
+                            )
+            finally:
+                self._waiting -= 1
+
+            conn = self._idle.pop() if self._idle else None
+            # Reserve the slot now so concurrent callers cannot overshoot maxconn
+            if conn is None:
+                self._size += 1
+
+        try:
+            reason = self._check(conn) if conn is not None else None
+            if reason is not None:
+                with self._cond:
+                    self._metrics[reason] += 1
+                conn.close()
+                conn = None
+            if conn is None:
+                conn = self._connect_with_retry()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._metrics["checkouts"] += 1
+            self._metrics["wait_s_total"] += waited
+            self._metrics["wait_s_max"] = max(self._metrics["wait_s_max"], waited)
+        conn.checked_out_at = time.monotonic()
+        return conn
+
+    def putconn(self, conn: PooledConnection, close: bool = False) -> None:
+        now = time.monotonic()
+        held = now - conn.checked_out_at if conn.checked_out_at else 0.0
+        conn.checked_out_at = None
+
+        if not conn.closed and not close:
+            # Never hand the next caller a connection mid-transaction
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                close = True
+
+        with self._cond:
+            self._metrics["checkout_s_total"] += held
+            self._metrics["checkout_s_max"] = max(self._metrics["checkout_s_max"], held)
+
+            if conn.closed or close or self._closed:
+                if not conn.closed:
+                    conn.close()
+                self._size -= 1
+            else:
+                conn.last_used = now
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def closeall(self) -> None:
+        with self._cond:
+            self._closed = True
+            for conn in self._idle:
+                conn.close()
+            self._size -= len(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        """Gauges and counters for the health endpoint."""
+        with self._cond:
+            m = dict(self._metrics)
+            in_use = self._size - len(self._idle)
+            checkouts = max(1, m["checkouts"])
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": in_use,
+                "waiting": self._waiting,
+                "minconn": self.minconn,
+                "maxconn": self.maxconn,
+                "utilization": round(in_use / self.maxconn, 3),
+                "checkouts": m["checkouts"],
+                "timeouts": m["timeouts"],
+                "recycled": m["recycled"],
+                "failed_checks": m["failed_checks"],
+                "wait_ms_avg": round(m["wait_s_total"] / checkouts * 1e3, 3),
+                "wait_ms_max": round(m["wait_s_max"] * 1e3, 3),
+                "checkout_ms_avg": round(m["checkout_s_total"] / checkouts * 1e3, 3),
+                "checkout_ms_max": round(m["checkout_s_max"] * 1e3, 3),
+            }
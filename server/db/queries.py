@@ -0,0 +1,131 @@
+"""
+Registry of hot SQL statements, prepared once per pooled connection.
+
+Statements are written with PostgreSQL ``$n`` placeholders. ``execute_named``
+issues ``PREPARE`` the first time a connection sees a statement and
+``EXECUTE`` afterwards, so Postgres skips parsing and planning on every
+later call.
+
+Off by default: DATABASE_URL is normally the Supabase transaction-mode pooler
+(port 6543), which hands each transaction a different server session, so a
+statement prepared earlier may not exist where EXECUTE runs. Set
+DB_PREPARED_STATEMENTS=true only for direct or session-mode connections. If
+a session turns out not to keep prepared statements anyway, the connection
+falls back to plain text for the rest of its life.
+"""
+
+import os
+import re
+
+from psycopg2 import errors, extensions
+
+PREPARED_ENABLED = os.getenv("DB_PREPARED_STATEMENTS", "false").lower() == "true"
+
+_AIR_QUALITY_SELECT = """
+    SELECT
+        id, node_id, timestamp,
+        lat, lon,
+        pm25, no2, o3,
+        wind_speed, wind_direction,
+        temperature, humidity,
+        traffic_density, traffic_current_speed,
+        traffic_free_flow_speed, traffic_confidence,
+        risk_score, risk_level
+    FROM air_quality_data
+"""
+
+_USER_COLUMNS = "id, username, email, full_name, phone, age, gender, address, created_at, updated_at"
+
+_REPORT_COLUMNS = """
+    id, user_id, description, lat, lon,
+    image_url, image_key, image_size, mime_type,
+    display_key, thumbnail_keys,
+    status, created_at
+"""
+
+_HEALTH_PROFILE_COLUMNS = """
+    id, user_id,
+    has_asthma, has_copd, has_allergies,
+    has_heart_condition,
+    is_pregnant, takes_inhaler,
+    smoking_status, fitness_level, outdoor_exposure,
+    breathing_difficulty, custom_notes,
+    created_at, updated_at
+"""
+
+QUERIES = {
+    # maps
+    "aq_all": _AIR_QUALITY_SELECT + "ORDER BY timestamp DESC",
+    "aq_by_node": _AIR_QUALITY_SELECT + "WHERE node_id = $1 ORDER BY timestamp DESC",
+    "aq_latest_per_node": _AIR_QUALITY_SELECT.replace("SELECT", "SELECT DISTINCT ON (node_id)", 1)
+        + "ORDER BY node_id, timestamp DESC",
+    # auth
+    "token_is_revoked": "SELECT 1 FROM token_blocklist WHERE jti = $1",
+    "token_revoke": """
+        INSERT INTO token_blocklist (jti, token_type, user_id, revoked_at, expires_at)
+        VALUES ($1, $2, $3, $4, $5) ON CONFLICT DO NOTHING
+    """,
+    "user_credentials_by_username": "SELECT id, password FROM users WHERE username = $1",
+    # user
+    "user_by_id": f"SELECT {_USER_COLUMNS} FROM users WHERE id = $1",
+    "health_profile_by_user": f"SELECT {_HEALTH_PROFILE_COLUMNS} FROM user_health_profiles WHERE user_id = $1",
+    # Keyset pages: (created_at, id) of the last row seen is the cursor,
+    # served from idx_pollution_reports_user_created
+    "reports_by_user": f"""
+        SELECT {_REPORT_COLUMNS}
+        FROM pollution_reports
+        WHERE user_id = $1
+        ORDER BY created_at DESC, id DESC
+        LIMIT $2
+    """,
+    "reports_by_user_after": f"""
+        SELECT {_REPORT_COLUMNS}
+        FROM pollution_reports
+        WHERE user_id = $1 AND (created_at, id) < ($2, $3)
+        ORDER BY created_at DESC, id DESC
+        LIMIT $4
+    """,
+}
+
+_PLACEHOLDER = re.compile(r"\$(\d+)")
+
+# Text-mode equivalents (%s placeholders plus the order $n values appear in)
+_TEXT_QUERIES = {
+    name: (_PLACEHOLDER.sub("%s", sql), [int(n) - 1 for n in _PLACEHOLDER.findall(sql)])
+    for name, sql in QUERIES.items()
+}
+
+
+def execute_named(cur, name: str, params: tuple | list = ()) -> None:
+    """Run registered statement ``name`` on ``cur``, preparing it on first use per connection."""
+    conn = cur.connection
+    prepared = getattr(conn, "prepared", None)
+
+    if not PREPARED_ENABLED or prepared is None:
+        _execute_text(cur, name, params)
+        return
+
+    # Only a failure on the transaction's first statement can be retried without losing work
+    first_statement = conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+    try:
+        if name not in prepared:
+            # Prepared statements live for the session and survive rollbacks
+            cur.execute(f"PREPARE {name} AS {QUERIES[name]}")
+            prepared.add(name)
+
+        if params:
+            cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", list(params))
+        else:
+            cur.execute(f"EXECUTE {name}")
+    except (errors.InvalidSqlStatementName, errors.DuplicatePreparedStatement):
+        # The session is not ours across transactions (transaction-mode pooler)
+        conn.prepared = None
+        if not first_statement:
+            raise
+        conn.rollback()
+        _execute_text(cur, name, params)
+
+
+def _execute_text(cur, name: str, params: tuple | list) -> None:
+    sql, order = _TEXT_QUERIES[name]
+    cur.execute(sql, [params[i] for i in order])
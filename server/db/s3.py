@@ -1,10 +1,12 @@
 """Supabase S3 file upload utility for pollution report images."""
 
 import os
+import threading
 import uuid
-from pathlib import PurePosixPath
+from tempfile import SpooledTemporaryFile
 
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 # ── Supabase S3-compatible storage configuration ──────────────────────────────
@@ -14,93 +16,354 @@ from botocore.exceptions import ClientError
 #   SUPABASE_ACCESS_KEY   Supabase service role key (or S3 access key)
 #   SUPABASE_SECRET_KEY   Supabase S3 secret key
 #   SUPABASE_BUCKET       e.g. pollution-reports
+#
+# For a local S3-compatible stand-in (MinIO, moto_server, ...) point
+# SUPABASE_S3_ENDPOINT at it and set S3_PUBLIC_URL_BASE to its public
+# object URL prefix, e.g. http://localhost:9000/pollution-reports
 
 ENDPOINT  = os.getenv("SUPABASE_S3_ENDPOINT")
 REGION    = os.getenv("SUPABASE_S3_REGION", "ap-southeast-1")
 ACCESS_KEY= os.getenv("SUPABASE_ACCESS_KEY")
 SECRET_KEY= os.getenv("SUPABASE_SECRET_KEY")
 BUCKET    = os.getenv("SUPABASE_BUCKET", "pollution-reports")
+PUBLIC_URL_BASE = os.getenv("S3_PUBLIC_URL_BASE")
+ADDRESSING_STYLE = os.getenv("S3_ADDRESSING_STYLE", "path")   # Supabase and most stand-ins need path-style
+
+# Direct-to-storage uploads: presigned POST (size enforced by the policy) or
+# PUT (size and type fixed by signed headers), valid for PRESIGN_EXPIRES seconds
+PRESIGN_METHOD  = os.getenv("S3_PRESIGN_METHOD", "post").lower()
+PRESIGN_EXPIRES = int(os.getenv("S3_PRESIGN_EXPIRES", 600))
+
+# One client per process: boto3 clients are thread-safe, and building one
+# resolves credentials, parses the endpoint and opens a new connection pool
+MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", 32))
+
+_client = None
+_client_lock = threading.Lock()
 
 MAX_SIZE_BYTES = 5 * 1024 * 1024   # 5 MB — matches Supabase bucket policy
+
+# Uploaded originals still carry EXIF/GPS; only the re-encoded derivatives
+# written by user/image_pipeline.py are public
+ORIGINAL_ACL = "private"
 ALLOWED_MIME_PREFIX = "image/"
 
+# Form uploads are spooled (to disk past SPOOL_BYTES, so a request holds at
+# most SPOOL_BYTES in memory) and sent once the body has been received. S3
+# parts must be at least 5 MiB, so with MAX_SIZE_BYTES at 5 MB every report
+# image is a single PUT; multipart only engages for a max_size above PART_SIZE
+SPOOL_BYTES = 256 * 1024
+PART_SIZE = max(5 * 1024 * 1024, int(os.getenv("S3_MULTIPART_PART_SIZE", 8 * 1024 * 1024)))
+
+# Leading bytes -> MIME type; the declared Content-Type is not trusted. Only
+# formats the image pipeline's Pillow can decode without plugins (no HEIC/AVIF)
+_IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+_SNIFF_BYTES = 12
+_EXTENSIONS = {
+    "image/jpeg": ".jpg", "image/png": ".png", "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+
+
+class UploadRejected(Exception):
+    """An upload failed validation; carries the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 422):
+        super().__init__(message)
+        self.status = status
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    """MIME type from an image's magic bytes, or None if it is not a supported image."""
+    for signature, mime in _IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def public_url(object_key: str) -> str:
+    """Public URL of an object (Supabase pattern unless S3_PUBLIC_URL_BASE is set)."""
+    if PUBLIC_URL_BASE:
+        return f"{PUBLIC_URL_BASE.rstrip('/')}/{object_key}"
+    return f"{ENDPOINT.rstrip('/')}/object/public/{BUCKET}/{object_key}"
+
 
 def _get_s3_client():
-    """Return a boto3 S3 client pointing at the Supabase S3 endpoint."""
+    """Return the shared boto3 S3 client for the Supabase S3 endpoint, creating it on first use."""
+    global _client
+    if _client is not None:
+        return _client
+
     if not all([ENDPOINT, ACCESS_KEY, SECRET_KEY]):
         raise RuntimeError(
             "Supabase S3 credentials missing. "
             "Set SUPABASE_S3_ENDPOINT, SUPABASE_ACCESS_KEY, SUPABASE_SECRET_KEY in .env"
         )
-    return boto3.client(
-        "s3",
-        endpoint_url=ENDPOINT,
-        aws_access_key_id=ACCESS_KEY,
-        aws_secret_access_key=SECRET_KEY,
-        region_name=REGION,
-    )
 
+    with _client_lock:
+        if _client is None:
+            # boto3.client() uses the shared default session, which is not thread-safe
+            _client = boto3.session.Session().client(
+                "s3",
+                endpoint_url=ENDPOINT,
+                aws_access_key_id=ACCESS_KEY,
+                aws_secret_access_key=SECRET_KEY,
+                region_name=REGION,
+                config=Config(
+                    signature_version="s3v4",
+                    s3={"addressing_style": ADDRESSING_STYLE},
+                    max_pool_connections=MAX_POOL_CONNECTIONS,
+                    retries={"max_attempts": 3, "mode": "standard"},
+                    connect_timeout=5,
+                    read_timeout=30,
+                ),
+            )
+    return _client
 
-def upload_report_image(file_stream, filename: str, mime_type: str, size_bytes: int) -> dict:
+
+class StreamingImageUpload:
     """
-    Validate and upload an image file to the Supabase S3 bucket.
-
-    Parameters
-    ----------
-    file_stream : file-like object (from flask request.files)
-    filename    : original filename from the client
-    mime_type   : MIME type declared by the client (e.g. 'image/jpeg')
-    size_bytes  : byte length of the file
-
-    Returns
-    -------
-    dict with keys:
-        image_key  — S3 object key
-        image_url  — public URL
-        image_size — file size in bytes
-        mime_type  — validated MIME type
+    Write-only file object that validates an image as it arrives and
+    spools it for upload.
+
+    Used as the werkzeug multipart ``stream_factory`` target: the type is
+    sniffed from the first bytes and the size limit checked on every chunk,
+    so a bad upload is rejected before the rest of the body is read, and
+    the body never sits in memory beyond SPOOL_BYTES. This is spool-then-PUT,
+    not streaming to storage: bodies up to PART_SIZE (every report image
+    under the 5 MB limit) go up in one PUT from ``finish()``. Only a larger
+    ``max_size`` lets full parts leave during the request as a multipart
+    upload.
     """
-    # ── Validation ────────────────────────────────────────────────────────────
-    if not mime_type.startswith(ALLOWED_MIME_PREFIX):
-        raise ValueError(f"Only image/* files are allowed. Got: {mime_type}")
 
-    if size_bytes > MAX_SIZE_BYTES:
-        raise ValueError(f"File exceeds 5 MB limit ({size_bytes} bytes).")
+    def __init__(self, filename: str | None, declared_type: str | None, max_size: int = MAX_SIZE_BYTES):
+        self.filename = filename or ""
+        self.declared_type = declared_type or ""
+        self.max_size = max_size
+        self.mime_type: str | None = None
+        self.object_key: str | None = None
+        self.size = 0
+
+        self._client = None
+        self._head = b""
+        self._part = SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        self._upload_id: str | None = None
+        self._parts: list[dict] = []
+        self._done = False
+
+    # ── file-object protocol used by werkzeug ────────────────────────────────
+    def write(self, data: bytes) -> int:
+        if self.size + len(data) > self.max_size:
+            self.abort()
+            raise UploadRejected(f"File exceeds {self.max_size // (1024 * 1024)} MB limit.")
+
+        if self.mime_type is None:
+            self._head += data[:_SNIFF_BYTES]
+            if len(self._head) >= _SNIFF_BYTES:
+                self._start(self._head)
+
+        view = memoryview(data)
+        while view:
+            # Split oversized chunks so every part but the last is exactly PART_SIZE
+            room = PART_SIZE - self._part.tell()
+            self._part.write(view[:room])
+            view = view[room:]
+            if self._part.tell() >= PART_SIZE:
+                self._flush_part()
+        self.size += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        # werkzeug rewinds finished file parts; the data has already left
+        return 0
+
+    def tell(self) -> int:
+        return self.size
+
+    def read(self, size: int = -1) -> bytes:
+        return b""
+
+    # ── upload lifecycle ─────────────────────────────────────────────────────
+    def _start(self, head: bytes) -> None:
+        if not self.declared_type.startswith(ALLOWED_MIME_PREFIX):
+            raise UploadRejected(f"Only image/* files are allowed. Got: {self.declared_type}")
+        self.mime_type = sniff_image_type(head)
+        if self.mime_type is None:
+            raise UploadRejected("File content is not a supported image (JPEG, PNG, GIF, WebP).")
+        self.object_key = new_report_key(self.mime_type)
+
+    def _s3(self):
+        if self._client is None:
+            self._client = _get_s3_client()
+        return self._client
+
+    def _flush_part(self) -> None:
+        try:
+            if self._upload_id is None:
+                self._upload_id = self._s3().create_multipart_upload(
+                    Bucket=BUCKET, Key=self.object_key, ContentType=self.mime_type, ACL=ORIGINAL_ACL,
+                )["UploadId"]
+            number = len(self._parts) + 1
+            length = self._part.tell()
+            self._part.seek(0)
+            etag = self._s3().upload_part(
+                Bucket=BUCKET, Key=self.object_key, UploadId=self._upload_id,
+                PartNumber=number, Body=self._part, ContentLength=length,
+            )["ETag"]
+        except ClientError as exc:
+            self.abort()
+            raise RuntimeError(f"S3 upload failed: {exc}") from exc
+
+        self._parts.append({"PartNumber": number, "ETag": etag})
+        self._part.close()
+        self._part = SpooledTemporaryFile(max_size=SPOOL_BYTES)
+
+    def finish(self) -> dict:
+        """Complete the upload; returns image_key, image_url, image_size and mime_type."""
+        if self.size == 0:
+            raise UploadRejected("Uploaded image is empty.")
+        if self.mime_type is None:
+            # Shorter than the sniff window
+            self._start(self._head)
 
-    # ── Build a collision-free object key ─────────────────────────────────────
-    ext = PurePosixPath(filename).suffix.lower() or ".jpg"
-    object_key = f"reports/{uuid.uuid4().hex}{ext}"
+        try:
+            if self._upload_id is None:
+                self._part.seek(0)
+                self._s3().put_object(
+                    Bucket=BUCKET, Key=self.object_key, Body=self._part, ContentLength=self.size,
+                    ContentType=self.mime_type, ACL=ORIGINAL_ACL,
+                )
+            else:
+                if self._part.tell():
+                    self._flush_part()
+                self._s3().complete_multipart_upload(
+                    Bucket=BUCKET, Key=self.object_key, UploadId=self._upload_id,
+                    MultipartUpload={"Parts": self._parts},
+                )
+        except ClientError as exc:
+            self.abort()
+            raise RuntimeError(f"S3 upload failed: {exc}") from exc
+        finally:
+            self._part.close()
 
-    # ── Upload ────────────────────────────────────────────────────────────────
+        self._done = True
+        return {
+            "image_key":  self.object_key,
+            "image_url":  public_url(self.object_key),
+            "image_size": self.size,
+            "mime_type":  self.mime_type,
+        }
+
+    def abort(self) -> None:
+        """Discard spooled data and any in-progress multipart upload (idempotent)."""
+        if self._done:
+            return
+        self._done = True
+        self._part.close()
+        if self._upload_id is not None:
+            try:
+                self._s3().abort_multipart_upload(Bucket=BUCKET, Key=self.object_key, UploadId=self._upload_id)
+            except ClientError:
+                pass  # Bucket lifecycle rules clean up abandoned multipart uploads
+
+
+# ─── Direct-to-storage uploads ────────────────────────────────────────────────
+
+def new_report_key(mime_type: str) -> str:
+    return f"reports/{uuid.uuid4().hex}{_EXTENSIONS.get(mime_type, '')}"
+
+
+def presign_report_upload(mime_type: str, size_bytes: int | None = None) -> dict:
+    """
+    Presign an upload of one image to a fresh ``reports/<uuid>`` key.
+
+    POST returns ``url`` plus form ``fields``; the policy pins the key and
+    Content-Type and caps the size at MAX_SIZE_BYTES. PUT returns a ``url``
+    signed for the Content-Type and declared ``size_bytes`` (required); not
+    every store enforces signed lengths, so ``verify_uploaded_image``
+    re-checks the stored size either way.
+    """
+    if mime_type not in _EXTENSIONS:
+        raise UploadRejected(f"Unsupported image type: {mime_type}")
+    if size_bytes is not None and not 0 < size_bytes <= MAX_SIZE_BYTES:
+        raise UploadRejected(f"File must be between 1 byte and {MAX_SIZE_BYTES // (1024 * 1024)} MB.")
+
+    key = new_report_key(mime_type)
     client = _get_s3_client()
     try:
-        client.upload_fileobj(
-            file_stream,
-            BUCKET,
-            object_key,
-            ExtraArgs={
-                "ContentType": mime_type,
-                "ACL": "public-read",
-            },
-        )
+        if PRESIGN_METHOD == "put":
+            if size_bytes is None:
+                raise UploadRejected("size is required for presigned PUT uploads.")
+            url = client.generate_presigned_url(
+                "put_object",
+                Params={
+                    "Bucket": BUCKET, "Key": key,
+                    "ContentType": mime_type, "ContentLength": size_bytes, "ACL": ORIGINAL_ACL,
+                },
+                ExpiresIn=PRESIGN_EXPIRES,
+            )
+            upload = {
+                "method": "PUT",
+                "url": url,
+                "headers": {"Content-Type": mime_type, "x-amz-acl": ORIGINAL_ACL},
+            }
+        else:
+            post = client.generate_presigned_post(
+                Bucket=BUCKET,
+                Key=key,
+                Fields={"Content-Type": mime_type, "acl": ORIGINAL_ACL},
+                Conditions=[
+                    {"Content-Type": mime_type},
+                    {"acl": ORIGINAL_ACL},
+                    ["content-length-range", 1, MAX_SIZE_BYTES],
+                ],
+                ExpiresIn=PRESIGN_EXPIRES,
+            )
+            upload = {"method": "POST", "url": post["url"], "fields": post["fields"]}
     except ClientError as exc:
-        raise RuntimeError(f"S3 upload failed: {exc}") from exc
+        raise RuntimeError(f"S3 presign failed: {exc}") from exc
 
-    # Supabase public URL pattern
-    public_url = f"{ENDPOINT.rstrip('/')}/object/public/{BUCKET}/{object_key}"
-
-    return {
-        "image_key":  object_key,
-        "image_url":  public_url,
-        "image_size": size_bytes,
-        "mime_type":  mime_type,
-    }
+    upload.update({"object_key": key, "mime_type": mime_type, "max_size": MAX_SIZE_BYTES, "expires_in": PRESIGN_EXPIRES})
+    return upload
 
 
-def delete_report_image(object_key: str) -> None:
-    """Remove an object from the Supabase S3 bucket (used on report deletion)."""
+def verify_uploaded_image(object_key: str, mime_type: str) -> dict:
+    """
+    Confirm a directly uploaded object: HEAD for size and type, then a
+    ranged GET of its first bytes for the magic check (the only bytes that
+    pass through the app). Returns the metadata ``create_pollution_report`` stores.
+    """
     client = _get_s3_client()
     try:
-        client.delete_object(Bucket=BUCKET, Key=object_key)
+        head = client.head_object(Bucket=BUCKET, Key=object_key)
     except ClientError as exc:
-        raise RuntimeError(f"S3 delete failed: {exc}") from exc
+        if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            raise UploadRejected("Uploaded image not found; upload it before confirming.", 409) from exc
+        raise RuntimeError(f"S3 head failed: {exc}") from exc
+
+    size = head["ContentLength"]
+    if not 0 < size <= MAX_SIZE_BYTES:
+        raise UploadRejected(f"File exceeds {MAX_SIZE_BYTES // (1024 * 1024)} MB limit.")
+    if head.get("ContentType") != mime_type:
+        raise UploadRejected(f"Uploaded Content-Type {head.get('ContentType')} does not match {mime_type}.")
+
+    try:
+        first = client.get_object(Bucket=BUCKET, Key=object_key, Range=f"bytes=0-{_SNIFF_BYTES - 1}")["Body"].read()
+    except ClientError as exc:
+        raise RuntimeError(f"S3 read failed: {exc}") from exc
+    if sniff_image_type(first) != mime_type:
+        raise UploadRejected("File content does not match its declared image type.")
+
+    return {
+        "image_key":  object_key,
+        "image_url":  public_url(object_key),
+        "image_size": size,
+        "mime_type":  mime_type,
+    }
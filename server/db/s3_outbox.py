@@ -0,0 +1,231 @@
+"""
+Background deletion of report images through a durable outbox.
+
+Deleting a report enqueues its object keys in ``s3_deletion_outbox`` in the
+same transaction as the row delete, so the request returns without talking
+to storage and a crash cannot lose the cleanup. A daemon thread in each web
+worker drains due rows in batches (``DeleteObjects``, up to 1000 keys per
+call), retrying failures with exponential backoff. ``FOR UPDATE SKIP LOCKED``
+lets several workers share the queue.
+
+Objects that never got a row (e.g. an upload whose report insert failed and
+whose cleanup was lost) are found by an occasional bucket sweep:
+
+    python -m db.s3_outbox                  # drain the queue once
+    python -m db.s3_outbox --sweep-orphans  # enqueue unreferenced objects, then drain
+"""
+
+import argparse
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from . import s3
+from .db_setup import get_db_connection
+
+POLL_SECONDS = float(os.getenv("S3_OUTBOX_POLL_SECONDS", 10))
+BATCH_SIZE = int(os.getenv("S3_OUTBOX_BATCH_SIZE", 100))
+MAX_BACKOFF_SECONDS = 3600
+ORPHAN_GRACE = timedelta(hours=int(os.getenv("S3_ORPHAN_GRACE_HOURS", 24)))
+
+# Queries returning the given %(keys)s that pollution_reports still references
+REFERENCED_KEYS = [
+    "SELECT image_key FROM pollution_reports WHERE image_key = ANY(%(keys)s)",
+    "SELECT display_key FROM pollution_reports WHERE display_key = ANY(%(keys)s)",
+    """SELECT t.value FROM pollution_reports, jsonb_each_text(thumbnail_keys) AS t
+       WHERE thumbnail_keys IS NOT NULL AND t.value = ANY(%(keys)s)""",
+]
+
+
+def enqueue_deletions(cur, object_keys) -> None:
+    """Queue ``object_keys`` for deletion inside the caller's transaction."""
+    keys = [key for key in object_keys if key]
+    if keys:
+        cur.execute(
+            "INSERT INTO s3_deletion_outbox (object_key) SELECT unnest(%s::text[]);",
+            (keys,),
+        )
+
+
+def schedule_deletion(*object_keys: str) -> None:
+    """Queue keys in their own transaction and wake the drain thread."""
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            enqueue_deletions(cur, object_keys)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+    deletions.wake()
+
+
+class DeletionWorker:
+    def __init__(self, poll_seconds: float = POLL_SECONDS, batch_size: int = BATCH_SIZE):
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._metrics = {"deleted": 0, "failed_attempts": 0, "errors": 0}
+
+    def drain_once(self) -> tuple[int, int]:
+        """Delete one batch of due objects. Returns (deleted, failed)."""
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(
+                    """
+                    SELECT id, object_key, attempts FROM s3_deletion_outbox
+                    WHERE next_attempt_at <= now()
+                    ORDER BY next_attempt_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED;
+                    """,
+                    (self.batch_size,),
+                )
+                rows = cur.fetchall()
+                if not rows:
+                    conn.rollback()
+                    return 0, 0
+
+                errors = self._delete_objects(sorted({key for _, key, _ in rows}))
+
+                done = [row_id for row_id, key, _ in rows if key not in errors]
+                if done:
+                    cur.execute("DELETE FROM s3_deletion_outbox WHERE id = ANY(%s);", (done,))
+                for row_id, key, attempts in rows:
+                    if key in errors:
+                        backoff = min(MAX_BACKOFF_SECONDS, 2 ** (attempts + 1) * 5)
+                        cur.execute(
+                            """
+                            UPDATE s3_deletion_outbox
+                            SET attempts = attempts + 1,
+                                next_attempt_at = now() + make_interval(secs => %s),
+                                last_error = %s
+                            WHERE id = %s;
+                            """,
+                            (backoff, errors[key], row_id),
+                        )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+        failed = len(rows) - len(done)
+        self._metrics["deleted"] += len(done)
+        self._metrics["failed_attempts"] += failed
+        return len(done), failed
+
+    def _delete_objects(self, keys: list[str]) -> dict[str, str]:
+        """Batch-delete ``keys``; returns {key: error} for the ones that failed."""
+        try:
+            response = s3._get_s3_client().delete_objects(
+                Bucket=s3.BUCKET,
+                Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+            )
+        except (ClientError, BotoCoreError, RuntimeError) as exc:
+            return {key: str(exc) for key in keys}
+        # Deleting a missing key succeeds, so retries are idempotent
+        return {err["Key"]: f"{err.get('Code')}: {err.get('Message')}" for err in response.get("Errors", [])}
+
+    def drain(self) -> int:
+        """Drain every due batch; returns the number of objects deleted."""
+        total = 0
+        while True:
+            deleted, failed = self.drain_once()
+            total += deleted
+            if deleted + failed < self.batch_size:
+                return total
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.drain()
+            except Exception as e:
+                self._metrics["errors"] += 1
+                print(f"S3 deletion outbox drain failed: {e}")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def start(self) -> None:
+        """Start the background drain thread (idempotent)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="s3-deletion-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self) -> dict:
+        return dict(self._metrics)
+
+
+deletions = DeletionWorker()
+
+
+def sweep_orphans(prefix: str = "reports/", grace: timedelta = ORPHAN_GRACE) -> int:
+    """
+    Enqueue objects under ``prefix`` that no report references and that are
+    older than ``grace`` (younger ones may belong to an upload in progress).
+    """
+    cutoff = datetime.now(timezone.utc) - grace
+    paginator = s3._get_s3_client().get_paginator("list_objects_v2")
+    enqueued = 0
+
+    for page in paginator.paginate(Bucket=s3.BUCKET, Prefix=prefix):
+        keys = [obj["Key"] for obj in page.get("Contents", []) if obj["LastModified"] < cutoff]
+        if not keys:
+            continue
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            try:
+                referenced = " UNION ".join(REFERENCED_KEYS)
+                cur.execute(
+                    f"""
+                    SELECT key FROM unnest(%(keys)s::text[]) AS key
+                    WHERE key NOT IN ({referenced})
+                      AND key NOT IN (SELECT object_key FROM s3_deletion_outbox WHERE object_key = ANY(%(keys)s));
+                    """,
+                    {"keys": keys},
+                )
+                orphans = [row[0] for row in cur.fetchall()]
+                enqueue_deletions(cur, orphans)
+                conn.commit()
+                enqueued += len(orphans)
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+    return enqueued
+
+
+def main() -> None:
+    from .db_setup import initialize_connection_pool
+
+    parser = argparse.ArgumentParser(description="Drain the S3 deletion outbox.")
+    parser.add_argument("--sweep-orphans", action="store_true", help="enqueue unreferenced objects first")
+    args = parser.parse_args()
+
+    initialize_connection_pool()
+    if args.sweep_orphans:
+        print(f"Enqueued {sweep_orphans()} orphaned objects.")
+    print(f"Deleted {deletions.drain()} objects.")
+
+
+if __name__ == "__main__":
+    main()
@@ -34,11 +34,12 @@ CREATE_TABLE_TOKEN_BLOCKLIST = """
     revoked_at TIMESTAMP DEFAULT now()
     );
 """
+# Range-partitioned by month on timestamp; partitions are managed by db/partitions.py
 CREATE_TABLE_AIR_QUALITY_DATA = """
     CREATE TABLE IF NOT EXISTS air_quality_data (
-    id uuid DEFAULT uuid_generate_v4() PRIMARY KEY,
+    id uuid DEFAULT uuid_generate_v4(),
     node_id int,
-    timestamp timestamptz,
+    timestamp timestamptz NOT NULL,
     lat float,
     lon float,
     pm25 float,
@@ -53,7 +54,59 @@ CREATE_TABLE_AIR_QUALITY_DATA = """
     traffic_free_flow_speed float,
     traffic_confidence float,
     risk_score int,
-    risk_level text
+    risk_level text,
+    PRIMARY KEY (id, timestamp)
+    ) PARTITION BY RANGE (timestamp);
+"""
+
+CREATE_INDEX_AIR_QUALITY_NODE_TIMESTAMP = """
+    CREATE INDEX IF NOT EXISTS idx_air_quality_node_timestamp
+    ON air_quality_data (node_id, timestamp DESC);
+"""
+
+# Per-node rollups of air_quality_data, maintained incrementally by maps/rollups.py
+CREATE_TABLE_AIR_QUALITY_HOURLY = """
+    CREATE TABLE IF NOT EXISTS air_quality_hourly (
+    node_id int NOT NULL,
+    bucket timestamptz NOT NULL,
+    readings int NOT NULL,
+    pm25_avg float,
+    pm25_min float,
+    pm25_max float,
+    no2_avg float,
+    no2_min float,
+    no2_max float,
+    o3_avg float,
+    o3_min float,
+    o3_max float,
+    updated_at timestamptz DEFAULT now(),
+    PRIMARY KEY (node_id, bucket)
+    );
+"""
+
+CREATE_TABLE_AIR_QUALITY_DAILY = """
+    CREATE TABLE IF NOT EXISTS air_quality_daily (
+    node_id int NOT NULL,
+    bucket timestamptz NOT NULL,
+    readings int NOT NULL,
+    pm25_avg float,
+    pm25_min float,
+    pm25_max float,
+    no2_avg float,
+    no2_min float,
+    no2_max float,
+    o3_avg float,
+    o3_min float,
+    o3_max float,
+    updated_at timestamptz DEFAULT now(),
+    PRIMARY KEY (node_id, bucket)
+    );
+"""
+
+CREATE_TABLE_ROLLUP_STATE = """
+    CREATE TABLE IF NOT EXISTS rollup_state (
+    name text PRIMARY KEY,
+    watermark timestamptz NOT NULL
     );
 """
 
@@ -110,11 +163,209 @@ CREATE_TABLE_USER_HEALTH_PROFILES = """
     );
 """
 
+# Geohash of (lat, lon); must match maps/geohash.encode
+CREATE_FUNCTION_GEOHASH_ENCODE = """
+    CREATE OR REPLACE FUNCTION geohash_encode(lat double precision, lon double precision, len int)
+    RETURNS text
+    LANGUAGE plpgsql IMMUTABLE STRICT PARALLEL SAFE
+    AS $$
+    DECLARE
+        base32 CONSTANT text := '0123456789bcdefghjkmnpqrstuvwxyz';
+        lat_lo double precision := -90;
+        lat_hi double precision := 90;
+        lon_lo double precision := -180;
+        lon_hi double precision := 180;
+        mid double precision;
+        hash text := '';
+        bits int := 0;
+        value int := 0;
+        even boolean := true;
+    BEGIN
+        WHILE length(hash) < len LOOP
+            IF even THEN
+                mid := (lon_lo + lon_hi) / 2;
+                IF lon >= mid THEN
+                    value := value * 2 + 1;
+                    lon_lo := mid;
+                ELSE
+                    value := value * 2;
+                    lon_hi := mid;
+                END IF;
+            ELSE
+                mid := (lat_lo + lat_hi) / 2;
+                IF lat >= mid THEN
+                    value := value * 2 + 1;
+                    lat_lo := mid;
+                ELSE
+                    value := value * 2;
+                    lat_hi := mid;
+                END IF;
+            END IF;
+            even := NOT even;
+            bits := bits + 1;
+            IF bits = 5 THEN
+                hash := hash || substr(base32, value + 1, 1);
+                bits := 0;
+                value := 0;
+            END IF;
+        END LOOP;
+        RETURN hash;
+    END;
+    $$;
+"""
+
+# "C" collation keeps geohash prefix ranges usable as B-tree range scans
+ALTER_AIR_QUALITY_ADD_GEOHASH = """
+    ALTER TABLE air_quality_data
+    ADD COLUMN IF NOT EXISTS geohash text COLLATE "C"
+    GENERATED ALWAYS AS (geohash_encode(lat, lon, 9)) STORED;
+"""
+
+CREATE_INDEX_AIR_QUALITY_GEOHASH = """
+    CREATE INDEX IF NOT EXISTS idx_air_quality_geohash_timestamp
+    ON air_quality_data (geohash, timestamp DESC);
+"""
+
+# Durable queue of storage objects to delete (db/s3_outbox.py)
+CREATE_TABLE_S3_DELETION_OUTBOX = """
+    CREATE TABLE IF NOT EXISTS s3_deletion_outbox (
+    id bigserial PRIMARY KEY,
+    object_key text NOT NULL,
+    attempts int NOT NULL DEFAULT 0,
+    next_attempt_at timestamptz NOT NULL DEFAULT now(),
+    last_error text,
+    created_at timestamptz NOT NULL DEFAULT now()
+    );
+"""
+
+CREATE_INDEX_S3_DELETION_OUTBOX_DUE = """
+    CREATE INDEX IF NOT EXISTS idx_s3_deletion_outbox_due
+    ON s3_deletion_outbox (next_attempt_at);
+"""
+
+# One report per stored object: deleting a report deletes its image
+CREATE_INDEX_POLLUTION_REPORTS_IMAGE_KEY = """
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_pollution_reports_image_key
+    ON pollution_reports (image_key) WHERE image_key IS NOT NULL;
+"""
+
+# Derived (re-encoded, EXIF-free) report images written by user/image_pipeline.py
+ALTER_POLLUTION_REPORTS_ADD_DERIVED_IMAGES = """
+    ALTER TABLE pollution_reports
+        ADD COLUMN IF NOT EXISTS display_key TEXT,
+        ADD COLUMN IF NOT EXISTS thumbnail_keys JSONB,
+        ADD COLUMN IF NOT EXISTS image_processed_at TIMESTAMPTZ,
+        ADD COLUMN IF NOT EXISTS image_processing_attempts INT NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS image_processing_error TEXT;
+"""
+
+# Lets the pipeline sweep find unprocessed images without scanning every report
+CREATE_INDEX_POLLUTION_REPORTS_UNPROCESSED = """
+    CREATE INDEX IF NOT EXISTS idx_pollution_reports_unprocessed
+    ON pollution_reports (created_at)
+    WHERE image_key IS NOT NULL AND image_processed_at IS NULL;
+"""
+
+# Set when a sweep claims an unprocessed image, so concurrent workers don't both render it
+ALTER_POLLUTION_REPORTS_ADD_IMAGE_CLAIM = """
+    ALTER TABLE pollution_reports
+    ADD COLUMN IF NOT EXISTS image_processing_started_at TIMESTAMPTZ;
+"""
+
+# Per-report geohash; its prefixes are the map cluster cells for every zoom (reports/services.py)
+ALTER_POLLUTION_REPORTS_ADD_GEOHASH = """
+    ALTER TABLE pollution_reports
+    ADD COLUMN IF NOT EXISTS geohash text COLLATE "C"
+    GENERATED ALWAYS AS (geohash_encode(lat, lon, 8)) STORED;
+"""
+
+# Covering index: clustering a viewport is an index-only range scan
+CREATE_INDEX_POLLUTION_REPORTS_GEOHASH = """
+    CREATE INDEX IF NOT EXISTS idx_pollution_reports_geohash
+    ON pollution_reports (geohash) INCLUDE (lat, lon, status);
+"""
+
+# Keyset pagination compares (created_at, id) row values, which skips NULLs;
+# sort rows that never got a timestamp after every real one
+BACKFILL_POLLUTION_REPORTS_CREATED_AT = """
+    UPDATE pollution_reports SET created_at = 'epoch' WHERE created_at IS NULL;
+"""
+
+ALTER_POLLUTION_REPORTS_CREATED_AT_NOT_NULL = """
+    ALTER TABLE pollution_reports ALTER COLUMN created_at SET NOT NULL;
+"""
+
+# Keyset pagination of report listings: ORDER BY created_at DESC, id DESC
+CREATE_INDEX_POLLUTION_REPORTS_USER_CREATED = """
+    CREATE INDEX IF NOT EXISTS idx_pollution_reports_user_created
+    ON pollution_reports (user_id, created_at DESC, id DESC);
+"""
+
+CREATE_INDEX_POLLUTION_REPORTS_CREATED = """
+    CREATE INDEX IF NOT EXISTS idx_pollution_reports_created
+    ON pollution_reports (created_at DESC, id DESC);
+"""
+
+# Forecast exposure alerts (alerts/engine.py). threshold NULL = derive from the health profile
+CREATE_TABLE_ALERT_SUBSCRIPTIONS = """
+    CREATE TABLE IF NOT EXISTS alert_subscriptions (
+        id          BIGSERIAL PRIMARY KEY,
+        user_id     INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        label       VARCHAR(100),
+        lat         FLOAT NOT NULL,
+        lon         FLOAT NOT NULL,
+        threshold   REAL,
+        active      BOOLEAN NOT NULL DEFAULT TRUE,
+        alert_state VARCHAR(20),
+        alerted_at  TIMESTAMPTZ,
+        created_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+"""
+
+CREATE_INDEX_ALERT_SUBSCRIPTIONS_USER = """
+    CREATE INDEX IF NOT EXISTS idx_alert_subscriptions_user
+    ON alert_subscriptions (user_id);
+"""
+
+# Outbox of alerts; clients read it incrementally by id
+CREATE_TABLE_ALERT_NOTIFICATIONS = """
+    CREATE TABLE IF NOT EXISTS alert_notifications (
+        id              BIGSERIAL PRIMARY KEY,
+        user_id         INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        subscription_id BIGINT REFERENCES alert_subscriptions(id) ON DELETE SET NULL,
+        node_id         INTEGER,
+        horizon         VARCHAR(10) NOT NULL,
+        aqi             REAL NOT NULL,
+        threshold       REAL NOT NULL,
+        risk_level      VARCHAR(20) NOT NULL,
+        read_at         TIMESTAMPTZ,
+        created_at      TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+"""
+
+CREATE_INDEX_ALERT_NOTIFICATIONS_USER = """
+    CREATE INDEX IF NOT EXISTS idx_alert_notifications_user_id
+    ON alert_notifications (user_id, id);
+"""
+
+# Bookkeeping for db/migrations.py; not part of SCHEMA_LIST
+CREATE_TABLE_SCHEMA_VERSION = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+    version int PRIMARY KEY,
+    name text NOT NULL,
+    applied_at timestamptz NOT NULL DEFAULT now()
+    );
+"""
+
 SCHEMA_LIST = [
     CREATE_TYPE_GENDER_ENUM,
     CREATE_TABLE_USERS,
     CREATE_TABLE_TOKEN_BLOCKLIST,
     CREATE_TABLE_AIR_QUALITY_DATA,
+    CREATE_INDEX_AIR_QUALITY_NODE_TIMESTAMP,
+    CREATE_TABLE_AIR_QUALITY_HOURLY,
+    CREATE_TABLE_AIR_QUALITY_DAILY,
+    CREATE_TABLE_ROLLUP_STATE,
     CREATE_TABLE_USER_MESSAGES,
     CREATE_TABLE_POLLUTION_REPORTS,
     CREATE_TABLE_USER_HEALTH_PROFILES,
@@ -1,15 +1,12 @@
-from flask_bcrypt import Bcrypt
 from dotenv import load_dotenv
 from cryptography.fernet import Fernet
+from flask import current_app
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import os
 
 load_dotenv()
 
-# global bcrypt instance 
-bcrypt = Bcrypt()
-
 # Global fernet instance — fall back to a generated key when missing (development)
 _fernet_key = os.getenv('FERNET_KEY')
 if _fernet_key is None:
@@ -19,8 +16,25 @@ if _fernet_key is None:
 else:
     fernet = Fernet(_fernet_key)
 
-# Global rate limiter config
-limiter = Limiter(
-    key_func=get_remote_address,
-    default_limits=["15 per minute"],
-)
\ No newline at end of file
+# Global rate limiter — limits, strategy and storage come from RATELIMIT_* in config.py
+limiter = Limiter(key_func=get_remote_address)
+
+
+def api_cost(cost):
+    """
+    Charge ``cost`` units (an int, or a callable returning one) of the
+    per-client API budget shared by the map/route endpoints, so expensive
+    calls use up more of it than cheap ones.
+    """
+    return limiter.shared_limit(
+        lambda: current_app.config["RATELIMIT_API_BUDGET"], scope="api", cost=cost,
+    )
+
+
+def session_limit():
+    """
+    Per-route limit for cheap authenticated calls the client makes on every
+    page load or on a timer (profile, token refresh, notification polling),
+    which the default per-route limit would throttle in normal use.
+    """
+    return limiter.limit(lambda: current_app.config["RATELIMIT_SESSION"])
\ No newline at end of file
@@ -1,55 +1,121 @@
 import json
+import time
 import warnings
+from datetime import datetime, timezone
 from pathlib import Path
-import pandas as pd
-import joblib
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
-from ML.aqi_forecast import load_and_preprocess, add_targets, build_feature_list, HORIZONS, _rmse
-from sklearn.model_selection import train_test_split
+
+import numpy as np
+
+from ML.aqi_forecast import (
+    DATA_PATH,
+    DEFAULT_PREFIX,
+    HORIZONS,
+    METRICS_PATH,
+    add_targets,
+    build_feature_list,
+    load_and_preprocess,
+    load_models,
+    load_split,
+    make_split_indices,
+)
+from ML.compiled_trees import compile_models
 
 warnings.filterwarnings("ignore")
 
-def evaluate_existing_models():
-    data_path = Path("ML/air_quality_data_rows.csv")
-    df = load_and_preprocess(data_path)
-    df = add_targets(df)
-    feature_cols = build_feature_list()
-    
+LATENCY_ROWS = 200
+BATCH_REPEATS = 20
+
+
+def _load_test_set(prefix: str) -> tuple[np.ndarray, np.ndarray, list[str]]:
+    """Return (X_test, Y_test, labels) from the cached split, re-deriving it only if missing."""
+    split = load_split(prefix)
+    if split is not None:
+        return split["X_test"], split["Y_test"], split["labels"]
+
+    print(f"No cached split at {prefix}_split.npz — re-running preprocessing")
+    df = add_targets(load_and_preprocess(DATA_PATH))
+    _, test_idx = make_split_indices(len(df))
+    labels = list(HORIZONS)
+    X = df[build_feature_list()].values[test_idx]
+    Y = df[[f"aqi_{label}" for label in labels]].values[test_idx]
+    return X, Y, labels
+
+
+def _model_files(prefix: str) -> dict[str, Path]:
+    ubj = {label: Path(f"{prefix}_{label}.ubj") for label in HORIZONS}
+    if all(path.exists() for path in ubj.values()):
+        return ubj
+    return {label: Path(f"{prefix}_{label}.joblib") for label in HORIZONS}
+
+
+def _latency(predict, X: np.ndarray) -> dict:
+    """Per-row (single-row calls) percentiles and amortised batch latency."""
+    rows = X[:LATENCY_ROWS]
+    samples = []
+    for row in rows:
+        start = time.perf_counter()
+        predict(row[None, :])
+        samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(BATCH_REPEATS):
+        predict(X)
+    batch_s = (time.perf_counter() - start) / BATCH_REPEATS
+
+    return {
+        "row_p50_us": round(float(np.percentile(samples, 50)) * 1e6, 1),
+        "row_p95_us": round(float(np.percentile(samples, 95)) * 1e6, 1),
+        "batch_ms": round(batch_s * 1e3, 3),
+        "batch_rows": len(X),
+        "batch_per_row_us": round(batch_s / max(1, len(X)) * 1e6, 2),
+    }
+
+
+def evaluate_existing_models(prefix: str = DEFAULT_PREFIX):
+    X_test, Y_test, labels = _load_test_set(prefix)
+
+    start = time.perf_counter()
+    models = load_models(prefix=prefix)
+    load_ms = (time.perf_counter() - start) * 1e3
+    files = _model_files(prefix)
+
+    # One vectorised pass over every horizon with the compiled evaluator
+    forest = compile_models({label: models[label] for label in labels}, build_feature_list())
+    Y_pred = forest.predict(X_test)
+
+    err = Y_pred - Y_test
+    rmse = np.sqrt(np.mean(err ** 2, axis=0))
+    mae = np.mean(np.abs(err), axis=0)
+    r2 = 1.0 - np.sum(err ** 2, axis=0) / np.sum((Y_test - Y_test.mean(axis=0)) ** 2, axis=0)
+
     metrics = {}
-    
-    for label in HORIZONS:
-        model_path = Path(f"aqi_model_{label}.joblib")
-        if not model_path.exists():
-            print(f"Model not found: {model_path}")
-            continue
-            
-        model = joblib.load(model_path)
-        
-        target_col = f"aqi_{label}"
-        X = df[feature_cols].values
-        y = df[target_col].values
-        
-        # Must match the split in aqi_forecast.py exactly to eval on test set
-        _, X_test, _, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42, shuffle=True
-        )
-        
-        y_pred = model.predict(X_test)
-        rmse = _rmse(y_test, y_pred)
-        mae = float(mean_absolute_error(y_test, y_pred))
-        r2 = float(r2_score(y_test, y_pred))
-        
+    for i, label in enumerate(labels):
         metrics[label] = {
-            "RMSE": round(rmse, 4),
-            "MAE": round(mae, 4), 
-            "R2_Score": round(r2, 4)
+            "RMSE": round(float(rmse[i]), 4),
+            "MAE": round(float(mae[i]), 4),
+            "R2_Score": round(float(r2[i]), 4),
+            "model_bytes": files[label].stat().st_size,
+            "xgboost_latency": _latency(models[label].predict, X_test),
         }
-        print(f"[{label:>3}] Evaluated: RMSE={rmse:.4f}, MAE={mae:.4f}, R2={r2:.4f}")
-        
-    out_path = Path("performance_metrics.json")
-    with open(out_path, "w") as f:
+        print(f"[{label:>3}] Evaluated: RMSE={rmse[i]:.4f}, MAE={mae[i]:.4f}, R2={r2[i]:.4f}")
+
+    metrics["profile"] = {
+        "evaluated_at": datetime.now(timezone.utc).isoformat(),
+        "test_rows": len(X_test),
+        "model_format": files[labels[0]].suffix.lstrip("."),
+        "model_bytes": sum(files[label].stat().st_size for label in labels),
+        "load_ms": round(load_ms, 2),
+        "compiled_latency": _latency(forest.predict, X_test),
+    }
+    profile = metrics["profile"]
+    print(
+        f"[all] Load {profile['load_ms']:.1f} ms, {profile['model_bytes'] / 1024:.0f} KiB, "
+        f"compiled row p50 {profile['compiled_latency']['row_p50_us']} µs"
+    )
+
+    with open(METRICS_PATH, "w") as f:
         json.dump(metrics, f, indent=4)
-    print(f"\nExported metrics to {out_path.absolute()}")
+    print(f"\nExported metrics to {METRICS_PATH}")
 
 if __name__ == "__main__":
     evaluate_existing_models()
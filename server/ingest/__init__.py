@@ -0,0 +1 @@
+"""Ingest package — bulk sensor reading ingestion."""
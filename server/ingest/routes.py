@@ -0,0 +1,68 @@
+"""Blueprint routes for bulk sensor reading ingestion."""
+
+import hmac
+import os
+from functools import wraps
+
+from flask import Blueprint, jsonify, request
+from alerts.engine import alerts
+from extensions import limiter
+from .services import iter_csv, iter_ndjson, parse_batch, load_readings
+
+ingest_bp = Blueprint("ingest", __name__, url_prefix="/api/ingest")
+
+INGEST_MAX_ROWS = int(os.getenv("INGEST_MAX_ROWS", 100_000))
+
+
+def require_ingest_key(view):
+    """Authenticate the gateway with a shared key in the X-Ingest-Key header."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        expected = os.getenv("INGEST_API_KEY")
+        if not expected:
+            return jsonify({"status": "error", "message": "Ingestion is not configured"}), 503
+
+        provided = request.headers.get("X-Ingest-Key", "")
+        if not hmac.compare_digest(provided.encode(), expected.encode()):
+            return jsonify({"status": "error", "message": "Invalid ingest key"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@ingest_bp.route("/readings", methods=["POST"])
+@limiter.exempt     # one authenticated gateway; per-IP limits would drop sensor batches
+@require_ingest_key
+def ingest_readings():
+    """
+    POST /api/ingest/readings
+    Body: NDJSON (application/x-ndjson) or CSV with a header row (text/csv).
+    Valid rows are loaded in one transaction; invalid rows are skipped and
+    reported with their line number.
+    """
+    mimetype = request.mimetype
+    if mimetype in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        records = iter_ndjson(request.stream)
+    elif mimetype in ("text/csv", "application/csv"):
+        records = iter_csv(request.stream)
+    else:
+        return jsonify({"status": "error", "message": "Content-Type must be application/x-ndjson or text/csv"}), 415
+
+    try:
+        rows, errors, rejected = parse_batch(records, max_rows=INGEST_MAX_ROWS)
+    except UnicodeDecodeError:
+        return jsonify({"status": "error", "message": "Body must be UTF-8"}), 400
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 413
+
+    if not rows:
+        return jsonify({"status": "error", "accepted": 0, "rejected": rejected, "errors": errors}), 422
+
+    try:
+        accepted = load_readings(rows)
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+    # New readings change the forecast; let the alert engine fan out (debounced)
+    alerts.wake()
+
+    return jsonify({"status": "success", "accepted": accepted, "rejected": rejected, "errors": errors}), 200
@@ -0,0 +1,208 @@
+"""Parsing, validation and bulk loading of sensor readings into air_quality_data."""
+
+import csv
+import io
+import json
+import math
+from datetime import datetime, timezone
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from db.db_setup import get_db_connection
+from maps.rollups import refresh_for_batch
+
+# Columns accepted from the gateway, in COPY order (id is generated by Postgres)
+INGEST_COLUMNS = [
+    "node_id",
+    "timestamp",
+    "lat",
+    "lon",
+    "pm25",
+    "no2",
+    "o3",
+    "wind_speed",
+    "wind_direction",
+    "temperature",
+    "humidity",
+    "traffic_density",
+    "traffic_current_speed",
+    "traffic_free_flow_speed",
+    "traffic_confidence",
+    "risk_score",
+    "risk_level",
+]
+
+REQUIRED_COLUMNS = {"node_id", "timestamp", "lat", "lon"}
+INT_COLUMNS = {"node_id", "traffic_density", "risk_score"}
+NON_NEGATIVE_COLUMNS = {"pm25", "no2", "o3", "wind_speed", "traffic_density"}
+
+COPY_CHUNK_ROWS = 10_000
+MAX_REPORTED_ERRORS = 50
+
+_use_copy = True
+
+
+# ─── Parsing ──────────────────────────────────────────────────────────────────
+
+def _decoded_lines(stream):
+    for raw in stream:
+        yield raw.decode("utf-8")
+
+
+def iter_ndjson(stream):
+    """Yield (line_no, record | None, error | None) from an NDJSON byte stream."""
+    for line_no, line in enumerate(_decoded_lines(stream), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, "each line must be a JSON object"
+            continue
+        yield line_no, record, None
+
+
+def iter_csv(stream):
+    """Yield (line_no, record, None) from a CSV byte stream with a header row."""
+    reader = csv.DictReader(_decoded_lines(stream))
+    for record in reader:
+        # Header is line 1; empty cells mean NULL
+        yield reader.line_num, {k: (v if v != "" else None) for k, v in record.items()}, None
+
+
+# ─── Validation ───────────────────────────────────────────────────────────────
+
+def _parse_timestamp(value) -> datetime:
+    ts = datetime.fromisoformat(str(value))
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def validate_reading(record: dict) -> tuple:
+    """Return the record as a tuple in INGEST_COLUMNS order or raise ValueError."""
+    missing = [c for c in REQUIRED_COLUMNS if record.get(c) is None]
+    if missing:
+        raise ValueError(f"missing required fields: {sorted(missing)}")
+
+    values = []
+    for col in INGEST_COLUMNS:
+        value = record.get(col)
+        if value is None:
+            values.append(None)
+            continue
+        try:
+            if col == "timestamp":
+                value = _parse_timestamp(value)
+            elif col == "risk_level":
+                value = str(value)
+            else:
+                number = float(value)
+                # float() accepts "nan"/"inf", and NaN slips past every range check
+                if not math.isfinite(number):
+                    raise ValueError
+                if col in INT_COLUMNS:
+                    # int() would truncate, silently filing node 3.7 under node 3
+                    if not number.is_integer():
+                        raise ValueError
+                    value = int(number)
+                else:
+                    value = number
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid value for {col}: {value!r}")
+
+        if col in NON_NEGATIVE_COLUMNS and value < 0:
+            raise ValueError(f"{col} must be non-negative")
+        values.append(value)
+
+    lat, lon = values[2], values[3]
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("lat/lon out of range")
+
+    return tuple(values)
+
+
+def parse_batch(records, max_rows: int) -> tuple[list[tuple], list[dict], int]:
+    """Validate parsed records; return (rows, errors, rejected_count)."""
+    rows: list[tuple] = []
+    errors: list[dict] = []
+    rejected = 0
+
+    for line_no, record, error in records:
+        if error is None:
+            try:
+                rows.append(validate_reading(record))
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": line_no, "error": error})
+
+        if len(rows) > max_rows:
+            raise ValueError(f"Batch exceeds {max_rows} rows; split it into smaller requests.")
+
+    return rows, errors, rejected
+
+
+# ─── Loading ──────────────────────────────────────────────────────────────────
+
+def _copy_rows(cur, rows: list[tuple]) -> None:
+    columns = ", ".join(INGEST_COLUMNS)
+    for start in range(0, len(rows), COPY_CHUNK_ROWS):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows[start:start + COPY_CHUNK_ROWS]:
+            writer.writerow(
+                "" if v is None else v.isoformat() if isinstance(v, datetime) else v
+                for v in row
+            )
+        buf.seek(0)
+        cur.copy_expert(f"COPY air_quality_data ({columns}) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+def _insert_rows(cur, rows: list[tuple]) -> None:
+    execute_values(
+        cur,
+        f"INSERT INTO air_quality_data ({', '.join(INGEST_COLUMNS)}) VALUES %s",
+        rows,
+        page_size=1000,
+    )
+
+
+def load_readings(rows: list[tuple]) -> int:
+    """
+    Load validated rows in a single transaction using COPY FROM STDIN and
+    refresh the rollup buckets they fall into.
+
+    Falls back to multi-row INSERTs (execute_values) for the rest of the
+    process lifetime if the server or pooler rejects COPY.
+    """
+    global _use_copy
+    if not rows:
+        return 0
+
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            if _use_copy:
+                try:
+                    _copy_rows(cur, rows)
+                except psycopg2.errors.FeatureNotSupported:
+                    conn.rollback()
+                    _use_copy = False
+                    print("COPY not supported by this connection; falling back to execute_values")
+            if not _use_copy:
+                _insert_rows(cur, rows)
+            # Keep hourly/daily rollups current for the windows this batch touched
+            refresh_for_batch(cur, rows)
+            conn.commit()
+            return len(rows)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
@@ -1,16 +1,57 @@
 from flask import Flask
 import os
+import threading
 from dotenv import load_dotenv
-from flask import request
+from flask import request, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from extensions import limiter
 from werkzeug.middleware.proxy_fix import ProxyFix
-from db.db_setup import initialize_connection_pool, initialize_database_and_create_tables
+from db.db_setup import initialize_connection_pool, get_pool_stats, get_replica_stats
+from db.migrations import check_schema_version, schema_status
 from config import DevConfig, ProdConfig
+from auth.blocklist import register_blocklist, revocations
+from auth.passwords import passwords
+from db.s3_outbox import deletions
+from user.image_pipeline import pipeline
+from user import cache as profile_cache
+from alerts.engine import alerts
 
 load_dotenv()
 
+# Process that ran start_process_services; a forked worker has a different pid
+_services_pid = None
+_services_lock = threading.Lock()
+
+
+def start_process_services(app):
+    """
+    Per-process startup: connection pool, schema check and background
+    threads (blocklist refresh, S3 deletions, image sweep, alert fan-out).
+
+    Runs on the first request in each process, not at import. Under
+    ``gunicorn --preload`` the app is imported once in the master and
+    forked; threads do not survive a fork and pooled sockets must not be
+    shared, so every worker starts its own.
+    """
+    global _services_pid
+    pid = os.getpid()
+    if _services_pid == pid:
+        return
+    with _services_lock:
+        if _services_pid == pid:
+            return
+        with app.app_context():
+            initialize_connection_pool(app.config)
+            # DDL lives in `python -m db.migrations`; workers only verify the version
+            check_schema_version()
+        revocations.start()
+        deletions.start()
+        pipeline.start()
+        alerts.start()
+        _services_pid = pid
+
+
 def create_app():
     app = Flask(__name__)
 
@@ -24,8 +65,18 @@ def create_app():
         )
 
     jwt = JWTManager(app)
+    register_blocklist(jwt)
+
+    limiter.init_app(app=app)
+
+    @app.before_request
+    def ensure_process_services():
+        start_process_services(app)
 
-    # limiter.init_app(app=app)
+    @app.errorhandler(429)
+    def rate_limited(e):
+        # The limiter adds X-RateLimit-* and Retry-After to this response
+        return jsonify({"error": "Rate limit exceeded", "limit": e.description}), 429
 
     # CORS config for endpoint access
     CORS(
@@ -45,11 +96,17 @@ def create_app():
     from user.routes import user_bp
     from maps.routes import maps_bp
     from trips.routes import trips_bp
+    from ingest.routes import ingest_bp
+    from reports.routes import reports_bp
+    from alerts.routes import alerts_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(user_bp)
     app.register_blueprint(maps_bp)
     app.register_blueprint(trips_bp)
+    app.register_blueprint(ingest_bp)
+    app.register_blueprint(reports_bp)
+    app.register_blueprint(alerts_bp)
 
     # Security headers configuration
     @app.after_request
@@ -90,17 +147,34 @@ def create_app():
 
         return response
 
-    return app
+    @app.route('/')
+    @limiter.exempt
+    def home():
+        return "Welcome to primer backend!"
+
+    @app.route('/health')
+    @limiter.exempt
+    def health():
+        """Liveness plus connection pool gauges (wait time, checkout duration, utilisation), replica lag and schema version."""
+        return {
+            "status": "ok",
+            "db_pool": get_pool_stats(),
+            "db_replica": get_replica_stats(),
+            "schema": schema_status,
+            "token_blocklist": revocations.stats(),
+            "password_hashing": passwords.stats(),
+            "s3_deletions": deletions.stats(),
+            "image_pipeline": pipeline.stats(),
+            "profile_cache": profile_cache.stats(),
+            "alerts": alerts.stats(),
+        }, 200
 
-app = create_app()
+    return app
 
-with app.app_context():
-    initialize_connection_pool()
-    initialize_database_and_create_tables()
-    
-@app.route('/')
-def home():
-    return "Welcome to primer backend!"
+# Spawned pool children (password hashing, image pipeline) re-import this
+# file as __mp_main__ when it is run directly; they need the module, not an app
+if __name__ != "__mp_main__":
+    app = create_app()
 
 if __name__ == "__main__":
     
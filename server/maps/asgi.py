@@ -0,0 +1,360 @@
+"""
+Async (ASGI) serving mode for the read-only maps endpoints.
+
+Serves the same URLs and JSON bodies as the ``maps`` blueprint, but each
+request awaits an asyncpg pool instead of holding a WSGI thread and a
+psycopg2 connection, so a few processes can hold thousands of concurrent
+dashboard clients. Route /api/maps/* GETs here and everything else to the
+Flask app:
+
+    pip install "server[asgi]"
+    uvicorn maps.asgi:app --workers 2 --port 5001 --proxy-headers
+
+Each endpoint charges the same per-client API budget as its blueprint
+route (``extensions.api_cost``): same costs, RATELIMIT_* settings, strategy
+and counter keys. With RATELIMIT_STORAGE_URI=redis://... both servers share
+one budget per client; with memory:// every process counts its own. Run
+behind the same proxy as the Flask app (``--proxy-headers``) so the client
+address is the forwarded one, as ProxyFix gives Flask.
+"""
+
+import itertools
+import json
+import math
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import asyncpg
+import jwt
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response
+from starlette.routing import Route
+
+from auth.blocklist import revocations
+from config import BaseConfig, DevConfig, ProdConfig
+from db.db_setup import initialize_connection_pool
+from db.queries import PREPARED_ENABLED, QUERIES
+from .rollups import RESOLUTIONS, node_rollup_query
+from .geohash import spatial_filter
+from .services import (
+    AIR_QUALITY_COLUMNS,
+    build_forecast,
+    history_cost,
+    node_history_cost,
+    parse_time_range,
+    parse_viewport,
+)
+
+load_dotenv()
+
+AppConfig = ProdConfig if os.getenv("FLASK_ENV") == "production" else DevConfig
+
+_pool: asyncpg.Pool | None = None
+
+
+# ─── Database ─────────────────────────────────────────────────────────────────
+
+def _connect_kwargs() -> dict:
+    """Same connection sources and SSL policy as db_setup.initialize_connection_pool."""
+    ssl_mode = "require" if os.getenv("FLASK_ENV") == "production" else "disable"
+    if os.getenv("DATABASE_URL"):
+        return {"dsn": os.getenv("DATABASE_URL"), "ssl": ssl_mode}
+    if os.getenv("PG_HOST"):
+        return {
+            "host": os.getenv("PG_HOST"),
+            "database": os.getenv("PG_DB"),
+            "user": os.getenv("PG_USER"),
+            "password": os.getenv("PG_PASSWORD"),
+            "port": os.getenv("PG_PORT"),
+            "ssl": ssl_mode,
+        }
+    raise RuntimeError("No database configuration found in environment variables.")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global _pool
+    _pool = await asyncpg.create_pool(
+        min_size=int(os.getenv("ASYNC_DB_POOL_MIN_CONN", BaseConfig.DB_POOL_MIN_CONN)),
+        max_size=int(os.getenv("ASYNC_DB_POOL_MAX_CONN", 50)),
+        # asyncpg prepares every statement itself; transaction-mode poolers need it off
+        statement_cache_size=100 if PREPARED_ENABLED else 0,
+        **_connect_kwargs(),
+    )
+    # The revocation cache refreshes over the regular psycopg2 pool in a background thread
+    initialize_connection_pool()
+    revocations.start()
+    try:
+        yield
+    finally:
+        revocations.stop()
+        await _pool.close()
+
+
+async def _fetch(sql: str, *args) -> list[dict]:
+    rows = await _pool.fetch(sql, *args)
+    return [dict(row) for row in rows]
+
+
+def _numbered(sql: str, first_param: int = 1) -> str:
+    """Rewrite psycopg2 ``%s`` placeholders as asyncpg ``$n``, starting at ``first_param``."""
+    numbers = itertools.count(first_param)
+    return sql.replace("%s", "{}").format(*(f"${next(numbers)}" for _ in range(sql.count("%s"))))
+
+
+def _bounded(base_sql: str, first_param: int, since, until, bbox=None, zoom=None) -> tuple[str, list]:
+    """Append optional timestamp and viewport bounds to a query ending in ``ORDER BY``."""
+    where, order = base_sql.rsplit("ORDER BY", 1)
+    clause, args = "", []
+    for op, value in ((">=", since), ("<", until)):
+        if value is not None:
+            clause += f" AND timestamp {op} %s"
+            args.append(value)
+    if bbox is not None:
+        spatial, spatial_args = spatial_filter(bbox, zoom)
+        clause, args = clause + spatial, args + spatial_args
+    # asyncpg wants $n placeholders, numbered after the base query's own
+    clause = _numbered(clause, first_param)
+    joiner = "" if "WHERE" in where else " WHERE TRUE"
+    return f"{where}{joiner}{clause} ORDER BY{order}", args
+
+
+# ─── Responses (mirror flask.jsonify + flask_jwt_extended) ───────────────────
+
+def _default(value):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _json(payload: dict, status: int = 200) -> Response:
+    body = json.dumps(payload, default=_default, sort_keys=True, separators=(",", ":"))
+    return Response(body + "\n", status_code=status, media_type="application/json",
+                    headers={"X-Content-Type-Options": "nosniff", "X-Frame-Options": "DENY"})
+
+
+def _error(message: str, status: int) -> Response:
+    return _json({"status": "error", "message": message}, status)
+
+
+# ─── Rate limiting (mirrors extensions.api_cost) ─────────────────────────────
+
+class ApiBudget:
+    """
+    The Flask app's shared "api" budget, hit through the same ``limits``
+    storage and strategy flask-limiter uses, under the same key
+    (RATELIMIT_KEY_PREFIX, client address, "api").
+    """
+
+    def __init__(self, config):
+        from limits import parse
+        from limits.storage import storage_from_string
+        from limits.strategies import STRATEGIES
+
+        strategy = STRATEGIES[config.RATELIMIT_STRATEGY]
+        self.limit = parse(config.RATELIMIT_API_BUDGET)
+        self.shared = not config.RATELIMIT_STORAGE_URI.startswith("memory://")
+        self._prefix = config.RATELIMIT_KEY_PREFIX
+        self._limiter = strategy(storage_from_string(config.RATELIMIT_STORAGE_URI))
+        self._fallback = (
+            strategy(storage_from_string("memory://")) if config.RATELIMIT_IN_MEMORY_FALLBACK_ENABLED else None
+        )
+
+    def hit(self, client: str, cost: int) -> tuple[bool, int, int]:
+        """Charge ``cost`` units; returns (allowed, remaining, reset epoch seconds)."""
+        keys = [self._prefix, client, "api"] if self._prefix else [client, "api"]
+        try:
+            allowed = self._limiter.hit(self.limit, *keys, cost=cost)
+            stats = self._limiter.get_window_stats(self.limit, *keys)
+        except Exception:
+            # Shared store down: keep limiting per process, like the Flask fallback
+            if self._fallback is None:
+                raise
+            allowed = self._fallback.hit(self.limit, *keys, cost=cost)
+            stats = self._fallback.get_window_stats(self.limit, *keys)
+        return allowed, stats.remaining, int(stats.reset_time)
+
+
+_budget = ApiBudget(AppConfig)
+
+
+def api_cost(cost):
+    """Charge ``cost`` units (an int, or a callable of the query params) of the client's API budget."""
+    def decorator(handler):
+        async def wrapper(request):
+            units = cost(request.query_params) if callable(cost) else cost
+            client = request.client.host if request.client else "127.0.0.1"
+            if _budget.shared:
+                allowed, remaining, reset = await run_in_threadpool(_budget.hit, client, units)
+            else:
+                allowed, remaining, reset = _budget.hit(client, units)
+
+            if allowed:
+                response = await handler(request)
+            else:
+                # Same body as the Flask 429 handler in main.py
+                response = _json({"error": "Rate limit exceeded", "limit": str(_budget.limit)}, 429)
+                response.headers["Retry-After"] = str(max(0, reset - int(time.time())))
+            if AppConfig.RATELIMIT_HEADERS_ENABLED:
+                response.headers["X-RateLimit-Limit"] = str(_budget.limit.amount)
+                response.headers["X-RateLimit-Remaining"] = str(remaining)
+                response.headers["X-RateLimit-Reset"] = str(reset)
+            return response
+        return wrapper
+    return decorator
+
+
+def jwt_required(handler):
+    """Validate the Bearer access token the same way the Flask JWTManager does."""
+    async def wrapper(request):
+        header = request.headers.get("Authorization", "")
+        if not header:
+            return _json({"msg": "Missing Authorization Header"}, 401)
+        parts = header.split()
+        if len(parts) != 2 or parts[0] != "Bearer":
+            return _json({"msg": "Bad Authorization header. Expected 'Authorization: Bearer <JWT>'"}, 422)
+        try:
+            claims = jwt.decode(parts[1], AppConfig.JWT_SECRET_KEY, algorithms=["HS256"])
+        except jwt.ExpiredSignatureError:
+            return _json({"msg": "Token has expired"}, 401)
+        except jwt.InvalidTokenError as e:
+            return _json({"msg": str(e)}, 422)
+        if claims.get("type") != "access":
+            return _json({"msg": "Only non-refresh tokens are allowed"}, 422)
+        # In-memory for almost every token; only a Bloom false positive touches the DB
+        if revocations.is_revoked(claims["jti"]):
+            return _json({"msg": "Token has been revoked"}, 401)
+        request.state.jwt = claims
+        return await handler(request)
+    return wrapper
+
+
+# ─── Endpoints ────────────────────────────────────────────────────────────────
+
+@api_cost(history_cost)
+@jwt_required
+async def get_all_air_quality(request):
+    try:
+        since, until = parse_time_range(request.query_params)
+        bbox, zoom = parse_viewport(request.query_params)
+    except ValueError as e:
+        return _error(str(e), 400)
+
+    try:
+        sql, args = _bounded(QUERIES["aq_all"], 1, since, until, bbox, zoom)
+        data = await _fetch(sql, *args)
+        return _json({"status": "success", "count": len(data), "data": data})
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+@api_cost(node_history_cost)
+@jwt_required
+async def get_air_quality_node(request):
+    node_id = request.path_params["node_id"]
+    resolution = request.query_params.get("resolution", "raw")
+    if resolution != "raw" and resolution not in RESOLUTIONS:
+        return _error("resolution must be raw, hour or day", 400)
+
+    try:
+        since, until = parse_time_range(request.query_params)
+    except ValueError as e:
+        return _error(str(e), 400)
+
+    try:
+        if resolution == "raw":
+            sql, args = _bounded(QUERIES["aq_by_node"], 2, since, until)
+            args = [node_id, *args]
+        else:
+            # Same query builder as the blueprint, so both round since/until to the same buckets
+            sql, args = node_rollup_query(node_id, resolution, since, until)
+            sql = _numbered(sql)
+        data = await _fetch(sql, *args)
+
+        if not data:
+            return _error(f"No data found for node {node_id}", 404)
+        return _json({
+            "status": "success", "node_id": node_id, "resolution": resolution,
+            "count": len(data), "data": data,
+        })
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+@api_cost(2)
+@jwt_required
+async def get_latest_air_quality(request):
+    try:
+        bbox, zoom = parse_viewport(request.query_params)
+    except ValueError as e:
+        return _error(str(e), 400)
+
+    try:
+        sql, args = _bounded(QUERIES["aq_latest_per_node"], 1, None, None, bbox, zoom)
+        data = await _fetch(sql, *args)
+        return _json({"status": "success", "count": len(data), "data": data})
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+@api_cost(1)
+@jwt_required
+async def get_nearest(request):
+    try:
+        lat = float(request.query_params["lat"])
+        lon = float(request.query_params["lon"])
+    except (KeyError, ValueError):
+        return _error("lat and lon query parameters are required", 400)
+
+    try:
+        rows = await _fetch(QUERIES["aq_latest_per_node"])
+        if not rows:
+            return _error("No air quality data found", 404)
+        # Same Euclidean approximation as services.get_nearest_air_quality
+        best = min(rows, key=lambda r: math.hypot((r["lat"] or 0) - lat, (r["lon"] or 0) - lon))
+        return _json({"status": "success", "data": {c: best[c] for c in AIR_QUALITY_COLUMNS}})
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+@api_cost(5)
+@jwt_required
+async def get_forecast(request):
+    try:
+        nodes = await _fetch(QUERIES["aq_latest_per_node"])
+        # Model evaluation is CPU-bound; keep it off the event loop
+        data = await run_in_threadpool(build_forecast, nodes)
+        return _json({"status": "success", "count": len(data), "data": data})
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+app = Starlette(
+    routes=[
+        Route("/api/maps/air-quality", get_all_air_quality),
+        Route("/api/maps/air-quality/node/{node_id:int}", get_air_quality_node),
+        Route("/api/maps/air-quality/latest", get_latest_air_quality),
+        Route("/api/maps/air-quality/nearest", get_nearest),
+        Route("/api/maps/forecast", get_forecast),
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=AppConfig.CORS_ORIGINS,
+            allow_methods=AppConfig.CORS_METHODS,
+            allow_headers=AppConfig.CORS_ALLOW_HEADERS,
+            expose_headers=AppConfig.CORS_EXPOSE_HEADERS,
+            allow_credentials=AppConfig.CORS_SUPPORTS_CREDENTIALS,
+        ),
+    ],
+    lifespan=lifespan,
+)
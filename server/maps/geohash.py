@@ -0,0 +1,126 @@
+"""
+Geohash helpers for viewport (bbox) queries on air_quality_data.
+
+Every reading stores a precision-9 geohash in a generated ``geohash`` column
+(``COLLATE "C"``, B-tree indexed). A viewport is covered by a handful of
+coarser geohash cells, and each cell becomes an index range scan
+``geohash >= cell AND geohash < cell || '~'``. The exact lat/lon check then
+trims readings in the cell edges outside the box.
+"""
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {c: i for i, c in enumerate(_BASE32)}
+
+COLUMN_PRECISION = 9
+MAX_COVER_CELLS = 32
+
+# Approximate web-map zoom level -> geohash length whose cells are about one
+# viewport tile wide (zoom 0 shows the world, zoom 18 a few buildings)
+_ZOOM_PRECISION = [1, 1, 1, 2, 2, 2, 3, 3, 3, 4, 4, 4, 5, 5, 6, 6, 7, 7, 8]
+
+
+def encode(lat: float, lon: float, precision: int = COLUMN_PRECISION) -> str:
+    """Geohash of a point; matches the SQL ``geohash_encode`` function."""
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            value = value * 2 + (lon >= mid)
+            lon_lo, lon_hi = (mid, lon_hi) if lon >= mid else (lon_lo, mid)
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            value = value * 2 + (lat >= mid)
+            lat_lo, lat_hi = (mid, lat_hi) if lat >= mid else (lat_lo, mid)
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def cell_bounds(cell: str) -> tuple[float, float, float, float]:
+    """(min_lon, min_lat, max_lon, max_lat) of a geohash cell."""
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    even = True
+    for c in cell:
+        value = _DECODE[c]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                lon_lo, lon_hi = (mid, lon_hi) if bit else (lon_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return lon_lo, lat_lo, lon_hi, lat_hi
+
+
+def parse_bbox(value: str) -> tuple[float, float, float, float]:
+    """Parse ``min_lon,min_lat,max_lon,max_lat`` (raises ValueError)."""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in value.split(","))
+    except ValueError:
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    if not (-180 <= min_lon < max_lon <= 180 and -90 <= min_lat < max_lat <= 90):
+        raise ValueError("bbox must satisfy -180 <= min_lon < max_lon <= 180 and -90 <= min_lat < max_lat <= 90")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def precision_for_zoom(zoom: int) -> int:
+    return _ZOOM_PRECISION[max(0, min(zoom, len(_ZOOM_PRECISION) - 1))]
+
+
+def _cell_size(precision: int) -> tuple[float, float]:
+    """(width in degrees lon, height in degrees lat) of a cell; longitude gets the odd bit."""
+    bits = 5 * precision
+    return 360.0 / 2 ** ((bits + 1) // 2), 180.0 / 2 ** (bits // 2)
+
+
+def _cell_count(bbox: tuple, precision: int) -> int:
+    min_lon, min_lat, max_lon, max_lat = bbox
+    width, height = _cell_size(precision)
+    return (int((max_lon - min_lon) / width) + 2) * (int((max_lat - min_lat) / height) + 2)
+
+
+def _cells_at(bbox: tuple, precision: int) -> list[str]:
+    min_lon, min_lat, max_lon, max_lat = bbox
+    # Step by the cell size at this precision, starting from the SW corner's cell
+    lon0, lat0, lon1, lat1 = cell_bounds(encode(min_lat, min_lon, precision))
+    width, height = lon1 - lon0, lat1 - lat0
+    cells = []
+    lat = lat0 + height / 2
+    while lat - height / 2 < max_lat:
+        lon = lon0 + width / 2
+        while lon - width / 2 < max_lon:
+            cells.append(encode(lat, lon, precision))
+            lon += width
+        lat += height
+    return cells
+
+
+def cover(bbox: tuple, zoom: int | None = None, max_cells: int = MAX_COVER_CELLS) -> list[str]:
+    """
+    Geohash cells covering ``bbox``. ``zoom`` picks the cell size; without it
+    the finest precision whose cover fits in ``max_cells`` is used. A cover
+    that would exceed ``max_cells`` is coarsened so the query stays a few
+    index ranges.
+    """
+    precision = precision_for_zoom(zoom) if zoom is not None else COLUMN_PRECISION
+    # Upper-bound the cell count before enumerating, so a city-sized box never
+    # walks millions of precision-9 cells
+    while precision > 1 and _cell_count(bbox, precision) > max_cells:
+        precision -= 1
+    return sorted(set(_cells_at(bbox, precision)))
+
+
+def spatial_filter(bbox: tuple, zoom: int | None = None) -> tuple[str, list]:
+    """``AND (...)`` clause restricting rows of a table with geohash/lat/lon columns to ``bbox`` (``%s`` placeholders)."""
+    cells = cover(bbox, zoom)
+    ranges = " OR ".join(["(geohash >= %s AND geohash < %s)"] * len(cells))
+    params = [bound for cell in cells for bound in (cell, cell + "~")]
+    min_lon, min_lat, max_lon, max_lat = bbox
+    clause = f" AND ({ranges}) AND lon BETWEEN %s AND %s AND lat BETWEEN %s AND %s"
+    return clause, params + [min_lon, max_lon, min_lat, max_lat]
@@ -0,0 +1,233 @@
+"""
+Hourly and daily per-node rollups of air_quality_data.
+
+Buckets are recomputed from raw readings only over windows that received
+new data: the ingestion path refreshes the node/time range of each batch
+inside its own transaction, and a scheduled job catches rows written by
+other producers (e.g. the n8n pipeline) using a timestamp watermark.
+Recomputations of the same node are serialised with advisory locks, so two
+overlapping batches cannot overwrite each other's totals:
+
+    python -m maps.rollups
+"""
+
+import argparse
+import os
+from datetime import datetime, timedelta, timezone
+
+from db.db_setup import get_db_connection
+
+RESOLUTIONS = {"hour": "air_quality_hourly", "day": "air_quality_daily"}
+
+ROLLUP_COLUMNS = [
+    "node_id", "bucket", "readings",
+    "pm25_avg", "pm25_min", "pm25_max",
+    "no2_avg", "no2_min", "no2_max",
+    "o3_avg", "o3_min", "o3_max",
+]
+
+# Rows can arrive after newer ones; the scheduled refresh re-aggregates this much history
+LATE_ARRIVAL = timedelta(hours=int(os.getenv("ROLLUP_LATE_ARRIVAL_HOURS", 2)))
+
+# Advisory lock namespace: key -1 guards full refreshes, 0..N-1 are node slots
+_ADVISORY_LOCK_ID = 427_003
+_ALL_NODES = -1
+# Nodes hash onto this many locks, bounding the locks one batch can hold
+_NODE_LOCK_SLOTS = 64
+
+_REFRESH_SQL = """
+    INSERT INTO {table} (
+        node_id, bucket, readings,
+        pm25_avg, pm25_min, pm25_max,
+        no2_avg, no2_min, no2_max,
+        o3_avg, o3_min, o3_max
+    )
+    SELECT
+        node_id,
+        date_trunc('{unit}', timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' AS bucket,
+        count(*),
+        avg(pm25), min(pm25), max(pm25),
+        avg(no2), min(no2), max(no2),
+        avg(o3), min(o3), max(o3)
+    FROM air_quality_data
+    WHERE timestamp >= %(start)s AND timestamp < %(end)s
+      AND node_id IS NOT NULL
+      {node_filter}
+    GROUP BY 1, 2
+    ON CONFLICT (node_id, bucket) DO UPDATE SET
+        readings = EXCLUDED.readings,
+        pm25_avg = EXCLUDED.pm25_avg, pm25_min = EXCLUDED.pm25_min, pm25_max = EXCLUDED.pm25_max,
+        no2_avg  = EXCLUDED.no2_avg,  no2_min  = EXCLUDED.no2_min,  no2_max  = EXCLUDED.no2_max,
+        o3_avg   = EXCLUDED.o3_avg,   o3_min   = EXCLUDED.o3_min,   o3_max   = EXCLUDED.o3_max,
+        updated_at = now();
+"""
+
+
+def bucket_start(ts: datetime, resolution: str) -> datetime:
+    """Floor ``ts`` to the start of its UTC hour or day."""
+    ts = ts.astimezone(timezone.utc)
+    ts = ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0) if resolution == "day" else ts
+
+
+def _step(resolution: str) -> timedelta:
+    return timedelta(days=1) if resolution == "day" else timedelta(hours=1)
+
+
+def _bucket_end(ts: datetime, resolution: str) -> datetime:
+    """Smallest bucket boundary >= ``ts``."""
+    start = bucket_start(ts, resolution)
+    return start if start == ts else start + _step(resolution)
+
+
+def _lock_nodes(cur, node_ids: list[int] | None) -> None:
+    """
+    Each recompute aggregates from its own statement snapshot and replaces
+    the bucket. Two transactions recomputing the same node concurrently
+    would each write a total missing the other's uncommitted rows, and the
+    later commit would win. Holding these locks until commit makes the second
+    one wait; its INSERT ... SELECT then runs on a fresh READ COMMITTED
+    snapshot that includes the first one's rows.
+    """
+    if not node_ids:
+        cur.execute("SELECT pg_advisory_xact_lock(%s, %s);", (_ADVISORY_LOCK_ID, _ALL_NODES))
+        return
+    cur.execute("SELECT pg_advisory_xact_lock_shared(%s, %s);", (_ADVISORY_LOCK_ID, _ALL_NODES))
+    # Sorted so overlapping batches always lock in the same order (no deadlocks)
+    for slot in sorted({node_id % _NODE_LOCK_SLOTS for node_id in node_ids}):
+        cur.execute("SELECT pg_advisory_xact_lock(%s, %s);", (_ADVISORY_LOCK_ID, slot))
+
+
+def refresh_rollups(cur, start: datetime, end: datetime, node_ids: list[int] | None = None) -> None:
+    """
+    Recompute every hourly and daily bucket overlapping [start, end],
+    optionally only for ``node_ids``. Buckets are widened to whole
+    hours/days so each upsert replaces a complete aggregate. Takes
+    transaction-scoped locks (see ``_lock_nodes``); call it as late in the
+    transaction as possible.
+    """
+    _lock_nodes(cur, node_ids)
+    node_filter = "AND node_id = ANY(%(nodes)s)" if node_ids else ""
+    for resolution, table in RESOLUTIONS.items():
+        cur.execute(
+            _REFRESH_SQL.format(table=table, unit=resolution, node_filter=node_filter),
+            {
+                "start": bucket_start(start, resolution),
+                "end": bucket_start(end, resolution) + _step(resolution),
+                "nodes": list(node_ids or []),
+            },
+        )
+
+
+def refresh_for_batch(cur, rows: list[tuple]) -> None:
+    """Refresh the buckets touched by a freshly ingested batch of (node_id, timestamp, ...) rows."""
+    if not rows:
+        return
+    node_ids = sorted({row[0] for row in rows})
+    timestamps = [row[1] for row in rows]
+    refresh_rollups(cur, min(timestamps), max(timestamps), node_ids)
+
+
+def refresh_since_watermark(name: str = "air_quality") -> tuple[datetime, datetime] | None:
+    """
+    Scheduled refresh: aggregate everything newer than the stored watermark
+    (minus LATE_ARRIVAL) and advance it to the newest reading seen.
+    """
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT watermark FROM rollup_state WHERE name = %s FOR UPDATE;", (name,))
+            row = cur.fetchone()
+
+            if row:
+                start = row[0] - LATE_ARRIVAL
+                cur.execute("SELECT max(timestamp) FROM air_quality_data WHERE timestamp >= %s;", (start,))
+                newest = cur.fetchone()[0]
+            else:
+                cur.execute("SELECT min(timestamp), max(timestamp) FROM air_quality_data;")
+                start, newest = cur.fetchone()
+
+            if newest is None:
+                conn.rollback()
+                return None
+
+            refresh_rollups(cur, start, newest)
+            cur.execute(
+                """
+                INSERT INTO rollup_state (name, watermark) VALUES (%s, %s)
+                ON CONFLICT (name) DO UPDATE SET watermark = GREATEST(rollup_state.watermark, EXCLUDED.watermark);
+                """,
+                (name, newest),
+            )
+            conn.commit()
+            return start, newest
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+
+def node_rollup_query(
+    node_id: int,
+    resolution: str,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> tuple[str, list]:
+    """
+    SQL (``%s`` placeholders) and params for one node's buckets, newest
+    first. ``since`` is floored and ``until`` rounded up to bucket
+    boundaries, so every bucket overlapping the range is returned. Shared
+    by the Flask and ASGI servers so both answer with the same buckets.
+    """
+    clause, params = "", [node_id]
+    if since is not None:
+        clause += " AND bucket >= %s"
+        params.append(bucket_start(since, resolution))
+    if until is not None:
+        clause += " AND bucket < %s"
+        params.append(_bucket_end(until, resolution))
+    sql = f"""
+        SELECT {", ".join(ROLLUP_COLUMNS)}
+        FROM {RESOLUTIONS[resolution]}
+        WHERE node_id = %s{clause}
+        ORDER BY bucket DESC
+    """
+    return sql, params
+
+
+def get_node_rollups(
+    node_id: int,
+    resolution: str,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> list[dict]:
+    """Return hourly or daily aggregates for one node, newest bucket first."""
+    sql, params = node_rollup_query(node_id, resolution, since, until)
+
+    with get_db_connection(readonly=True) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(sql, params)
+            return [dict(zip(ROLLUP_COLUMNS, row)) for row in cur.fetchall()]
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+
+
+def main() -> None:
+    from db.db_setup import initialize_connection_pool
+
+    argparse.ArgumentParser(description="Refresh hourly/daily air quality rollups.").parse_args()
+    initialize_connection_pool()
+    window = refresh_since_watermark()
+    if window is None:
+        print("No readings to roll up.")
+    else:
+        print(f"Rolled up readings from {window[0].isoformat()} to {window[1].isoformat()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,31 @@
 
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required
+from extensions import api_cost
 from .services import (
     get_all_air_quality_data,
     get_air_quality_by_node,
     get_latest_per_node,
     get_nearest_air_quality,
     get_forecast_for_all_nodes,
+    history_cost,
+    node_history_cost,
+    parse_time_range,
+    parse_viewport,
 )
+from .rollups import RESOLUTIONS, get_node_rollups
 
 maps_bp = Blueprint("maps", __name__, url_prefix="/api/maps")
 
 
+def _history_cost() -> int:
+    return history_cost(request.args)
+
+
+def _node_history_cost() -> int:
+    return node_history_cost(request.args)
+
+
 def _serialize(records: list[dict]) -> list[dict]:
     """Convert non-JSON-serialisable types (UUID, datetime) to strings."""
     import uuid
@@ -33,50 +47,86 @@ def _serialize(records: list[dict]) -> list[dict]:
 
 
 @maps_bp.route("/air-quality", methods=["GET"])
+@api_cost(_history_cost)
 @jwt_required()
 def get_all_air_quality():
     """
-    GET /api/maps/air-quality
+    GET /api/maps/air-quality?start=<iso>&end=<iso>&bbox=<min_lon,min_lat,max_lon,max_lat>&zoom=<int>
     Returns every row in air_quality_data as JSON, ordered by timestamp DESC.
+    start / end are optional and restrict the scan to the matching partitions.
+    bbox (optional) returns only readings inside the map viewport; zoom sets
+    the geohash cell size used to cover it.
     """
     try:
-        data = get_all_air_quality_data()
+        since, until = parse_time_range(request.args)
+        bbox, zoom = parse_viewport(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        data = get_all_air_quality_data(since, until, bbox, zoom)
         return jsonify({"status": "success", "count": len(data), "data": _serialize(data)}), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
 @maps_bp.route("/air-quality/node/<int:node_id>", methods=["GET"])
+@api_cost(_node_history_cost)
 @jwt_required()
 def get_air_quality_node(node_id: int):
     """
-    GET /api/maps/air-quality/node/<node_id>
+    GET /api/maps/air-quality/node/<node_id>?start=<iso>&end=<iso>&resolution=raw|hour|day
     Returns all readings for a specific sensor node, newest first.
+    resolution=hour|day returns per-bucket avg/min/max from the rollup tables
+    instead of raw rows.
     """
+    resolution = request.args.get("resolution", "raw")
+    if resolution != "raw" and resolution not in RESOLUTIONS:
+        return jsonify({"status": "error", "message": "resolution must be raw, hour or day"}), 400
+
+    try:
+        since, until = parse_time_range(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
     try:
-        data = get_air_quality_by_node(node_id)
+        if resolution == "raw":
+            data = get_air_quality_by_node(node_id, since, until)
+        else:
+            data = get_node_rollups(node_id, resolution, since, until)
         if not data:
             return jsonify({"status": "error", "message": f"No data found for node {node_id}"}), 404
-        return jsonify({"status": "success", "node_id": node_id, "count": len(data), "data": _serialize(data)}), 200
+        return jsonify({
+            "status": "success", "node_id": node_id, "resolution": resolution,
+            "count": len(data), "data": _serialize(data),
+        }), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
 @maps_bp.route("/air-quality/latest", methods=["GET"])
+@api_cost(2)
 @jwt_required()
 def get_latest_air_quality():
     """
-    GET /api/maps/air-quality/latest
+    GET /api/maps/air-quality/latest?bbox=<min_lon,min_lat,max_lon,max_lat>&zoom=<int>
     Returns the most-recent reading for every node — one pin per sensor on the map.
+    bbox / zoom (optional) limit the pins to the current viewport.
     """
     try:
-        data = get_latest_per_node()
+        bbox, zoom = parse_viewport(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        data = get_latest_per_node(bbox, zoom)
         return jsonify({"status": "success", "count": len(data), "data": _serialize(data)}), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
 @maps_bp.route("/air-quality/nearest", methods=["GET"])
+@api_cost(1)
 @jwt_required()
 def get_nearest():
     """
@@ -102,6 +152,7 @@ def get_nearest():
 
 
 @maps_bp.route("/forecast", methods=["GET"])
+@api_cost(5)
 @jwt_required()
 def get_forecast():
     """
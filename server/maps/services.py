@@ -1,6 +1,18 @@
-"""DB service functions for the air_quality_data table."""
+"""
+DB service functions for the air_quality_data table.
+
+All queries here are reads and go to the read replica when one is configured
+(see ``db_setup.get_db_connection``), falling back to the primary.
+"""
+
+import math
+import os
+import time
+from datetime import datetime, timezone
 
 from db.db_setup import get_db_connection
+from db.queries import execute_named
+from .geohash import parse_bbox, spatial_filter
 
 
 # All columns in air_quality_data, in schema order
@@ -32,26 +44,101 @@ def _row_to_dict(row: tuple) -> dict:
     return dict(zip(AIR_QUALITY_COLUMNS, row))
 
 
-def get_all_air_quality_data() -> list[dict]:
-    """Fetch every row from air_quality_data and return as a list of dicts."""
-    with get_db_connection() as conn:
+def parse_time_range(args) -> tuple[datetime | None, datetime | None]:
+    """Read optional ISO-8601 ``start`` / ``end`` query parameters (raises ValueError)."""
+    bounds = []
+    for name in ("start", "end"):
+        value = args.get(name)
+        if not value:
+            bounds.append(None)
+            continue
+        try:
+            ts = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"{name} must be an ISO-8601 timestamp")
+        bounds.append(ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc))
+    return bounds[0], bounds[1]
+
+
+def history_cost(args) -> int:
+    """API budget units for /air-quality: unbounded history scans every partition; a time range or viewport keeps it small."""
+    bounded = any(args.get(k) for k in ("start", "end", "bbox"))
+    return 3 if bounded else 10
+
+
+def node_history_cost(args) -> int:
+    """API budget units for /air-quality/node/<id>: rollups are cheap, raw history is not."""
+    return 1 if args.get("resolution", "raw") != "raw" else 3
+
+
+def parse_viewport(args) -> tuple[tuple | None, int | None]:
+    """Read optional ``bbox=min_lon,min_lat,max_lon,max_lat`` and ``zoom`` query parameters (raises ValueError)."""
+    bbox = parse_bbox(args["bbox"]) if args.get("bbox") else None
+    zoom = args.get("zoom")
+    if zoom is not None and zoom != "":
+        try:
+            zoom = int(zoom)
+        except ValueError:
+            raise ValueError("zoom must be an integer")
+        if bbox is None:
+            raise ValueError("zoom requires bbox")
+    else:
+        zoom = None
+    return bbox, zoom
+
+
+def _time_bounds(since: datetime | None, until: datetime | None) -> tuple[str, list]:
+    """
+    Build ``AND timestamp >= … AND timestamp < …`` for the supplied bounds.
+    Bounded queries only touch the monthly partitions that overlap the range.
+    """
+    clause, params = "", []
+    if since is not None:
+        clause += " AND timestamp >= %s"
+        params.append(since)
+    if until is not None:
+        clause += " AND timestamp < %s"
+        params.append(until)
+    return clause, params
+
+
+def get_all_air_quality_data(
+    since: datetime | None = None,
+    until: datetime | None = None,
+    bbox: tuple | None = None,
+    zoom: int | None = None,
+) -> list[dict]:
+    """
+    Fetch every row (optionally within [since, until) and inside ``bbox``)
+    from air_quality_data as a list of dicts.
+    """
+    bounds, params = _time_bounds(since, until)
+    if bbox is not None:
+        spatial, spatial_params = spatial_filter(bbox, zoom)
+        bounds, params = bounds + spatial, params + spatial_params
+    with get_db_connection(readonly=True) as conn:
         cur = conn.cursor()
         try:
-            cur.execute(
-                """
-                SELECT
-                    id, node_id, timestamp,
-                    lat, lon,
-                    pm25, no2, o3,
-                    wind_speed, wind_direction,
-                    temperature, humidity,
-                    traffic_density, traffic_current_speed,
-                    traffic_free_flow_speed, traffic_confidence,
-                    risk_score, risk_level
-                FROM air_quality_data
-                ORDER BY timestamp DESC;
-                """
-            )
+            if not params:
+                execute_named(cur, "aq_all")
+            else:
+                cur.execute(
+                    f"""
+                    SELECT
+                        id, node_id, timestamp,
+                        lat, lon,
+                        pm25, no2, o3,
+                        wind_speed, wind_direction,
+                        temperature, humidity,
+                        traffic_density, traffic_current_speed,
+                        traffic_free_flow_speed, traffic_confidence,
+                        risk_score, risk_level
+                    FROM air_quality_data
+                    WHERE TRUE{bounds}
+                    ORDER BY timestamp DESC;
+                    """,
+                    params,
+                )
             rows = cur.fetchall()
             return [_row_to_dict(row) for row in rows]
         except Exception as e:
@@ -61,28 +148,36 @@ def get_all_air_quality_data() -> list[dict]:
             cur.close()
 
 
-def get_air_quality_by_node(node_id: int) -> list[dict]:
-    """Fetch all readings for a specific sensor node, newest first."""
-    with get_db_connection() as conn:
+def get_air_quality_by_node(
+    node_id: int,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> list[dict]:
+    """Fetch all readings (optionally within [since, until)) for a specific sensor node, newest first."""
+    bounds, params = _time_bounds(since, until)
+    with get_db_connection(readonly=True) as conn:
         cur = conn.cursor()
         try:
-            cur.execute(
-                """
-                SELECT
-                    id, node_id, timestamp,
-                    lat, lon,
-                    pm25, no2, o3,
-                    wind_speed, wind_direction,
-                    temperature, humidity,
-                    traffic_density, traffic_current_speed,
-                    traffic_free_flow_speed, traffic_confidence,
-                    risk_score, risk_level
-                FROM air_quality_data
-                WHERE node_id = %s
-                ORDER BY timestamp DESC;
-                """,
-                (node_id,),
-            )
+            if not params:
+                execute_named(cur, "aq_by_node", (node_id,))
+            else:
+                cur.execute(
+                    f"""
+                    SELECT
+                        id, node_id, timestamp,
+                        lat, lon,
+                        pm25, no2, o3,
+                        wind_speed, wind_direction,
+                        temperature, humidity,
+                        traffic_density, traffic_current_speed,
+                        traffic_free_flow_speed, traffic_confidence,
+                        risk_score, risk_level
+                    FROM air_quality_data
+                    WHERE node_id = %s{bounds}
+                    ORDER BY timestamp DESC;
+                    """,
+                    [node_id, *params],
+                )
             rows = cur.fetchall()
             return [_row_to_dict(row) for row in rows]
         except Exception as e:
@@ -92,26 +187,32 @@ def get_air_quality_by_node(node_id: int) -> list[dict]:
             cur.close()
 
 
-def get_latest_per_node() -> list[dict]:
-    """Return the single most-recent reading for every node (useful for map pins)."""
-    with get_db_connection() as conn:
+def get_latest_per_node(bbox: tuple | None = None, zoom: int | None = None) -> list[dict]:
+    """Return the single most-recent reading for every node (optionally inside ``bbox``; useful for map pins)."""
+    with get_db_connection(readonly=True) as conn:
         cur = conn.cursor()
         try:
-            cur.execute(
-                """
-                SELECT DISTINCT ON (node_id)
-                    id, node_id, timestamp,
-                    lat, lon,
-                    pm25, no2, o3,
-                    wind_speed, wind_direction,
-                    temperature, humidity,
-                    traffic_density, traffic_current_speed,
-                    traffic_free_flow_speed, traffic_confidence,
-                    risk_score, risk_level
-                FROM air_quality_data
-                ORDER BY node_id, timestamp DESC;
-                """
-            )
+            if bbox is None:
+                execute_named(cur, "aq_latest_per_node")
+            else:
+                spatial, params = spatial_filter(bbox, zoom)
+                cur.execute(
+                    f"""
+                    SELECT DISTINCT ON (node_id)
+                        id, node_id, timestamp,
+                        lat, lon,
+                        pm25, no2, o3,
+                        wind_speed, wind_direction,
+                        temperature, humidity,
+                        traffic_density, traffic_current_speed,
+                        traffic_free_flow_speed, traffic_confidence,
+                        risk_score, risk_level
+                    FROM air_quality_data
+                    WHERE TRUE{spatial}
+                    ORDER BY node_id, timestamp DESC;
+                    """,
+                    params,
+                )
             rows = cur.fetchall()
             return [_row_to_dict(row) for row in rows]
         except Exception as e:
@@ -129,7 +230,7 @@ def get_nearest_air_quality(lat: float, lon: float) -> dict | None:
     Distance is computed using a simple Euclidean approximation directly
     in PostgreSQL — sufficient for the scale of a city dashboard.
     """
-    with get_db_connection() as conn:
+    with get_db_connection(readonly=True) as conn:
         cur = conn.cursor()
         try:
             cur.execute(
@@ -165,104 +266,170 @@ def get_nearest_air_quality(lat: float, lon: float) -> dict | None:
             cur.close()
 
 
-def get_forecast_for_all_nodes() -> list[dict]:
+FORECAST_HORIZONS = ["6h", "12h", "24h"]
+
+FORECAST_FEATURE_COLS = [
+    "lat", "lon",
+    "pm25", "no2", "o3",
+    "temperature", "humidity", "wind_speed",
+    "wind_sin", "wind_cos",
+    "pm25_lag1", "pm25_lag3", "pm25_lag6",
+    "pm25_roll3", "pm25_roll6",
+    "hour", "day_of_week",
+]
+
+_forecaster = None
+_local_forecaster = None
+_INFERENCE_MAX_BACKOFF_SECONDS = 30.0
+
+
+def _load_forecaster():
     """
-    Load trained XGBoost models from disk, fetch the latest reading for every
-    sensor node, and return AQI predictions for +6h, +12h, +24h alongside the
-    current AQI risk level.
+    Return a callable ``predict(X) -> {horizon: np.ndarray}``, loaded once per process.
 
-    Returns a list of dicts ready to be serialised to JSON:
-      { node_id, lat, lon, risk_score, risk_level,
-        aqi_6h, risk_6h, aqi_12h, risk_12h, aqi_24h, risk_24h }
+    When AQI_INFERENCE_SOCKET is set, predictions go to the shared
+    micro-batching worker (ML/inference_worker.py) and the models are only
+    loaded locally if that worker is unreachable. During an outage the
+    socket is retried on an exponential backoff (up to
+    _INFERENCE_MAX_BACKOFF_SECONDS) and the outage is logged once.
+    """
+    global _forecaster
+    if _forecaster is not None:
+        return _forecaster
+
+    socket_path = os.getenv("AQI_INFERENCE_SOCKET")
+    if not socket_path:
+        _forecaster = _load_local_forecaster()
+        return _forecaster
+
+    from ML.inference_worker import InferenceClient
+
+    client = InferenceClient(socket_path)
+    outage = {"retry_at": 0.0, "backoff": 0.0}
+
+    def predict_local(X):
+        local = _load_local_forecaster()
+        return local(X) if local else {}
+
+    def predict(X):
+        if time.monotonic() < outage["retry_at"]:
+            return predict_local(X)
+        try:
+            preds = client.predict_dict(X)
+        except OSError as e:
+            if not outage["backoff"]:
+                print(f"Inference worker unavailable ({e}); predicting in-process until it is back")
+            outage["backoff"] = min(max(2 * outage["backoff"], 1.0), _INFERENCE_MAX_BACKOFF_SECONDS)
+            outage["retry_at"] = time.monotonic() + outage["backoff"]
+            return predict_local(X)
+        if outage["backoff"]:
+            print("Inference worker reachable again")
+            outage["backoff"] = 0.0
+        return preds
+
+    _forecaster = predict
+    return _forecaster
+
+
+def _load_local_forecaster():
+    """
+    Load the models into this process. Prefers the compiled NumPy forest
+    (ML/aqi_forest.npz), which needs neither xgboost nor sklearn at serving
+    time, falls back to ``ML.aqi_forecast.load_models`` (native boosters
+    checked against their manifest, or the joblib files), and returns None
+    when nothing has been trained yet.
     """
-    import math
-    from pathlib import Path
+    global _local_forecaster
+    if _local_forecaster is not None:
+        return _local_forecaster or None
+
+    from ML.compiled_trees import DEFAULT_FOREST_PATH, CompiledForest
+
+    if DEFAULT_FOREST_PATH.exists():
+        _local_forecaster = CompiledForest.load(DEFAULT_FOREST_PATH).predict_dict
+        return _local_forecaster
+
+    from ML.aqi_forecast import DEFAULT_PREFIX, load_models
 
+    # Native UBJSON boosters when their manifest exists, else the joblib files
     try:
-        import joblib
-        import numpy as np
-    except ImportError:
-        raise RuntimeError("joblib and numpy are required. Run: pip install joblib numpy")
-
-    MODEL_DIR = Path(__file__).parent.parent / "ML"
-    HORIZONS = ["6h", "12h", "24h"]
-
-    # ── Load models (fail gracefully if not trained yet) ──────────────────────
-    models = {}
-    for h in HORIZONS:
-        model_path = MODEL_DIR / f"aqi_model_{h}.joblib"
-        if model_path.exists():
-            models[h] = joblib.load(str(model_path))
-
-    FEATURE_COLS = [
-        "lat", "lon",
-        "pm25", "no2", "o3",
-        "temperature", "humidity", "wind_speed",
-        "wind_sin", "wind_cos",
-        "pm25_lag1", "pm25_lag3", "pm25_lag6",
-        "pm25_roll3", "pm25_roll6",
-        "hour", "day_of_week",
-    ]
-
-    def classify_risk(aqi: float) -> str:
-        if aqi <= 50:
-            return "Low"
-        elif aqi <= 150:
-            return "Medium"
-        return "High"
-
-    def risk_color(level: str) -> str:
-        return {"Low": "#10b981", "Medium": "#f97316", "High": "#ef4444"}.get(level, "#94a3b8")
-
-    # ── Fetch latest data per node ────────────────────────────────────────────
-    nodes = get_latest_per_node()
+        models = load_models(DEFAULT_PREFIX)
+    except FileNotFoundError:
+        _local_forecaster = False
+        return None
+    except ImportError as e:
+        raise RuntimeError(f"Serving uncompiled models needs xgboost (and joblib for .joblib files): {e}") from e
+
+    def predict(X):
+        return {h: model.predict(X) for h, model in models.items()}
+
+    _local_forecaster = predict
+    return _local_forecaster
+
+
+def classify_risk(aqi: float) -> str:
+    if aqi <= 50:
+        return "Low"
+    elif aqi <= 150:
+        return "Medium"
+    return "High"
+
+
+def risk_color(level: str) -> str:
+    return {"Low": "#10b981", "Medium": "#f97316", "High": "#ef4444"}.get(level, "#94a3b8")
+
+
+def build_feature_row(node: dict) -> list[float]:
+    """Derive the model feature vector from a single latest reading."""
+    pm25 = node.get("pm25") or 0.0
+    wd_rad = math.radians(node.get("wind_direction") or 0.0)
+    feature_row = {
+        "lat": node.get("lat") or 0.0, "lon": node.get("lon") or 0.0,
+        "pm25": pm25, "no2": node.get("no2") or 0.0, "o3": node.get("o3") or 0.0,
+        "temperature": node.get("temperature") or 0.0,
+        "humidity": node.get("humidity") or 0.0,
+        "wind_speed": node.get("wind_speed") or 0.0,
+        "wind_sin": math.sin(wd_rad), "wind_cos": math.cos(wd_rad),
+        # Lag features unavailable from a single row — use current pm25 as proxy
+        "pm25_lag1": pm25, "pm25_lag3": pm25, "pm25_lag6": pm25,
+        "pm25_roll3": pm25, "pm25_roll6": pm25,
+        "hour": 0, "day_of_week": 0,
+    }
+    return [feature_row.get(c, 0.0) for c in FORECAST_FEATURE_COLS]
+
+
+def build_forecast(nodes: list[dict]) -> list[dict]:
+    """Predict +6h/+12h/+24h AQI for a list of latest-per-node readings in one batch."""
+    import numpy as np
+
+    predict = _load_forecaster()
+    predictions = {}
+    if predict is not None and nodes:
+        X = np.array([build_feature_row(node) for node in nodes])
+        predictions = predict(X)
 
     results = []
-    for node in nodes:
-        lat = node.get("lat") or 0.0
-        lon = node.get("lon") or 0.0
+    for i, node in enumerate(nodes):
         pm25 = node.get("pm25") or 0.0
-        no2 = node.get("no2") or 0.0
-        o3 = node.get("o3") or 0.0
-        wind_speed = node.get("wind_speed") or 0.0
-        wind_dir = node.get("wind_direction") or 0.0
-        temperature = node.get("temperature") or 0.0
-        humidity = node.get("humidity") or 0.0
-
-        # Derive engineered features from the single latest row
-        wd_rad = math.radians(wind_dir)
-        feature_row = {
-            "lat": lat, "lon": lon,
-            "pm25": pm25, "no2": no2, "o3": o3,
-            "temperature": temperature, "humidity": humidity, "wind_speed": wind_speed,
-            "wind_sin": math.sin(wd_rad), "wind_cos": math.cos(wd_rad),
-            # Lag features unavailable from a single row — use current pm25 as proxy
-            "pm25_lag1": pm25, "pm25_lag3": pm25, "pm25_lag6": pm25,
-            "pm25_roll3": pm25, "pm25_roll6": pm25,
-            "hour": 0, "day_of_week": 0,
-        }
-
-        X = np.array([[feature_row.get(c, 0.0) for c in FEATURE_COLS]])
-
         current_risk = node.get("risk_level") or classify_risk(pm25)
         out = {
             "node_id": node.get("node_id"),
-            "lat": lat,
-            "lon": lon,
+            "lat": node.get("lat") or 0.0,
+            "lon": node.get("lon") or 0.0,
             "aqi_now": round(pm25, 1),
             "risk_now": current_risk,
             "color_now": risk_color(current_risk),
         }
 
-        for h, model in models.items():
-            aqi_pred = float(max(0, model.predict(X)[0]))
+        for h, preds in predictions.items():
+            aqi_pred = float(max(0, preds[i]))
             risk = classify_risk(aqi_pred)
             out[f"aqi_{h}"] = round(aqi_pred, 1)
             out[f"risk_{h}"] = risk
             out[f"color_{h}"] = risk_color(risk)
 
         # If models aren't trained yet, fill with current values
-        for h in HORIZONS:
+        for h in FORECAST_HORIZONS:
             if f"aqi_{h}" not in out:
                 out[f"aqi_{h}"] = out["aqi_now"]
                 out[f"risk_{h}"] = current_risk
@@ -271,3 +438,15 @@ def get_forecast_for_all_nodes() -> list[dict]:
         results.append(out)
 
     return results
+
+
+def get_forecast_for_all_nodes() -> list[dict]:
+    """
+    Fetch the latest reading for every sensor node and return AQI predictions
+    for +6h, +12h, +24h alongside the current AQI risk level.
+
+    Returns a list of dicts ready to be serialised to JSON:
+      { node_id, lat, lon, aqi_now, risk_now, color_now,
+        aqi_6h, risk_6h, color_6h, aqi_12h, ... }
+    """
+    return build_forecast(get_latest_per_node())
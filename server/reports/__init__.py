@@ -0,0 +1 @@
+"""Reports package — aggregated pollution report views for the map."""
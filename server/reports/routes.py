@@ -0,0 +1,38 @@
+"""Blueprint routes for aggregated pollution report endpoints."""
+
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required
+
+from extensions import api_cost
+
+from maps.services import parse_viewport
+from .services import get_report_clusters
+
+reports_bp = Blueprint("reports", __name__, url_prefix="/api/reports")
+
+
+@reports_bp.route("/clusters", methods=["GET"])
+@api_cost(2)
+@jwt_required()
+def get_clusters():
+    """
+    GET /api/reports/clusters?bbox=<min_lon,min_lat,max_lon,max_lat>&zoom=<int>
+    Returns reports inside the viewport grouped into geohash cells sized for
+    the zoom level: count, centroid (lat/lon), cell bounds and a per-status
+    breakdown for each cell.
+    """
+    try:
+        bbox, zoom = parse_viewport(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if bbox is None or zoom is None:
+        return jsonify({"status": "error", "message": "bbox and zoom query parameters are required"}), 400
+
+    try:
+        result = get_report_clusters(bbox, zoom)
+        return jsonify({
+            "status": "success", "zoom": zoom, "precision": result["precision"],
+            "total": result["total"], "count": len(result["clusters"]), "data": result["clusters"],
+        }), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
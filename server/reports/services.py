@@ -0,0 +1,76 @@
+"""
+Map clustering for pollution_reports.
+
+Every report stores a precision-8 geohash in a generated ``geohash`` column
+(``COLLATE "C"``, indexed with lat/lon/status included). A geohash prefix is
+the report's cell at a coarser precision, so the cell keys for every zoom
+level are already in the column: clustering is one ``GROUP BY left(geohash, p)``
+over an index range scan of the viewport.
+
+These are reads and go to the read replica when one is configured.
+"""
+
+from db.db_setup import get_db_connection
+from maps.geohash import cell_bounds, precision_for_zoom, spatial_filter
+
+REPORT_PRECISION = 8
+
+
+def cluster_precision(zoom: int) -> int:
+    """Geohash length used to cluster at ``zoom``: one level finer than a viewport tile."""
+    return min(precision_for_zoom(zoom) + 1, REPORT_PRECISION)
+
+
+def get_report_clusters(bbox: tuple, zoom: int) -> dict:
+    """
+    Aggregate reports inside ``bbox`` into geohash cells sized for ``zoom``.
+    Each cluster has its report count, centroid and a per-status count.
+    """
+    precision = cluster_precision(zoom)
+    spatial, params = spatial_filter(bbox, zoom)
+
+    with get_db_connection(readonly=True) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                f"""
+                SELECT left(geohash, %s) AS cell, status, count(*), sum(lat), sum(lon)
+                FROM pollution_reports
+                WHERE geohash IS NOT NULL{spatial}
+                GROUP BY cell, status;
+                """,
+                [precision] + params,
+            )
+            rows = cur.fetchall()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+
+    # One row per (cell, status); fold the statuses into their cell
+    cells: dict[str, dict] = {}
+    for cell, status, count, lat_sum, lon_sum in rows:
+        entry = cells.setdefault(cell, {"count": 0, "lat_sum": 0.0, "lon_sum": 0.0, "statuses": {}})
+        entry["count"] += count
+        entry["lat_sum"] += lat_sum
+        entry["lon_sum"] += lon_sum
+        entry["statuses"][status] = count
+
+    clusters = []
+    for cell, entry in sorted(cells.items()):
+        min_lon, min_lat, max_lon, max_lat = cell_bounds(cell)
+        clusters.append({
+            "cell": cell,
+            "count": entry["count"],
+            "lat": entry["lat_sum"] / entry["count"],
+            "lon": entry["lon_sum"] / entry["count"],
+            "bounds": [min_lon, min_lat, max_lon, max_lat],
+            "statuses": entry["statuses"],
+        })
+
+    return {
+        "precision": precision,
+        "total": sum(c["count"] for c in clusters),
+        "clusters": clusters,
+    }
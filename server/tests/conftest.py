@@ -0,0 +1,28 @@
+import pytest
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    """A local S3-compatible stand-in (moto_server) in place of the Supabase endpoint."""
+    moto_server = pytest.importorskip("moto.server")
+    from db import s3
+
+    server = moto_server.ThreadedMotoServer(port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    monkeypatch.setattr(s3, "ENDPOINT", f"http://{host}:{port}")
+    monkeypatch.setattr(s3, "ACCESS_KEY", "testing")
+    monkeypatch.setattr(s3, "SECRET_KEY", "testing")
+    monkeypatch.setattr(s3, "REGION", "us-east-1")
+    monkeypatch.setattr(s3, "BUCKET", "reports-test")
+    monkeypatch.setattr(s3, "_client", None)
+    client = s3._get_s3_client()
+    client.create_bucket(Bucket="reports-test")
+    yield client
+    # moto keeps its state per process, not per server
+    for page in client.get_paginator("list_objects_v2").paginate(Bucket="reports-test"):
+        for obj in page.get("Contents", []):
+            client.delete_object(Bucket="reports-test", Key=obj["Key"])
+    client.delete_bucket(Bucket="reports-test")
+    monkeypatch.setattr(s3, "_client", None)
+    server.stop()
@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from alerts.engine import (
+    COOLDOWN_SECONDS,
+    DEFAULT_THRESHOLD,
+    ELEVATED_THRESHOLD,
+    PROFILE_COLUMNS,
+    SENSITIVE_THRESHOLD,
+    evaluate,
+    nearest_nodes,
+    profile_thresholds,
+    threshold_for_profile,
+)
+
+NOW = 1_800_000_000.0
+
+
+def _profiles(*rows):
+    return {c: np.array([row.get(c) for row in rows], dtype=object) for c in PROFILE_COLUMNS}
+
+
+def _subs(*rows):
+    """Subscription columns as evaluate() expects them; every row sits on a node."""
+    cols = _profiles(*[row.get("profile", {}) for row in rows])
+    cols["id"] = np.arange(1, len(rows) + 1, dtype=object)
+    cols["user_id"] = np.arange(101, 101 + len(rows), dtype=object)
+    cols["lat"] = np.array([row["lat"] for row in rows], dtype=float)
+    cols["lon"] = np.array([row["lon"] for row in rows], dtype=float)
+    cols["threshold"] = np.array([row.get("threshold", np.nan) for row in rows], dtype=float)
+    cols["alert_state"] = np.array([row.get("alert_state") for row in rows], dtype=object)
+    cols["alerted_at"] = np.array([row.get("alerted_at", 0.0) for row in rows], dtype=float)
+    return cols
+
+
+FORECAST = [
+    {"node_id": 1, "lat": 13.00, "lon": 80.20, "aqi_now": 40.0, "aqi_6h": 60.0, "aqi_12h": 55.0, "aqi_24h": 50.0},
+    {"node_id": 2, "lat": 13.10, "lon": 80.30, "aqi_now": 90.0, "aqi_6h": 120.0, "aqi_12h": 180.0, "aqi_24h": 160.0},
+]
+
+
+def test_profile_thresholds_by_condition():
+    thresholds = profile_thresholds(_profiles(
+        {},                                             # no health profile
+        {"has_asthma": True},
+        {"breathing_difficulty": "Often"},
+        {"has_allergies": True},
+        {"smoking_status": "Current"},
+        {"has_asthma": True, "has_allergies": True},    # sensitive wins over elevated
+        {"has_asthma": False, "smoking_status": "Never", "outdoor_exposure": "Low"},
+    ))
+    assert thresholds.tolist() == [
+        DEFAULT_THRESHOLD, SENSITIVE_THRESHOLD, SENSITIVE_THRESHOLD, ELEVATED_THRESHOLD,
+        ELEVATED_THRESHOLD, SENSITIVE_THRESHOLD, DEFAULT_THRESHOLD,
+    ]
+    assert threshold_for_profile(None) == DEFAULT_THRESHOLD
+    assert threshold_for_profile({"is_pregnant": True}) == SENSITIVE_THRESHOLD
+
+
+def test_nearest_nodes_matches_brute_force_across_chunks(monkeypatch):
+    rng = np.random.default_rng(0)
+    node_lat, node_lon = rng.uniform(12.8, 13.3, 50), rng.uniform(80.0, 80.4, 50)
+    sub_lat, sub_lon = rng.uniform(12.8, 13.3, 301), rng.uniform(80.0, 80.4, 301)
+    monkeypatch.setattr("alerts.engine._DISTANCE_CELLS", 1000)   # 20 subscriptions per chunk
+
+    index, km = nearest_nodes(sub_lat, sub_lon, node_lat, node_lon)
+
+    d_lat = sub_lat[:, None] - node_lat[None, :]
+    d_lon = (sub_lon[:, None] - node_lon[None, :]) * np.cos(np.radians(sub_lat[:, None]))
+    expected = np.hypot(d_lat, d_lon)
+    assert index.tolist() == expected.argmin(axis=1).tolist()
+    np.testing.assert_allclose(km, expected.min(axis=1) * 111.32)
+
+
+def test_nearest_nodes_distance_in_km():
+    index, km = nearest_nodes(np.array([0.0]), np.array([0.0]), np.array([1.0, 5.0]), np.array([0.0, 0.0]))
+    assert index.tolist() == [0]
+    assert km[0] == pytest.approx(111.32)
+
+
+def test_evaluate_notifies_on_first_crossing_with_worst_horizon():
+    result = evaluate(_subs(
+        {"lat": 13.10, "lon": 80.30},                                   # 180 at +12h >= 150
+        {"lat": 13.00, "lon": 80.20},                                   # peak 60 < 150
+        {"lat": 13.00, "lon": 80.20, "threshold": 50.0},                # explicit threshold
+        {"lat": 13.10, "lon": 80.30, "profile": {"has_copd": True}},    # 180 >= 100
+    ), FORECAST, NOW)
+
+    assert result["notify"].tolist() == [True, False, True, True]
+    assert result["node_index"].tolist() == [1, 0, 0, 1]
+    assert result["horizon"].tolist() == ["12h", "6h", "6h", "12h"]
+    assert result["peak"].tolist() == [180.0, 60.0, 60.0, 180.0]
+    assert result["threshold"].tolist() == [DEFAULT_THRESHOLD, DEFAULT_THRESHOLD, 50.0, SENSITIVE_THRESHOLD]
+    assert result["level"].tolist() == ["High", "Medium", "Medium", "High"]
+    assert not result["clear"].any()
+
+
+def test_evaluate_dedupes_until_level_change_or_cooldown():
+    result = evaluate(_subs(
+        {"lat": 13.10, "lon": 80.30, "alert_state": "High", "alerted_at": NOW - 60},                    # same level, recent
+        {"lat": 13.10, "lon": 80.30, "alert_state": "High", "alerted_at": NOW - COOLDOWN_SECONDS},      # cooldown elapsed
+        {"lat": 13.10, "lon": 80.30, "alert_state": "Medium", "alerted_at": NOW - 60},                  # level changed
+    ), FORECAST, NOW)
+
+    assert result["notify"].tolist() == [False, True, True]
+    assert not result["clear"].any()
+
+
+def test_evaluate_clears_below_threshold_and_ignores_far_nodes():
+    result = evaluate(_subs(
+        {"lat": 13.00, "lon": 80.20, "alert_state": "High", "alerted_at": NOW - 60},   # fell back below
+        {"lat": 14.10, "lon": 80.30},                                                  # ~110 km from any node
+        {"lat": 13.00, "lon": 80.20},                                                  # below, never alerted
+    ), FORECAST, NOW)
+
+    assert result["notify"].tolist() == [False, False, False]
+    assert result["clear"].tolist() == [True, False, False]
@@ -0,0 +1,159 @@
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from auth import blocklist
+from auth.blocklist import BloomFilter, RevocationCache
+
+NOW = datetime(2026, 5, 1, 12, tzinfo=timezone.utc)
+
+
+class FakeBlocklistTable:
+    """token_blocklist rows (jti, revoked_at, expires_at) behind the three queries the cache runs."""
+
+    def __init__(self):
+        self.rows: list[tuple[str, datetime, datetime | None]] = []
+        self.lookups = 0
+
+    def add(self, jti=None, revoked_at=NOW, expires_at=NOW + timedelta(days=1)):
+        jti = jti or uuid.uuid4().hex
+        self.rows.append((jti, revoked_at, expires_at))
+        return jti
+
+    @contextmanager
+    def connection(self):
+        yield _FakeConnection(self)
+
+
+class _FakeConnection:
+    def __init__(self, table):
+        self.table = table
+
+    def cursor(self):
+        return _FakeCursor(self.table)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class _FakeCursor:
+    def __init__(self, table):
+        self.table = table
+        self.result, self.rowcount = [], 0
+
+    def execute(self, sql, params=()):
+        live = [r for r in self.table.rows if r[2] is None or r[2] > NOW]
+        if sql == "token_is_revoked":
+            self.table.lookups += 1
+            self.result = [(1,)] if any(r[0] == params[0] for r in live) else []
+        elif sql.lstrip().startswith("DELETE"):
+            keep = [r for r in self.table.rows if r[2] is None or r[2] >= NOW]
+            self.rowcount = len(self.table.rows) - len(keep)
+            self.table.rows = keep
+        else:
+            since = params[0] if params else None
+            self.result = sorted(
+                ((jti, at) for jti, at, _ in live if since is None or at >= since), key=lambda r: r[1],
+            )
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return list(self.result)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = FakeBlocklistTable()
+    monkeypatch.setattr(blocklist, "get_db_connection", table.connection)
+    monkeypatch.setattr(blocklist, "execute_named", lambda cur, name, params: cur.execute(name, params))
+    return table
+
+
+def test_bloom_filter_has_no_false_negatives_and_a_bounded_error_rate():
+    bloom = BloomFilter(capacity=5000, error_rate=0.01)
+    members = [uuid.uuid4().hex for _ in range(5000)]
+    for key in members:
+        bloom.add(key)
+    assert all(key in bloom for key in members)
+    false_positives = sum(uuid.uuid4().hex in bloom for _ in range(20000))
+    assert false_positives / 20000 < 0.03
+
+
+def test_every_revoked_token_is_reported(table):
+    revoked = [table.add(revoked_at=NOW - timedelta(seconds=i)) for i in range(2000)]
+    cache = RevocationCache(lru_size=100, bloom_capacity=4000, bloom_error_rate=0.01)
+    cache.reload()
+
+    # Most confirmations come from the table (LRU of 100), but none may be missed
+    assert all(cache.is_revoked(jti) for jti in revoked)
+    assert not any(cache.is_revoked(uuid.uuid4().hex) for _ in range(500))
+    stats = cache.stats()
+    assert stats["bloom_negative"] + stats["false_positives"] == 500
+
+
+def test_refresh_rereads_the_overlap_window(table):
+    table.add(revoked_at=NOW)
+    cache = RevocationCache(bloom_capacity=100)
+    cache.reload()
+    assert cache.stats()["entries"] == 1
+
+    # Committed after the load but stamped before the watermark (out of order)
+    late = table.add(revoked_at=NOW - timedelta(seconds=10))
+    newer = table.add(revoked_at=NOW + timedelta(seconds=5))
+    cache.refresh()
+    cache.refresh()                                  # same rows again: counted once
+    assert cache.stats()["entries"] == 3
+    assert cache.stats()["watermark"] == (NOW + timedelta(seconds=5)).isoformat()
+
+    table.lookups = 0
+    assert cache.is_revoked(late) and cache.is_revoked(newer)
+    assert table.lookups == 0                        # answered from the LRU
+
+    # Older than the overlap window: a refresh cannot see it
+    missed = table.add(revoked_at=NOW - timedelta(minutes=5))
+    cache.refresh()
+    assert missed not in cache._bloom
+
+
+def test_revoke_is_visible_before_any_refresh(table):
+    cache = RevocationCache(bloom_capacity=100)
+    cache.reload()
+    jti = uuid.uuid4().hex
+    cache.revoke(jti)
+    assert cache.is_revoked(jti)
+    assert table.lookups == 0
+
+
+def test_full_filter_is_rebuilt_larger(table):
+    for _ in range(10):
+        table.add()
+    cache = RevocationCache(bloom_capacity=12)
+    cache.reload()
+    extra = [table.add(revoked_at=NOW + timedelta(seconds=1)) for _ in range(10)]
+    cache.refresh()
+    assert cache.stats()["bloom_capacity"] >= 40
+    assert all(jti in cache._bloom for jti in extra)
+
+
+def test_purge_deletes_expired_rows_and_sheds_them(table):
+    expired = [table.add(expires_at=NOW - timedelta(minutes=1)) for _ in range(5)]
+    live = table.add()
+    cache = RevocationCache(bloom_capacity=100)
+    cache.reload()
+    assert cache.stats()["entries"] == 1             # expired rows are never loaded
+
+    assert cache.purge() == 5
+    assert [r[0] for r in table.rows] == [live]
+    assert cache.stats()["purged"] == 5
+    assert cache.is_revoked(live)
+    assert not any(cache.is_revoked(jti) for jti in expired)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from ML.compiled_trees import CompiledForest, compile_models, validate
+
+xgboost = pytest.importorskip("xgboost")
+pytest.importorskip("sklearn")
+
+
+@pytest.fixture(scope="module")
+def fitted():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(2000, 8)).astype(np.float32)
+    X[rng.random(X.shape) < 0.05] = np.nan          # exercise default directions
+    signal = np.nan_to_num(X[:, 0]) * 30 + np.nan_to_num(X[:, 1]) ** 2 * 10
+    models = {}
+    for label, offset in (("6h", 90.0), ("12h", 110.0), ("24h", 140.0)):
+        model = xgboost.XGBRegressor(n_estimators=150, max_depth=6, learning_rate=0.05, n_jobs=1)
+        model.fit(X, offset + signal + rng.normal(scale=5, size=len(X)))
+        models[label] = model
+    return models, X
+
+
+def test_matches_xgboost_predict_within_1e_5(fitted):
+    models, X = fitted
+    forest = compile_models(models, [f"f{i}" for i in range(X.shape[1])])
+    assert validate(forest, models, X, tol=1e-5) <= 1e-5
+
+    preds = forest.predict(X)
+    for i, label in enumerate(forest.labels):
+        np.testing.assert_allclose(preds[:, i], models[label].predict(X), rtol=0, atol=1e-5)
+
+
+def test_single_row_and_round_trip(fitted, tmp_path):
+    models, X = fitted
+    forest = compile_models(models, [f"f{i}" for i in range(X.shape[1])])
+    path = tmp_path / "forest.npz"
+    forest.save(path)
+    loaded = CompiledForest.load(path)
+
+    np.testing.assert_array_equal(loaded.predict(X[0]), forest.predict(X[:1]))
+    assert list(loaded.predict_dict(X[:5])) == ["6h", "12h", "24h"]
+
+
+def test_validate_rejects_divergence(fitted):
+    models, X = fitted
+    forest = compile_models(models, [f"f{i}" for i in range(X.shape[1])])
+    forest.base_score = forest.base_score + np.float32(0.01)
+    with pytest.raises(ValueError, match="diverges"):
+        validate(forest, models, X)
@@ -0,0 +1,61 @@
+import io
+
+import pytest
+
+requests = pytest.importorskip("requests")
+pytest.importorskip("moto.server")
+
+from db import s3  # noqa: E402
+import user.services as services  # noqa: E402
+from db.s3 import UploadRejected  # noqa: E402
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    keys = []
+    monkeypatch.setattr(services, "schedule_deletion", lambda *k: keys.extend(k))
+    return keys
+
+
+def _upload(upload: dict, body: bytes) -> None:
+    files = {"file": ("evidence.png", io.BytesIO(body), upload["mime_type"])}
+    response = requests.post(upload["url"], data=upload["fields"], files=files, timeout=5)
+    assert response.status_code in (200, 201, 204), response.text
+
+
+def test_presign_upload_confirm(bucket):
+    upload = s3.presign_report_upload("image/png")
+    assert upload["method"] == "POST" and upload["object_key"].endswith(".png")
+    _upload(upload, PNG)
+
+    meta = s3.verify_uploaded_image(upload["object_key"], "image/png")
+    assert meta["image_size"] == len(PNG)
+    assert meta["image_key"] == upload["object_key"]
+
+
+def test_rejected_upload_is_queued_for_deletion(bucket, queued):
+    upload = s3.presign_report_upload("image/png")
+    _upload(upload, b"MZ" + b"\x00" * 64)          # declared PNG, not a PNG
+    token = services.issue_upload_token(7, upload["object_key"], "image/png")
+
+    with pytest.raises(UploadRejected, match="does not match"):
+        services.create_pollution_report(7, "smoke", 13.0, 80.2, upload_token=token)
+    assert queued == [upload["object_key"]]
+
+
+def test_missing_upload_is_not_queued(bucket, queued):
+    upload = s3.presign_report_upload("image/png")
+    token = services.issue_upload_token(7, upload["object_key"], "image/png")
+
+    with pytest.raises(UploadRejected) as exc:
+        services.create_pollution_report(7, "smoke", 13.0, 80.2, upload_token=token)
+    assert exc.value.status == 409
+    assert queued == []
+
+
+def test_unsupported_types_are_not_presigned(bucket):
+    for mime in ("image/heic", "image/avif", "image/svg+xml"):
+        with pytest.raises(UploadRejected):
+            s3.presign_report_upload(mime)
@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from maps.geohash import MAX_COVER_CELLS, cell_bounds, cover, encode, parse_bbox, spatial_filter
+
+
+def _random_bbox(rng: random.Random) -> tuple:
+    span = 10 ** rng.uniform(-4, 1.5)           # a few metres to tens of degrees
+    min_lon = rng.uniform(-180, 180 - span)
+    min_lat = rng.uniform(-90, 90 - span / 2)
+    return min_lon, min_lat, min_lon + span, min_lat + span / 2
+
+
+def test_encode_known_points():
+    assert encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    lon0, lat0, lon1, lat1 = cell_bounds("u4pruydqqvj")
+    assert lon0 <= 10.40744 <= lon1 and lat0 <= 57.64911 <= lat1
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_cover_contains_every_point_in_the_bbox(seed):
+    rng = random.Random(seed)
+    for _ in range(25):
+        bbox = _random_bbox(rng)
+        min_lon, min_lat, max_lon, max_lat = bbox
+        for zoom in (None, rng.randint(0, 18)):
+            cells = cover(bbox, zoom)
+            assert 0 < len(cells) <= MAX_COVER_CELLS or zoom is not None
+            corners = [(min_lat, min_lon), (max_lat, max_lon), (min_lat, max_lon), (max_lat, min_lon)]
+            points = corners + [
+                (rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon)) for _ in range(50)
+            ]
+            for lat, lon in points:
+                geohash = encode(lat, lon)
+                assert any(geohash.startswith(cell) for cell in cells), (bbox, zoom, lat, lon)
+
+
+def test_cover_is_capped_without_zoom():
+    assert len(cover((-10.0, -10.0, 10.0, 10.0))) <= MAX_COVER_CELLS
+    assert len(cover((80.2, 13.0, 80.2001, 13.0001))) <= MAX_COVER_CELLS
+
+
+def test_spatial_filter_ranges_match_the_cover():
+    bbox = (80.1, 12.9, 80.35, 13.2)
+    clause, params = spatial_filter(bbox, zoom=10)
+    cells = cover(bbox, 10)
+    assert clause.count("%s") == len(params)
+    assert params[:-4] == [bound for cell in cells for bound in (cell, cell + "~")]
+    assert params[-4:] == [80.1, 80.35, 12.9, 13.2]
+
+
+@pytest.mark.parametrize("value", ["1,2,3", "a,b,c,d", "10,0,5,1", "0,-91,1,1"])
+def test_parse_bbox_rejects_bad_input(value):
+    with pytest.raises(ValueError):
+        parse_bbox(value)
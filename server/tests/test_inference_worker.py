@@ -0,0 +1,56 @@
+import threading
+
+import numpy as np
+import pytest
+
+import maps.services as services
+from ML import inference_worker
+from ML.inference_worker import InferenceClient, InferenceServer
+
+FEATURES = ["a", "b", "c"]
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    def load_predictor():
+        return (lambda X: np.column_stack([X.sum(axis=1), X[:, 0]]), ["6h", "12h"], FEATURES)
+
+    monkeypatch.setattr(inference_worker, "load_predictor", load_predictor)
+    path = str(tmp_path / "infer.sock")
+    srv = InferenceServer(path, window_ms=1.0, max_rows=8)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield path
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_predicts_over_the_socket(server):
+    X = np.arange(6, dtype=np.float32).reshape(2, 3)
+    preds = InferenceClient(server).predict_dict(X)
+    assert preds["6h"].tolist() == [3.0, 12.0]
+    assert preds["12h"].tolist() == [0.0, 3.0]
+
+
+@pytest.mark.parametrize("shape", [(2, 4), (9, 3)])
+def test_refuses_wrong_width_or_too_many_rows(server, shape):
+    with pytest.raises(OSError):
+        InferenceClient(server, timeout=2.0).predict(np.zeros(shape, dtype=np.float32))
+
+    # The refused request never reached the batcher; the worker still serves
+    assert InferenceClient(server).predict(np.ones((1, 3), dtype=np.float32)).tolist() == [[3.0, 1.0]]
+
+
+def test_worker_outage_is_logged_once_and_backed_off(monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv("AQI_INFERENCE_SOCKET", str(tmp_path / "missing.sock"))
+    monkeypatch.setattr(services, "_forecaster", None)
+    monkeypatch.setattr(services, "_load_local_forecaster", lambda: (lambda X: {"6h": np.zeros(len(X))}))
+    connects = []
+    real_connect = InferenceClient._connect
+    monkeypatch.setattr(InferenceClient, "_connect", lambda self: connects.append(1) or real_connect(self))
+
+    predict = services._load_forecaster()
+    for _ in range(5):
+        assert predict(np.zeros((1, 3)))["6h"].tolist() == [0.0]
+
+    assert capsys.readouterr().out.count("Inference worker unavailable") == 1
+    assert len(connects) == 1       # later calls wait out the backoff instead of reconnecting
@@ -0,0 +1,56 @@
+import io
+
+import pytest
+
+from ingest.services import INGEST_COLUMNS, iter_csv, iter_ndjson, parse_batch, validate_reading
+
+VALID = {"node_id": 3, "timestamp": "2026-01-01T00:00:00", "lat": 13.0, "lon": 80.2, "pm25": 42.5}
+
+
+def _reading(**overrides):
+    return dict(zip(INGEST_COLUMNS, validate_reading({**VALID, **overrides})))
+
+
+def test_valid_reading_is_typed():
+    row = _reading(node_id="7", risk_score=2.0)
+    assert row["node_id"] == 7 and isinstance(row["node_id"], int)
+    assert row["risk_score"] == 2 and isinstance(row["risk_score"], int)
+    assert row["pm25"] == 42.5
+    assert row["timestamp"].tzinfo is not None
+
+
+@pytest.mark.parametrize("column, value", [
+    ("pm25", "nan"), ("pm25", float("inf")), ("temperature", "-inf"), ("lat", float("nan")),
+    ("node_id", 3.7), ("node_id", "3.5"), ("traffic_density", 12.25), ("risk_score", 0.5),
+])
+def test_non_finite_and_non_integral_values_are_rejected(column, value):
+    with pytest.raises(ValueError, match=f"invalid value for {column}"):
+        validate_reading({**VALID, column: value})
+
+
+def test_range_checks():
+    with pytest.raises(ValueError, match="non-negative"):
+        validate_reading({**VALID, "pm25": -1})
+    with pytest.raises(ValueError, match="out of range"):
+        validate_reading({**VALID, "lat": 91})
+    with pytest.raises(ValueError, match="missing required"):
+        validate_reading({"node_id": 1})
+
+
+def test_batch_reports_bad_rows_by_line():
+    body = b'{"node_id": 1, "timestamp": "2026-01-01T00:00:00", "lat": 13, "lon": 80}\n' \
+           b'{"node_id": 1.5, "timestamp": "2026-01-01T00:00:00", "lat": 13, "lon": 80}\n' \
+           b'not json\n'
+    rows, errors, rejected = parse_batch(iter_ndjson(io.BytesIO(body)), max_rows=10)
+    assert len(rows) == 1 and rejected == 2
+    assert [e["line"] for e in errors] == [2, 3]
+    assert "node_id" in errors[0]["error"]
+
+
+def test_csv_batch_and_row_cap():
+    body = b"node_id,timestamp,lat,lon,pm25\n" + b"1,2026-01-01T00:00:00,13,80,NaN\n" + b"2,2026-01-01T00:00:00,13,80,5\n" * 3
+    rows, errors, rejected = parse_batch(iter_csv(io.BytesIO(body)), max_rows=10)
+    assert (len(rows), rejected) == (3, 1)
+
+    with pytest.raises(ValueError, match="exceeds 2 rows"):
+        parse_batch(iter_csv(io.BytesIO(body)), max_rows=2)
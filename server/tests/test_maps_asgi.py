@@ -0,0 +1,82 @@
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+jwt = pytest.importorskip("jwt")
+pytest.importorskip("asyncpg")
+testclient = pytest.importorskip("starlette.testclient")
+
+from maps import asgi, rollups  # noqa: E402
+
+SECRET = "asgi-test-secret-at-least-32-bytes-long"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(asgi.AppConfig, "JWT_SECRET_KEY", SECRET)
+    monkeypatch.setattr(asgi.revocations, "is_revoked", lambda jti: False)
+    token = jwt.encode({"type": "access", "jti": str(uuid.uuid4()), "sub": "1"}, SECRET, algorithm="HS256")
+    # Not entered as a context manager, so the lifespan (database pools) never runs
+    return testclient.TestClient(asgi.app, headers={"Authorization": f"Bearer {token}"})
+
+
+@pytest.mark.parametrize("resolution", ["hour", "day"])
+def test_rollup_buckets_match_the_flask_query(client, monkeypatch, resolution):
+    calls = []
+
+    async def fetch(sql, *args):
+        calls.append((sql, list(args)))
+        return [{"node_id": 5, "bucket": datetime(2026, 1, 1, tzinfo=timezone.utc)}]
+
+    monkeypatch.setattr(asgi, "_fetch", fetch)
+    response = client.get(
+        "/api/maps/air-quality/node/5",
+        params={"resolution": resolution, "start": "2026-01-01T03:30:00", "end": "2026-01-02T05:10:00"},
+    )
+    assert response.status_code == 200
+
+    since = datetime(2026, 1, 1, 3, 30, tzinfo=timezone.utc)
+    until = datetime(2026, 1, 2, 5, 10, tzinfo=timezone.utc)
+    sql, params = rollups.node_rollup_query(5, resolution, since, until)
+    assert calls == [(asgi._numbered(sql), params)]
+    assert params[-1] == rollups._bucket_end(until, resolution)       # rounded up, not the raw end
+
+
+def test_numbered_placeholders():
+    assert asgi._numbered("a = %s AND b < %s", 3) == "a = $3 AND b < $4"
+    assert asgi._numbered("no params") == "no params"
+
+
+class _Limits:
+    RATELIMIT_API_BUDGET = "20 per minute"
+    RATELIMIT_STRATEGY = "sliding-window-counter"
+    RATELIMIT_STORAGE_URI = "memory://"
+    RATELIMIT_IN_MEMORY_FALLBACK_ENABLED = True
+    RATELIMIT_KEY_PREFIX = "airsense"
+
+
+def test_history_spends_the_api_budget_like_the_blueprint(client, monkeypatch):
+    async def fetch(sql, *args):
+        return [{"id": 1}]
+
+    monkeypatch.setattr(asgi, "_fetch", fetch)
+    monkeypatch.setattr(asgi, "_budget", asgi.ApiBudget(_Limits))
+
+    # Unbounded history costs 10 of the 20 units; a bounded one would cost 3
+    first, second, third = (client.get("/api/maps/air-quality") for _ in range(3))
+    assert (first.status_code, second.status_code, third.status_code) == (200, 200, 429)
+    assert first.headers["X-RateLimit-Remaining"] == "10"
+    assert third.json() == {"error": "Rate limit exceeded", "limit": "20 per 1 minute"}
+    assert int(third.headers["Retry-After"]) >= 0
+
+
+def test_budget_falls_back_to_memory_when_the_store_is_down(monkeypatch):
+    budget = asgi.ApiBudget(_Limits)
+
+    def unavailable(*args, **kwargs):
+        raise ConnectionError("store down")
+
+    monkeypatch.setattr(budget._limiter, "hit", unavailable)
+    assert budget.hit("10.0.0.1", 15)[:2] == (True, 5)
+    assert budget.hit("10.0.0.1", 15)[0] is False
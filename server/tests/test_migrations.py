@@ -0,0 +1,126 @@
+from contextlib import contextmanager
+
+import pytest
+
+from db import migrations, partitions
+from db.migrations import LATEST_VERSION, MIGRATIONS
+
+
+class FakeDatabase:
+    """schema_version rows with transactional inserts, plus a log of every statement."""
+
+    def __init__(self, applied=()):
+        self.versions = set(applied)
+        self.staged: list[int] = []
+        self.log: list[str] = []
+
+    @contextmanager
+    def connection(self):
+        yield self
+
+    def cursor(self):
+        return self
+
+    def close(self):
+        pass
+
+    def commit(self):
+        self.versions.update(self.staged)
+        self.staged = []
+
+    def rollback(self):
+        self.staged = []
+        self.log.append("ROLLBACK")
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        self.log.append(sql)
+        if sql.startswith("INSERT INTO schema_version"):
+            self.staged.append(params[0])
+        elif sql.startswith("SELECT max(version)"):
+            self.result = [(max(self.versions, default=None),)]
+        elif sql.startswith("SELECT version FROM schema_version"):
+            self.result = [(v,) for v in self.versions]
+        else:
+            self.result = []
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(migrations, "get_db_connection", database.connection)
+    monkeypatch.setattr(partitions, "is_partitioned", lambda cur: False)
+    return database
+
+
+def _recording(log, version):
+    def apply(cur):
+        log.append(version)
+    return apply
+
+
+def test_versions_are_contiguous_and_names_unique():
+    versions = [version for version, _, _ in MIGRATIONS]
+    assert versions == list(range(1, len(MIGRATIONS) + 1))
+    assert LATEST_VERSION == versions[-1]
+    assert len({name for _, name, _ in MIGRATIONS}) == len(MIGRATIONS)
+
+
+def test_migrate_applies_pending_versions_in_order(db, monkeypatch):
+    ran = []
+    monkeypatch.setattr(migrations, "MIGRATIONS", [(v, f"step {v}", _recording(ran, v)) for v in (1, 2, 3, 4)])
+    monkeypatch.setattr(migrations, "LATEST_VERSION", 4)
+    db.versions = {2}
+
+    assert migrations.migrate(target=3) == [1, 3]
+    assert ran == [1, 3] and db.versions == {1, 2, 3}
+    assert migrations.migrate() == [4]
+    assert migrations.migrate() == []
+
+
+def test_each_step_runs_under_the_lock_and_rechecks(db, monkeypatch):
+    monkeypatch.setattr(migrations, "MIGRATIONS", [(1, "one", _recording([], 1))])
+    migrations.migrate()
+    lock = db.log.index("SELECT pg_advisory_xact_lock(%s);")
+    assert db.log[lock + 1] == "SELECT version FROM schema_version;"
+    assert db.log[lock + 2].startswith("INSERT INTO schema_version")
+
+
+def test_failed_migration_is_rolled_back_and_stops_the_run(db, monkeypatch):
+    ran = []
+
+    def broken(cur):
+        raise RuntimeError("bad DDL")
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [
+        (1, "one", _recording(ran, 1)), (2, "two", broken), (3, "three", _recording(ran, 3)),
+    ])
+    with pytest.raises(RuntimeError, match="bad DDL"):
+        migrations.migrate()
+    assert ran == [1] and db.versions == {1}
+
+
+def test_shipped_migrations_run_in_dependency_order(db):
+    assert migrations.migrate() == list(range(1, LATEST_VERSION + 1))
+    log = db.log
+
+    def first(fragment):
+        return next(i for i, sql in enumerate(log) if fragment in sql)
+
+    assert first("CREATE TABLE IF NOT EXISTS pollution_reports") < first("ADD COLUMN IF NOT EXISTS display_key")
+    assert first("FUNCTION geohash_encode") < first("ALTER TABLE air_quality_data ADD COLUMN IF NOT EXISTS geohash")
+    assert first("SET created_at = 'epoch'") < first("ALTER COLUMN created_at SET NOT NULL")
+
+
+def test_schema_check_reports_pending_versions(db):
+    db.versions = {1, 2}
+    status = migrations.check_schema_version()
+    assert status == {"current": 2, "expected": LATEST_VERSION, "up_to_date": False}
+    db.versions = set(range(1, LATEST_VERSION + 1))
+    assert migrations.check_schema_version()["up_to_date"]
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+import maps.services as services
+from ML import aqi_forecast, compiled_trees
+
+xgboost = pytest.importorskip("xgboost")
+pytest.importorskip("sklearn")
+
+
+@pytest.fixture
+def trained(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 4)).astype(np.float32)
+    models = {}
+    for label in aqi_forecast.HORIZONS:
+        model = xgboost.XGBRegressor(n_estimators=20, max_depth=3, n_jobs=1)
+        model.fit(X, X[:, 0] * 10 + rng.normal(size=len(X)))
+        models[label] = model
+
+    prefix = str(tmp_path / "aqi_model")
+    monkeypatch.setattr(aqi_forecast, "DEFAULT_PREFIX", prefix)
+    monkeypatch.setattr(compiled_trees, "DEFAULT_FOREST_PATH", tmp_path / "missing.npz")
+    monkeypatch.setattr(services, "_local_forecaster", None)
+    return models, X, prefix
+
+
+def test_serving_loads_native_boosters_from_the_manifest(trained):
+    models, X, prefix = trained
+    aqi_forecast.save_models(models, prefix, fmt="ubj", feature_cols=["a", "b", "c", "d"])
+
+    preds = services._load_local_forecaster()(X)
+    for label, model in models.items():
+        np.testing.assert_array_equal(preds[label], model.predict(X))
+
+
+def test_corrupt_booster_is_refused(trained):
+    models, X, prefix = trained
+    aqi_forecast.save_models(models, prefix, fmt="ubj", feature_cols=["a", "b", "c", "d"])
+    with open(f"{prefix}_6h.ubj", "ab") as f:
+        f.write(b"\0")
+
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        services._load_local_forecaster()
+
+
+def test_nothing_trained_serves_no_forecast(trained):
+    assert services._load_local_forecaster() is None
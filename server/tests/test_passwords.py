@@ -0,0 +1,51 @@
+import os
+import signal
+import time
+
+import pytest
+
+from auth import passwords
+from auth.passwords import PasswordHasher, PasswordPoolBusy, hash_cost
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(rounds=4, workers=1, queue_size=2)
+    yield hasher
+    hasher.stop()
+
+
+def test_hash_and_verify_round_trip(hasher):
+    pw_hash = hasher.hash("correct horse")
+    assert hash_cost(pw_hash) == 4
+    assert hasher.verify(pw_hash, "correct horse") == (True, None)
+    assert hasher.verify(pw_hash, "wrong horse") == (False, None)
+    assert hasher.verify("not-a-bcrypt-hash", "correct horse") == (False, None)
+
+
+def test_hash_at_another_cost_is_upgraded_on_login(hasher):
+    old = passwords._hash("correct horse", 5)
+    ok, new_hash = hasher.verify(old, "correct horse")
+    assert ok and hash_cost(new_hash) == 4
+    assert hasher.verify(new_hash, "correct horse") == (True, None)
+    assert hasher.verify(old, "wrong horse") == (False, None)
+    assert hasher.stats()["rehashes"] == 1
+
+
+def test_full_queue_is_refused(hasher, monkeypatch):
+    monkeypatch.setattr(passwords, "QUEUE_TIMEOUT_SECONDS", 0.01)
+    for _ in range(hasher.queue_size):
+        hasher._slots.acquire()
+    with pytest.raises(PasswordPoolBusy):
+        hasher.hash("correct horse")
+    assert hasher.stats()["rejected"] == 1
+
+
+def test_pool_recovers_from_a_killed_process(hasher):
+    pw_hash = hasher.hash("correct horse")
+    for process in list(hasher._pool._processes.values()):
+        os.kill(process.pid, signal.SIGKILL)
+    time.sleep(0.5)
+
+    assert hasher.verify(pw_hash, "correct horse") == (True, None)
+    assert hasher.stats()["pool_restarts"] == 1
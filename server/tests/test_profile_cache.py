@@ -0,0 +1,88 @@
+import pytest
+
+from user.cache import ProfileCache
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def workers():
+    """Two workers' caches over one shared Redis."""
+    server = fakeredis.FakeServer()
+    return (
+        ProfileCache("profile", shared=fakeredis.FakeRedis(server=server)),
+        ProfileCache("profile", shared=fakeredis.FakeRedis(server=server)),
+    )
+
+
+def _loader(value, calls):
+    def load():
+        calls.append(value)
+        return dict(value)
+    return load
+
+
+def test_a_load_is_published_to_other_workers(workers):
+    a, b = workers
+    calls = []
+    assert a.get(7, _loader({"age": 30}, calls)) == {"age": 30}
+    assert b.get(7, _loader({"age": 99}, calls)) == {"age": 30}
+    assert len(calls) == 1
+    assert b.stats()["shared_hits"] == 1
+
+
+def test_a_load_racing_a_local_invalidate_is_not_kept(workers):
+    a, b = workers
+    calls = []
+
+    def stale_load():
+        calls.append("stale")
+        a.invalidate(7)                  # the profile is updated while we read it
+        return {"age": 30}
+
+    assert a.get(7, stale_load) == {"age": 30}
+    assert a.shared.get(a._shared_key(7)) is None
+    assert a.get(7, _loader({"age": 31}, calls)) == {"age": 31}
+    assert b.get(7, _loader({"age": 0}, calls)) == {"age": 31}
+    assert calls == ["stale", {"age": 31}]
+
+
+def test_a_load_racing_another_workers_invalidate_is_not_published(workers):
+    a, b = workers
+
+    def stale_load():
+        b.invalidate(7)
+        return {"age": 30}
+
+    a.get(7, stale_load)
+    assert a.shared.get(a._shared_key(7)) is None
+    assert b.get(7, lambda: {"age": 31}) == {"age": 31}
+
+
+def test_invalidate_reaches_other_workers_through_the_shared_layer(workers):
+    a, b = workers
+    a.get(7, lambda: {"age": 30})
+    b.invalidate(7)
+    b.get(7, lambda: {"age": 31})
+    # a's local copy lives at most local_ttl, then the fresh shared copy is read
+    assert a.local_ttl < a.ttl
+    a._entries[7] = (0.0, a._entries[7][1])
+    assert a.get(7, lambda: {"age": 0}) == {"age": 31}
+
+
+def test_callers_get_copies(workers):
+    a, _ = workers
+    first = a.get(7, lambda: {"age": 30})
+    first["age"] = "mutated"
+    assert a.get(7, lambda: {"age": 0}) == {"age": 30}
+
+
+def test_local_only_cache_evicts_oldest():
+    cache = ProfileCache("profile", max_entries=2)
+    for key in (1, 2, 3):
+        cache.get(key, lambda: {"key": key})
+    calls = []
+    assert cache.get(1, _loader({"key": 1}, calls)) == {"key": 1}
+    assert len(calls) == 1
+    cache.get(3, _loader({"key": 0}, calls))
+    assert len(calls) == 1
@@ -0,0 +1,66 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import user.services as services
+from user.services import decode_cursor, encode_cursor
+
+T0 = datetime(2026, 4, 1, 9, tzinfo=timezone.utc)
+
+
+class FakeReportsTable:
+    """pollution_reports rows, answering get_all_reports' keyset query in memory."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @contextmanager
+    def connection(self):
+        yield self
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params):
+        *after, limit = params
+        rows = sorted(self.rows, key=lambda r: (r[-1], r[0]), reverse=True)
+        if after:
+            rows = [r for r in rows if (r[-1], r[0]) < tuple(after)]
+        self.result = rows[:limit]
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+def _row(report_id, created_at):
+    return (report_id, 1, "smoke", 13.0, 80.2, None, None, None, None, None, None, "pending", created_at)
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor({"created_at": T0, "id": 42})
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (T0, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "e30", encode_cursor({"created_at": T0, "id": 1})[:-3]])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+def test_pages_neither_skip_nor_repeat_rows_with_tied_timestamps(monkeypatch):
+    # Five reports share each timestamp, so pages must break ties on id
+    rows = [_row(i, T0 + timedelta(minutes=i // 5)) for i in range(1, 24)]
+    monkeypatch.setattr(services, "get_db_connection", FakeReportsTable(rows).connection)
+
+    seen, cursor = [], None
+    while True:
+        reports, cursor = services.get_all_reports(limit=4, cursor=cursor)
+        seen += [r["id"] for r in reports]
+        if cursor is None:
+            break
+    assert seen == sorted(range(1, 24), key=lambda i: (i // 5, i), reverse=True)
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from maps import rollups
+from maps.rollups import _bucket_end, bucket_start, node_rollup_query, refresh_for_batch
+
+UTC = timezone.utc
+IST = timezone(timedelta(hours=5, minutes=30))
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, sql, params=None):
+        self.calls.append((" ".join(sql.split()), params))
+
+
+def test_bucket_start_floors_in_utc():
+    ts = datetime(2026, 3, 4, 10, 45, 12, 5, tzinfo=IST)          # 05:15:12 UTC
+    assert bucket_start(ts, "hour") == datetime(2026, 3, 4, 5, tzinfo=UTC)
+    assert bucket_start(ts, "day") == datetime(2026, 3, 4, tzinfo=UTC)
+
+
+@pytest.mark.parametrize("resolution, ts, expected", [
+    ("hour", datetime(2026, 3, 4, 5, 0, tzinfo=UTC), datetime(2026, 3, 4, 5, tzinfo=UTC)),       # on a boundary
+    ("hour", datetime(2026, 3, 4, 5, 0, 1, tzinfo=UTC), datetime(2026, 3, 4, 6, tzinfo=UTC)),
+    ("day", datetime(2026, 3, 4, tzinfo=UTC), datetime(2026, 3, 4, tzinfo=UTC)),
+    ("day", datetime(2026, 3, 4, 23, 59, tzinfo=UTC), datetime(2026, 3, 5, tzinfo=UTC)),
+    ("day", datetime(2026, 12, 31, 1, tzinfo=UTC), datetime(2027, 1, 1, tzinfo=UTC)),
+])
+def test_bucket_end_rounds_up_to_a_boundary(resolution, ts, expected):
+    assert _bucket_end(ts, resolution) == expected
+
+
+def test_node_query_includes_every_bucket_overlapping_the_range():
+    since = datetime(2026, 3, 4, 5, 30, tzinfo=UTC)
+    until = datetime(2026, 3, 4, 7, 10, tzinfo=UTC)
+    sql, params = node_rollup_query(9, "hour", since, until)
+    assert "FROM air_quality_hourly" in sql and "ORDER BY bucket DESC" in sql
+    # 05:00 holds readings after 05:30 and 07:00 holds readings before 07:10
+    assert params == [9, datetime(2026, 3, 4, 5, tzinfo=UTC), datetime(2026, 3, 4, 8, tzinfo=UTC)]
+
+    sql, params = node_rollup_query(9, "day")
+    assert params == [9] and "bucket >=" not in sql
+
+
+def test_batch_refresh_locks_node_slots_in_order_then_recomputes():
+    cur = RecordingCursor()
+    ts = datetime(2026, 3, 4, 5, 20, tzinfo=UTC)
+    rows = [(70, ts), (3, ts + timedelta(hours=2)), (6, ts), (134, ts)]     # 70 and 134 share slot 6
+    refresh_for_batch(cur, rows)
+
+    locks = [params for sql, params in cur.calls if "advisory" in sql]
+    assert locks[0] == (rollups._ADVISORY_LOCK_ID, rollups._ALL_NODES)
+    assert "lock_shared" in cur.calls[0][0]
+    assert [slot for _, slot in locks[1:]] == [3, 6]
+
+    refreshes = [params for sql, params in cur.calls if sql.startswith("INSERT")]
+    assert [p["nodes"] for p in refreshes] == [[3, 6, 70, 134]] * 2
+    hourly, daily = refreshes
+    assert (hourly["start"], hourly["end"]) == (datetime(2026, 3, 4, 5, tzinfo=UTC), datetime(2026, 3, 4, 8, tzinfo=UTC))
+    assert (daily["start"], daily["end"]) == (datetime(2026, 3, 4, tzinfo=UTC), datetime(2026, 3, 5, tzinfo=UTC))
+
+
+def test_full_refresh_takes_the_exclusive_lock():
+    cur = RecordingCursor()
+    rollups.refresh_rollups(cur, datetime(2026, 3, 4, tzinfo=UTC), datetime(2026, 3, 4, 1, tzinfo=UTC))
+    sql, params = cur.calls[0]
+    assert "pg_advisory_xact_lock(" in sql and params == (rollups._ADVISORY_LOCK_ID, rollups._ALL_NODES)
+    assert sum("advisory" in sql for sql, _ in cur.calls) == 1
@@ -0,0 +1,101 @@
+from contextlib import contextmanager
+
+import pytest
+
+from db import s3, s3_outbox
+from db.s3_outbox import DeletionWorker, enqueue_deletions
+
+
+class FakeOutbox:
+    """s3_deletion_outbox rows, answering the outbox's statements in memory."""
+
+    def __init__(self):
+        self.rows: dict[int, dict] = {}
+        self._next_id = 1
+
+    @contextmanager
+    def connection(self):
+        yield self
+
+    def cursor(self):
+        return self
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+    def execute(self, sql, params):
+        sql = " ".join(sql.split())
+        if sql.startswith("INSERT"):
+            for key in params[0]:
+                self.rows[self._next_id] = {"key": key, "attempts": 0, "due": True, "last_error": None}
+                self._next_id += 1
+        elif sql.startswith("SELECT"):
+            due = [(i, r["key"], r["attempts"]) for i, r in self.rows.items() if r["due"]]
+            self.result = due[:params[0]]
+        elif sql.startswith("DELETE"):
+            for row_id in params[0]:
+                del self.rows[row_id]
+        elif sql.startswith("UPDATE"):
+            backoff, error, row_id = params
+            row = self.rows[row_id]
+            row.update(attempts=row["attempts"] + 1, due=False, last_error=error, backoff=backoff)
+
+    def fetchall(self):
+        return self.result
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    table = FakeOutbox()
+    monkeypatch.setattr(s3_outbox, "get_db_connection", table.connection)
+    return table
+
+
+def _put(client, *keys):
+    for key in keys:
+        client.put_object(Bucket=s3.BUCKET, Key=key, Body=b"x")
+
+
+def _stored(client):
+    return {obj["Key"] for obj in client.list_objects_v2(Bucket=s3.BUCKET).get("Contents", [])}
+
+
+def test_enqueue_skips_missing_keys(outbox):
+    enqueue_deletions(outbox, ["reports/a.jpg", None, "", "derived/a.webp"])
+    enqueue_deletions(outbox, [None])
+    assert [r["key"] for r in outbox.rows.values()] == ["reports/a.jpg", "derived/a.webp"]
+
+
+def test_drain_deletes_queued_objects_in_batches(bucket, outbox):
+    keys = [f"reports/{i}.jpg" for i in range(5)]
+    _put(bucket, *keys, "reports/kept.jpg")
+    enqueue_deletions(outbox, keys + ["reports/0.jpg", "reports/never-uploaded.jpg"])
+
+    worker = DeletionWorker(batch_size=2)
+    assert worker.drain() == 7
+    assert outbox.rows == {}
+    assert _stored(bucket) == {"reports/kept.jpg"}
+    assert worker.stats()["deleted"] == 7
+
+
+def test_failed_deletes_stay_queued_with_backoff(outbox, monkeypatch):
+    def unavailable():
+        raise RuntimeError("storage unavailable")
+
+    monkeypatch.setattr(s3, "_get_s3_client", unavailable)
+    enqueue_deletions(outbox, ["reports/a.jpg", "reports/b.jpg"])
+    outbox.rows[2]["attempts"] = 3
+
+    worker = DeletionWorker()
+    assert worker.drain_once() == (0, 2)
+    assert [r["attempts"] for r in outbox.rows.values()] == [1, 4]
+    assert [r["backoff"] for r in outbox.rows.values()] == [10, 80]
+    assert all(r["last_error"] == "storage unavailable" for r in outbox.rows.values())
+    # Not due again until the backoff passes
+    assert worker.drain() == 0 and worker.stats()["failed_attempts"] == 2
@@ -0,0 +1,80 @@
+import pytest
+
+from db import s3
+from db.s3 import StreamingImageUpload, UploadRejected, sniff_image_type
+
+JPEG = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01" + b"\x00" * 500
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 500
+
+
+@pytest.mark.parametrize("head, expected", [
+    (JPEG, "image/jpeg"),
+    (PNG, "image/png"),
+    (b"GIF87a\x01\x00\x01\x00\x00\x00", "image/gif"),
+    (b"GIF89a\x01\x00\x01\x00\x00\x00", "image/gif"),
+    (b"RIFF\x24\x00\x00\x00WEBPVP8 ", "image/webp"),
+    (b"\x00\x00\x00\x18ftypheic", None),
+    (b"\x00\x00\x00\x1cftypavif", None),
+    (b'<svg xmlns="http://www.w3.org/2000/svg">', None),
+    (b"RIFF\x24\x00\x00\x00WAVEfmt ", None),
+    (b"", None),
+])
+def test_sniff_image_type(head, expected):
+    assert sniff_image_type(head) == expected
+
+
+def _stream(upload: StreamingImageUpload, body: bytes, chunk: int = 7) -> None:
+    for i in range(0, len(body), chunk):
+        upload.write(body[i:i + chunk])
+
+
+def test_upload_is_sniffed_and_stored_privately(bucket):
+    upload = StreamingImageUpload("photo.bin", "image/png")      # declared type is not trusted
+    _stream(upload, JPEG)
+    meta = upload.finish()
+
+    assert meta["mime_type"] == "image/jpeg" and meta["image_key"].endswith(".jpg")
+    assert meta["image_size"] == len(JPEG)
+    obj = bucket.get_object(Bucket=s3.BUCKET, Key=meta["image_key"])
+    assert obj["Body"].read() == JPEG and obj["ContentType"] == "image/jpeg"
+    grants = bucket.get_object_acl(Bucket=s3.BUCKET, Key=meta["image_key"])["Grants"]
+    assert not any("AllUsers" in g["Grantee"].get("URI", "") for g in grants)
+
+
+def test_non_image_is_rejected_on_the_first_chunk():
+    upload = StreamingImageUpload("a.svg", "image/svg+xml")
+    with pytest.raises(UploadRejected, match="not a supported image"):
+        upload.write(b'<svg xmlns="http://www.w3.org/2000/svg"></svg>')
+    assert upload.object_key is None
+
+    with pytest.raises(UploadRejected, match="Only image"):
+        StreamingImageUpload("a.exe", "application/octet-stream").write(b"MZ" + b"\x00" * 20)
+
+
+def test_oversized_upload_is_rejected_before_storage():
+    upload = StreamingImageUpload("big.png", "image/png", max_size=100)
+    with pytest.raises(UploadRejected, match="exceeds"):
+        _stream(upload, PNG, chunk=64)
+    assert upload.size == 64
+
+
+def test_image_shorter_than_the_sniff_window(bucket):
+    upload = StreamingImageUpload("tiny.gif", "image/gif")
+    upload.write(b"GIF89a\x01\x00")
+    assert upload.finish()["mime_type"] == "image/gif"
+
+    with pytest.raises(UploadRejected, match="empty"):
+        StreamingImageUpload("none.png", "image/png").finish()
+
+
+def test_large_upload_goes_up_in_parts(bucket, monkeypatch):
+    monkeypatch.setattr(s3, "PART_SIZE", 5 * 1024 * 1024)
+    body = PNG + bytes(range(256)) * (11 * 1024 * 1024 // 256)
+    upload = StreamingImageUpload("big.png", "image/png", max_size=len(body))
+    _stream(upload, body, chunk=3 * 1024 * 1024)
+    assert len(upload._parts) == 2                  # full parts leave during the request
+    meta = upload.finish()
+
+    obj = bucket.get_object(Bucket=s3.BUCKET, Key=meta["image_key"])
+    assert obj["ContentLength"] == len(body)
+    assert obj["Body"].read() == body
@@ -1,8 +1,10 @@
 from flask import Blueprint, jsonify, request
+from extensions import api_cost
 from .services import analyze_safe_route
 from . import trips_bp
 
 @trips_bp.route("/plan-safe-route", methods=["POST"])
+@api_cost(20)   # OSRM routing plus a forecast per segment
 def plan_safe_route():
     try:
         data = request.json
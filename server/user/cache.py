@@ -0,0 +1,189 @@
+"""
+Read-through cache for user and health-profile records.
+
+``/api/user/me`` and the health-profile endpoints read the same row on every
+request. Each worker keeps recently read records in memory for
+PROFILE_CACHE_TTL_SECONDS; ``update_user`` / ``upsert_health_profile``
+invalidate the entry after committing. Absent rows (no health profile yet)
+are cached too.
+
+Set PROFILE_CACHE_URL=redis://... to share entries between workers (needs
+the ``cache`` extra). Invalidation then deletes the shared entry and bumps a
+shared version, and the per-process layer keeps entries for at most
+PROFILE_CACHE_LOCAL_TTL_SECONDS, which bounds how long another worker can
+serve a record older than an update. A load that overlapped an invalidation
+(in this worker or any other) is returned to its caller but not published.
+"""
+
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", 60))
+LOCAL_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_LOCAL_TTL_SECONDS", 5))
+MAX_ENTRIES = int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", 10000))
+SHARED_URL = os.getenv("PROFILE_CACHE_URL", "")
+
+_MISSING = object()
+
+
+def _shared_backend(url: str):
+    if not url:
+        return None
+    try:
+        import redis
+    except ImportError as exc:
+        raise RuntimeError("PROFILE_CACHE_URL needs the redis package (install the 'cache' extra).") from exc
+    return redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+
+
+class ProfileCache:
+    def __init__(
+        self,
+        namespace: str,
+        ttl: float = TTL_SECONDS,
+        max_entries: int = MAX_ENTRIES,
+        shared=None,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.shared = shared
+        # With a shared layer, other workers' invalidations only reach us through it
+        self.local_ttl = min(ttl, LOCAL_TTL_SECONDS) if shared is not None else ttl
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[object, tuple[float, object]] = OrderedDict()
+        # Bumped by invalidate(); a load that started before the bump must not be stored
+        self._generations: dict[object, int] = {}
+        self._metrics = {"hits": 0, "shared_hits": 0, "misses": 0, "invalidations": 0, "shared_errors": 0}
+
+    def _shared_key(self, key) -> str:
+        return f"airsense:{self.namespace}:{key}"
+
+    def _version_key(self, key) -> str:
+        return f"airsense:{self.namespace}:{key}:version"
+
+    @staticmethod
+    def _copy(value):
+        # Callers mutate what they get back (e.g. isoformat timestamps); never hand out the cached dict
+        return dict(value) if isinstance(value, dict) else value
+
+    def _store_local(self, key, value) -> None:
+        self._entries[key] = (time.monotonic() + self.local_ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key, loader):
+        """Return the cached record for ``key``, calling ``loader()`` on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._metrics["hits"] += 1
+                return self._copy(entry[1])
+            generation = self._generations.get(key, 0)
+
+        value = self._get_shared(key)
+        if value is not _MISSING:
+            with self._lock:
+                self._metrics["shared_hits"] += 1
+                if self._generations.get(key, 0) == generation:
+                    self._store_local(key, value)
+            return self._copy(value)
+
+        version = self._get_shared_version(key)
+        value = loader()
+        with self._lock:
+            self._metrics["misses"] += 1
+            current = self._generations.get(key, 0) == generation
+            if current:
+                self._store_local(key, value)
+        if current:
+            self._set_shared(key, value, version)
+        return self._copy(value)
+
+    def invalidate(self, key) -> None:
+        """Drop ``key`` here and in the shared layer; call after committing a change."""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._metrics["invalidations"] += 1
+        if self.shared is not None:
+            try:
+                with self.shared.pipeline() as pipe:
+                    pipe.incr(self._version_key(key))
+                    # Outlives any load that could have read the old version
+                    pipe.expire(self._version_key(key), max(1, int(self.ttl)) * 2)
+                    pipe.delete(self._shared_key(key))
+                    pipe.execute()
+            except Exception as e:
+                self._metrics["shared_errors"] += 1
+                print(f"Profile cache invalidation failed for {self.namespace}:{key}: {e}")
+
+    def _get_shared(self, key):
+        if self.shared is None:
+            return _MISSING
+        try:
+            raw = self.shared.get(self._shared_key(key))
+        except Exception:
+            self._metrics["shared_errors"] += 1
+            return _MISSING
+        return _MISSING if raw is None else pickle.loads(raw)
+
+    def _get_shared_version(self, key):
+        if self.shared is None:
+            return None
+        try:
+            return self.shared.get(self._version_key(key))
+        except Exception:
+            self._metrics["shared_errors"] += 1
+            return None
+
+    def _set_shared(self, key, value, version) -> None:
+        """Publish ``value`` unless the key was invalidated since ``version`` was read."""
+        if self.shared is None:
+            return
+        from redis.exceptions import WatchError
+
+        try:
+            with self.shared.pipeline() as pipe:
+                pipe.watch(self._version_key(key))
+                if pipe.get(self._version_key(key)) != version:
+                    return
+                pipe.multi()
+                pipe.set(self._shared_key(key), pickle.dumps(value), ex=max(1, int(self.ttl)))
+                pipe.execute()
+        except WatchError:
+            pass    # invalidated while publishing; the next reader loads it fresh
+        except Exception:
+            self._metrics["shared_errors"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._metrics["hits"] + self._metrics["shared_hits"] + self._metrics["misses"]
+            hit_rate = (self._metrics["hits"] + self._metrics["shared_hits"]) / lookups if lookups else None
+            return {
+                "entries": len(self._entries),
+                "ttl_seconds": self.ttl,
+                "shared": self.shared is not None,
+                "hit_rate": round(hit_rate, 4) if hit_rate is not None else None,
+                **self._metrics,
+            }
+
+
+_shared = _shared_backend(SHARED_URL)
+
+users = ProfileCache("user", shared=_shared)
+health_profiles = ProfileCache("health_profile", shared=_shared)
+
+
+def stats() -> dict:
+    return {"users": users.stats(), "health_profiles": health_profiles.stats()}
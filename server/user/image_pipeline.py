@@ -0,0 +1,289 @@
+"""
+Background re-encoding and thumbnails for pollution report images.
+
+After a report with an image is created its id is handed to a small process
+pool (Pillow work is CPU-bound). A worker downloads the original, applies
+the EXIF orientation, drops all metadata (EXIF, GPS, ICC), writes a
+size-capped display copy plus fixed-width thumbnails under
+``reports/derived/<report_id>/``, and the parent records the keys on the
+report row. Rows that were never processed (worker restart, crash) are
+picked up again by a periodic sweep, up to MAX_ATTEMPTS times.
+
+Originals keep their EXIF (including GPS), so they are stored private and
+only the derived objects are public; the worker also tries to make the
+original private in case it was uploaded public-read by an older release
+(stores without object ACLs skip this). Each sweep claims the rows it
+submits (``image_processing_started_at``, FOR UPDATE SKIP LOCKED), so with
+several web workers a report is rendered once, not once per worker. If a
+pool process dies (OOM, decoder crash) the pool is replaced on the next
+submit instead of failing every later one.
+"""
+
+import io
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from db.db_setup import get_db_connection
+from db.s3_outbox import enqueue_deletions
+
+WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "webp").lower()     # webp | jpeg
+QUALITY = int(os.getenv("IMAGE_QUALITY", 80))
+DISPLAY_MAX_EDGE = int(os.getenv("IMAGE_DISPLAY_MAX_EDGE", 1600))
+THUMBNAIL_WIDTHS = (160, 320, 640)
+SWEEP_SECONDS = float(os.getenv("IMAGE_SWEEP_SECONDS", 300))
+MAX_ATTEMPTS = 3
+# A claim older than this is assumed lost (worker killed mid-render) and swept again
+CLAIM_SECONDS = 600
+
+# Refuse decompression bombs well before they exhaust worker memory
+MAX_IMAGE_PIXELS = 40_000_000
+
+_CONTENT_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg"}
+_EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg"}
+
+
+# ─── Worker process side ──────────────────────────────────────────────────────
+
+def _encode(image, fmt: str) -> bytes:
+    out = io.BytesIO()
+    if fmt == "jpeg":
+        image.convert("RGB").save(out, "JPEG", quality=QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(out, "WEBP", quality=QUALITY, method=4)
+    return out.getvalue()
+
+
+def render_derivatives(original: bytes, fmt: str = OUTPUT_FORMAT) -> dict[str, bytes]:
+    """
+    Return {"display": bytes, "w160": bytes, ...} for an original image.
+    Orientation is applied to the pixels; no metadata is carried over.
+    """
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    with Image.open(io.BytesIO(original)) as source:
+        source.draft("RGB", (DISPLAY_MAX_EDGE, DISPLAY_MAX_EDGE))   # JPEG: decode at reduced scale
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+    image.info = {}     # drop EXIF/XMP/ICC so no encoder can copy them across
+
+    display = image.copy()
+    display.thumbnail((DISPLAY_MAX_EDGE, DISPLAY_MAX_EDGE), Image.Resampling.LANCZOS)
+    outputs = {"display": _encode(display, fmt)}
+
+    for width in THUMBNAIL_WIDTHS:
+        if width >= image.width:
+            thumb = image
+        else:
+            height = max(1, round(image.height * width / image.width))
+            thumb = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        outputs[f"w{width}"] = _encode(thumb, fmt)
+    return outputs
+
+
+def process_report_image(report_id: int, image_key: str, fmt: str = OUTPUT_FORMAT) -> dict:
+    """Runs in a pool process: download, render, upload. Returns the derived keys."""
+    from db import s3
+
+    from botocore.exceptions import ClientError
+
+    client = s3._get_s3_client()
+    original = client.get_object(Bucket=s3.BUCKET, Key=image_key)["Body"].read()
+    # Uploads made before originals were stored private are still public-read.
+    # Best effort: stores without object ACLs (e.g. Supabase) reject the call
+    try:
+        client.put_object_acl(Bucket=s3.BUCKET, Key=image_key, ACL=s3.ORIGINAL_ACL)
+    except ClientError as e:
+        print(f"Could not make original {image_key} private: {e}")
+
+    keys = {}
+    for name, data in render_derivatives(original, fmt).items():
+        key = f"reports/derived/{report_id}/{name}{_EXTENSIONS[fmt]}"
+        client.put_object(
+            Bucket=s3.BUCKET, Key=key, Body=data,
+            ContentType=_CONTENT_TYPES[fmt], ACL="public-read",
+            CacheControl="public, max-age=31536000, immutable",
+        )
+        keys[name] = key
+
+    return {
+        "display_key": keys.pop("display"),
+        "thumbnail_keys": {name[1:]: key for name, key in keys.items()},
+    }
+
+
+# ─── Web worker side ──────────────────────────────────────────────────────────
+
+class ImagePipeline:
+    def __init__(self, workers: int = WORKERS, sweep_seconds: float = SWEEP_SECONDS):
+        self.workers = workers
+        self.sweep_seconds = sweep_seconds
+        self._pool: ProcessPoolExecutor | None = None
+        self._pool_pid: int | None = None
+        self._lock = threading.Lock()
+        self._in_flight: set[int] = set()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._metrics = {"submitted": 0, "processed": 0, "failed": 0, "pool_restarts": 0}
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            # A pool inherited through fork() belongs to the parent
+            if self._pool is None or self._pool_pid != os.getpid():
+                # spawn: the web worker runs threads, which fork() does not copy safely
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                )
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _discard_pool(self, broken: ProcessPoolExecutor) -> None:
+        """Drop ``broken`` so the next submit starts a fresh pool (no-op if already replaced)."""
+        with self._lock:
+            if self._pool is not broken:
+                return
+            self._pool = None
+            self._metrics["pool_restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, report_id: int, image_key: str) -> None:
+        """Queue a report's image for processing (no-op if already queued here)."""
+        with self._lock:
+            if report_id in self._in_flight:
+                return
+            self._in_flight.add(report_id)
+            self._metrics["submitted"] += 1
+        try:
+            pool = self._executor()
+            try:
+                future = pool.submit(process_report_image, report_id, image_key)
+            except BrokenProcessPool:
+                # A worker died since the last submit; one fresh pool, one retry
+                self._discard_pool(pool)
+                pool = self._executor()
+                future = pool.submit(process_report_image, report_id, image_key)
+        except Exception:
+            with self._lock:
+                self._in_flight.discard(report_id)
+            raise
+        future.add_done_callback(lambda f: self._record(report_id, f, pool))
+
+    def _record(self, report_id: int, future, pool: ProcessPoolExecutor | None = None) -> None:
+        try:
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool) and pool is not None:
+                self._discard_pool(pool)
+            with get_db_connection() as conn:
+                cur = conn.cursor()
+                try:
+                    if error is None:
+                        result = future.result()
+                        cur.execute(
+                            """
+                            UPDATE pollution_reports
+                            SET display_key = %s, thumbnail_keys = %s::jsonb,
+                                image_processed_at = now(), image_processing_error = NULL
+                            WHERE id = %s
+                            RETURNING id;
+                            """,
+                            (result["display_key"], json.dumps(result["thumbnail_keys"]), report_id),
+                        )
+                        if cur.fetchone() is None:
+                            # Report deleted while processing; don't leave the derivatives behind
+                            enqueue_deletions(cur, [result["display_key"], *result["thumbnail_keys"].values()])
+                        self._metrics["processed"] += 1
+                    else:
+                        cur.execute(
+                            """
+                            UPDATE pollution_reports
+                            SET image_processing_attempts = image_processing_attempts + 1,
+                                image_processing_error = %s
+                            WHERE id = %s;
+                            """,
+                            (str(error)[:500], report_id),
+                        )
+                        self._metrics["failed"] += 1
+                        print(f"Image processing failed for report {report_id}: {error}")
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    cur.close()
+        except Exception as e:
+            print(f"Could not record image processing result for report {report_id}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(report_id)
+
+    def sweep(self, limit: int = 100) -> int:
+        """
+        Claim and resubmit images that were never processed (older than a
+        couple of minutes). Rows another worker claimed within CLAIM_SECONDS
+        are skipped.
+        """
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(
+                    """
+                    UPDATE pollution_reports SET image_processing_started_at = now()
+                    WHERE id IN (
+                        SELECT id FROM pollution_reports
+                        WHERE image_key IS NOT NULL AND image_processed_at IS NULL
+                          AND image_processing_attempts < %s
+                          AND created_at < now() - interval '2 minutes'
+                          AND (image_processing_started_at IS NULL
+                               OR image_processing_started_at < now() - make_interval(secs => %s))
+                        ORDER BY created_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, image_key;
+                    """,
+                    (MAX_ATTEMPTS, CLAIM_SECONDS, limit),
+                )
+                rows = cur.fetchall()
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+        for report_id, image_key in rows:
+            self.submit(report_id, image_key)
+        return len(rows)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.sweep_seconds):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Image processing sweep failed: {e}")
+
+    def start(self) -> None:
+        """Start the periodic sweep thread (idempotent); the pool itself starts on first use."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="image-pipeline-sweep", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"in_flight": len(self._in_flight), "workers": self.workers, **self._metrics}
+
+
+pipeline = ImagePipeline()
@@ -1,22 +1,28 @@
 
+import psycopg2
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.formparser import parse_form_data
 from user.services import (
     get_user_by_id,
     update_user,
     create_user_message,
     create_pollution_report,
+    issue_upload_token,
     get_reports_by_user,
     delete_pollution_report,
     get_health_profile,
     upsert_health_profile,
 )
-from db.s3 import upload_report_image, delete_report_image
+from db.s3 import MAX_SIZE_BYTES, StreamingImageUpload, UploadRejected, presign_report_upload
+from db.s3_outbox import deletions, schedule_deletion
+from extensions import session_limit
 
 user_bp = Blueprint('user', __name__, url_prefix='/api/user')
 
 
 @user_bp.route('/me', methods=['GET'])
+@session_limit()
 @jwt_required()
 def get_current_user():
     """Return current authenticated user's basic profile."""
@@ -81,6 +87,110 @@ def send_user_message():
 
 # ─── Pollution Reports ────────────────────────────────────────────────────────
 
+# Text fields of the report form are small; the image is spooled, never held in memory
+_REPORT_FORM_MEMORY = 64 * 1024
+
+
+def _parse_report_form():
+    """
+    Parse the multipart body, validating and spooling the single file part for upload.
+    Returns ``(form, upload)`` where ``upload`` is an unfinished
+    StreamingImageUpload or None. Raises UploadRejected / RuntimeError.
+    """
+    uploads: list[StreamingImageUpload] = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        if uploads:
+            raise UploadRejected("Only one image may be attached.")
+        uploads.append(StreamingImageUpload(filename, content_type))
+        return uploads[-1]
+
+    try:
+        _, form, _ = parse_form_data(
+            request.environ,
+            stream_factory=stream_factory,
+            max_form_memory_size=_REPORT_FORM_MEMORY,
+            max_content_length=MAX_SIZE_BYTES + _REPORT_FORM_MEMORY,
+            max_form_parts=8,
+        )
+    except Exception:
+        for upload in uploads:
+            upload.abort()
+        raise
+
+    if uploads and not uploads[0].filename:
+        # Browsers send an empty file part when no image was chosen
+        uploads[0].abort()
+        return form, None
+    return form, uploads[0] if uploads else None
+
+@user_bp.route('/reports/upload-url', methods=['POST'])
+@jwt_required()
+def request_report_upload():
+    """
+    POST /api/user/reports/upload-url
+    JSON body:
+        content_type  (str, required — image/jpeg, image/png, image/webp, ...)
+        size          (int, bytes; required when the server presigns PUT)
+    Returns a presigned POST (url + fields) or PUT (url + headers) for a fresh
+    reports/<uuid> key, plus an upload_token to pass to POST /reports once
+    the upload has finished. Image bytes go straight to storage.
+    """
+    user_id = int(get_jwt_identity())
+    data = request.json or {}
+
+    try:
+        size = int(data['size']) if data.get('size') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "size must be an integer"}), 400
+
+    try:
+        upload = presign_report_upload(str(data.get('content_type', '')), size)
+    except UploadRejected as e:
+        return jsonify({"error": str(e)}), e.status
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 502
+
+    upload["upload_token"] = issue_upload_token(user_id, upload["object_key"], upload["mime_type"])
+    return jsonify({"status": "success", "upload": upload}), 200
+
+
+def _submit_confirmed_report(user_id: int):
+    """JSON variant of POST /reports that confirms a presigned upload."""
+    data = request.json or {}
+
+    description = str(data.get('description', '')).strip()
+    if not description:
+        return jsonify({"error": "description is required"}), 400
+
+    try:
+        lat = float(data.get('lat'))
+        lon = float(data.get('lon'))
+    except (TypeError, ValueError):
+        return jsonify({"error": "lat and lon must be valid numbers"}), 400
+
+    try:
+        report = create_pollution_report(
+            user_id=user_id,
+            description=description,
+            lat=lat,
+            lon=lon,
+            upload_token=data.get('upload_token') or None,
+        )
+    except UploadRejected as e:
+        return jsonify({"error": str(e)}), e.status
+    except psycopg2.errors.UniqueViolation:
+        return jsonify({"error": "This upload is already attached to a report"}), 409
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 502
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    if report.get('created_at'):
+        report['created_at'] = report['created_at'].isoformat()
+    return jsonify({"status": "success", "report": report}), 201
+
+
 @user_bp.route('/reports', methods=['POST'])
 @jwt_required()
 def submit_pollution_report():
@@ -91,40 +201,47 @@ def submit_pollution_report():
         lat          (float, required)
         lon          (float, required)
         image        (file, optional — image/*, max 5 MB)
+    or a JSON body {description, lat, lon, upload_token} confirming an image
+    uploaded through /reports/upload-url.
     """
     user_id = int(get_jwt_identity())
 
-    description = request.form.get('description', '').strip()
+    if request.is_json:
+        return _submit_confirmed_report(user_id)
+
+    # ── Parse form; the optional image is validated and spooled as it arrives ─
+    upload = None
+    try:
+        form, upload = _parse_report_form()
+        image_meta: dict = upload.finish() if upload else {}
+    except UploadRejected as e:
+        if upload:
+            upload.abort()
+        return jsonify({"error": str(e)}), e.status
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 502
+
+    def discard_image():
+        # Fields can follow the file part, so the object may already be stored
+        if image_meta:
+            try:
+                schedule_deletion(image_meta["image_key"])
+            except Exception:
+                pass  # The orphan sweep in db/s3_outbox.py collects it
+
+    def reject(message):
+        discard_image()
+        return jsonify({"error": message}), 400
+
+    description = form.get('description', '').strip()
     if not description:
-        return jsonify({"error": "description is required"}), 400
+        return reject("description is required")
 
     try:
-        lat = float(request.form.get('lat', ''))
-        lon = float(request.form.get('lon', ''))
+        lat = float(form.get('lat', ''))
+        lon = float(form.get('lon', ''))
     except (TypeError, ValueError):
-        return jsonify({"error": "lat and lon must be valid numbers"}), 400
-
-    # ── Optional image upload ─────────────────────────────────────────────────
-    image_meta: dict = {}
-    file = request.files.get('image')
-    if file and file.filename:
-        # Read once so we can measure size without seeking back (stream may not support it)
-        file_bytes = file.read()
-        size = len(file_bytes)
-        mime = file.mimetype or 'image/jpeg'
-
-        try:
-            import io
-            image_meta = upload_report_image(
-                file_stream=io.BytesIO(file_bytes),
-                filename=file.filename,
-                mime_type=mime,
-                size_bytes=size,
-            )
-        except ValueError as e:
-            return jsonify({"error": str(e)}), 422
-        except RuntimeError as e:
-            return jsonify({"error": str(e)}), 502
+        return reject("lat and lon must be valid numbers")
 
     try:
         report = create_pollution_report(
@@ -139,6 +256,7 @@ def submit_pollution_report():
             report['created_at'] = report['created_at'].isoformat()
         return jsonify({"status": "success", "report": report}), 201
     except Exception as e:
+        discard_image()
         return jsonify({"error": str(e)}), 500
 
 
@@ -146,22 +264,29 @@ def submit_pollution_report():
 @jwt_required()
 def list_my_reports():
     """
-    GET /api/user/reports?limit=20&offset=0
-    Returns the paginated list of reports submitted by the authenticated user.
+    GET /api/user/reports?limit=20&cursor=<next_cursor>
+    Returns one page of reports submitted by the authenticated user, newest
+    first. Pass the returned ``next_cursor`` to get the following page; it is
+    null on the last page.
     """
     user_id = int(get_jwt_identity())
     try:
-        limit  = min(int(request.args.get('limit', 20)), 100)
-        offset = int(request.args.get('offset', 0))
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
     except ValueError:
-        return jsonify({"error": "limit and offset must be integers"}), 400
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    try:
+        reports, next_cursor = get_reports_by_user(user_id, limit=limit, cursor=request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    reports = get_reports_by_user(user_id, limit=limit, offset=offset)
     for r in reports:
         if r.get('created_at'):
             r['created_at'] = r['created_at'].isoformat()
 
-    return jsonify({"status": "success", "count": len(reports), "reports": reports}), 200
+    return jsonify({
+        "status": "success", "count": len(reports), "reports": reports, "next_cursor": next_cursor,
+    }), 200
 
 
 @user_bp.route('/reports/<int:report_id>', methods=['DELETE'])
@@ -169,8 +294,8 @@ def list_my_reports():
 def delete_my_report(report_id: int):
     """
     DELETE /api/user/reports/<report_id>
-    Deletes the report and removes the associated image from S3 if present.
-    Only the report's owner can delete it.
+    Deletes the report; the associated image is removed from S3 in the
+    background via the deletion outbox. Only the report's owner can delete it.
     """
     user_id = int(get_jwt_identity())
 
@@ -182,12 +307,9 @@ def delete_my_report(report_id: int):
     if image_key is None:
         return jsonify({"error": "Report not found or access denied"}), 404
 
-    # Clean up S3 object if one was attached
+    # The object key was queued in the same transaction; nudge the drain thread
     if image_key:
-        try:
-            delete_report_image(image_key)
-        except RuntimeError:
-            pass  # Log but don't fail the request — row is already deleted
+        deletions.wake()
 
     return jsonify({"status": "success", "message": "Report deleted"}), 200
 
@@ -195,6 +317,7 @@ def delete_my_report(report_id: int):
 # ─── Health Profile ───────────────────────────────────────────────────────────
 
 @user_bp.route('/health-profile', methods=['GET'])
+@session_limit()
 @jwt_required()
 def get_my_health_profile():
     """
@@ -1,14 +1,28 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from cryptography.fernet import InvalidToken
+
 from db.db_setup import get_db_connection
+from db.queries import execute_named
+from db.s3 import PRESIGN_EXPIRES, UploadRejected, public_url, verify_uploaded_image
+from db.s3_outbox import enqueue_deletions, schedule_deletion
+from extensions import fernet
+from user import cache as user_cache
+from user.image_pipeline import pipeline
 
 def get_user_by_id(user_id):
-    """Return a user dict for the given user_id or None if not found."""
+    """Return a user dict for the given user_id or None if not found (served from the profile cache)."""
+    return user_cache.users.get(user_id, lambda: _load_user(user_id))
+
+
+def _load_user(user_id):
     with get_db_connection() as conn:
         cur = conn.cursor()
         try:
-            cur.execute(
-                "SELECT id, username, email, full_name, phone, age, gender, address, created_at, updated_at FROM users WHERE id=%s;",
-                (user_id,)
-            )
+            execute_named(cur, "user_by_id", (user_id,))
             row = cur.fetchone()
             if not row:
                 return None
@@ -60,6 +74,7 @@ def update_user(user_id, updates: dict):
             cur.execute(query, tuple(values))
             row = cur.fetchone()
             conn.commit()
+            user_cache.users.invalidate(user_id)
             if not row:
                 return None
             keys = [
@@ -105,10 +120,32 @@ def create_user_message(user_id, full_name, email, message):
 REPORT_KEYS = [
     "id", "user_id", "description", "lat", "lon",
     "image_url", "image_key", "image_size", "mime_type",
+    "display_key", "thumbnail_keys",
     "status", "created_at",
 ]
 
 
+def _report_dict(row) -> dict:
+    """Row -> dict, plus public URLs for the derived images once they exist."""
+    report = dict(zip(REPORT_KEYS, row))
+    report["display_url"] = public_url(report["display_key"]) if report["display_key"] else None
+    # The original is private (it still carries EXIF/GPS); only the re-encoded display image is served
+    report["image_url"] = report["display_url"]
+    report["thumbnail_urls"] = {
+        width: public_url(key) for width, key in (report["thumbnail_keys"] or {}).items()
+    }
+    return report
+
+
+def _discard_rejected_upload(object_key: str) -> None:
+    """Queue a rejected direct upload for deletion; no report will ever reference it."""
+    try:
+        schedule_deletion(object_key)
+    except Exception as e:
+        # sweep_orphans still finds it after the grace period
+        print(f"Could not queue deletion of rejected upload {object_key}: {e}")
+
+
 def create_pollution_report(
     user_id: int,
     description: str,
@@ -118,8 +155,29 @@ def create_pollution_report(
     image_key: str | None = None,
     image_size: int | None = None,
     mime_type: str | None = None,
+    upload_token: str | None = None,
 ) -> dict:
-    """Insert a new pollution report row and return the full record."""
+    """
+    Insert a new pollution report row and return the full record.
+
+    ``upload_token`` confirms a direct-to-storage upload (see
+    ``issue_upload_token``): the object is verified via HEAD and its
+    metadata recorded. Raises UploadRejected if it is missing or invalid;
+    an invalid object is queued for deletion first.
+
+    Reports with an image are handed to the background image pipeline,
+    which fills in ``display_key`` and ``thumbnail_keys`` later.
+    """
+    if upload_token:
+        image_key, mime_type = read_upload_token(upload_token, user_id)
+        try:
+            meta = verify_uploaded_image(image_key, mime_type)
+        except UploadRejected as e:
+            if e.status != 409:     # 409: nothing was uploaded under the key yet
+                _discard_rejected_upload(image_key)
+            raise
+        image_url, image_size = meta["image_url"], meta["image_size"]
+
     with get_db_connection() as conn:
         cur = conn.cursor()
         try:
@@ -131,6 +189,7 @@ def create_pollution_report(
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                 RETURNING id, user_id, description, lat, lon,
                           image_url, image_key, image_size, mime_type,
+                          display_key, thumbnail_keys,
                           status, created_at;
                 """,
                 (user_id, description, lat, lon,
@@ -138,74 +197,129 @@ def create_pollution_report(
             )
             row = cur.fetchone()
             conn.commit()
-            return dict(zip(REPORT_KEYS, row))
         except Exception:
             conn.rollback()
             raise
         finally:
             cur.close()
 
+    report = _report_dict(row)
+    if image_key:
+        try:
+            pipeline.submit(report["id"], image_key)
+        except Exception as e:
+            # The periodic sweep retries rows that were never processed
+            print(f"Could not queue image processing for report {report['id']}: {e}")
+    return report
+
+
+def issue_upload_token(user_id: int, object_key: str, mime_type: str) -> str:
+    """Opaque, tamper-proof token binding a presigned upload to its user, key and type."""
+    payload = json.dumps({"u": user_id, "k": object_key, "t": mime_type})
+    return fernet.encrypt(payload.encode()).decode()
+
+
+def read_upload_token(token: str, user_id: int) -> tuple[str, str]:
+    """Return (object_key, mime_type) from a token issued to ``user_id``."""
+    try:
+        # The client may confirm a little after the presigned URL itself expires
+        payload = json.loads(fernet.decrypt(token.encode(), ttl=PRESIGN_EXPIRES + 300))
+    except (InvalidToken, ValueError) as exc:
+        raise UploadRejected("Invalid or expired upload token.", 400) from exc
+    if payload.get("u") != user_id:
+        raise UploadRejected("Upload token was issued to another user.", 403)
+    return payload["k"], payload["t"]
+
+
+def encode_cursor(report: dict) -> str:
+    """Opaque keyset cursor for the page after ``report``: its (created_at, id)."""
+    payload = json.dumps([report["created_at"].isoformat(), report["id"]])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
 
-def get_reports_by_user(user_id: int, limit: int = 20, offset: int = 0) -> list[dict]:
-    """Return a paginated list of pollution reports for a user, newest first."""
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Inverse of ``encode_cursor`` (raises ValueError for a malformed cursor)."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, report_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(report_id)
+    except (TypeError, ValueError, binascii.Error) as exc:
+        raise ValueError("Invalid cursor.") from exc
+
+
+def _page(rows: list, limit: int) -> tuple[list[dict], str | None]:
+    """Rows fetched with LIMIT limit+1 -> (reports, next_cursor or None on the last page)."""
+    reports = [_report_dict(r) for r in rows[:limit]]
+    next_cursor = encode_cursor(reports[-1]) if len(rows) > limit else None
+    return reports, next_cursor
+
+
+def get_reports_by_user(user_id: int, limit: int = 20, cursor: str | None = None) -> tuple[list[dict], str | None]:
+    """
+    Return one page of a user's reports, newest first, and the cursor for the
+    next page. Keyset pagination: every page is an index range scan, however deep.
+    """
     with get_db_connection() as conn:
         cur = conn.cursor()
         try:
-            cur.execute(
-                """
-                SELECT id, user_id, description, lat, lon,
-                       image_url, image_key, image_size, mime_type,
-                       status, created_at
-                FROM pollution_reports
-                WHERE user_id = %s
-                ORDER BY created_at DESC
-                LIMIT %s OFFSET %s;
-                """,
-                (user_id, limit, offset),
-            )
-            rows = cur.fetchall()
-            return [dict(zip(REPORT_KEYS, r)) for r in rows]
+            if cursor:
+                created_at, report_id = decode_cursor(cursor)
+                execute_named(cur, "reports_by_user_after", (user_id, created_at, report_id, limit + 1))
+            else:
+                execute_named(cur, "reports_by_user", (user_id, limit + 1))
+            return _page(cur.fetchall(), limit)
         finally:
             cur.close()
 
 
-def get_all_reports(limit: int = 50, offset: int = 0) -> list[dict]:
-    """Return all pollution reports (admin use), newest first."""
+def get_all_reports(limit: int = 50, cursor: str | None = None) -> tuple[list[dict], str | None]:
+    """Return one page of all pollution reports (admin use), newest first, and the next cursor."""
+    after, params = "", []
+    if cursor:
+        after, params = "WHERE (created_at, id) < (%s, %s)", list(decode_cursor(cursor))
     with get_db_connection() as conn:
         cur = conn.cursor()
         try:
             cur.execute(
-                """
+                f"""
                 SELECT id, user_id, description, lat, lon,
                        image_url, image_key, image_size, mime_type,
+                       display_key, thumbnail_keys,
                        status, created_at
                 FROM pollution_reports
-                ORDER BY created_at DESC
-                LIMIT %s OFFSET %s;
+                {after}
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s;
                 """,
-                (limit, offset),
+                params + [limit + 1],
             )
-            rows = cur.fetchall()
-            return [dict(zip(REPORT_KEYS, r)) for r in rows]
+            return _page(cur.fetchall(), limit)
         finally:
             cur.close()
 
 
 def delete_pollution_report(report_id: int, user_id: int) -> str | None:
     """
-    Hard-delete a report owned by user_id.
-    Returns the image_key so the caller can clean up S3, or None if not found.
+    Hard-delete a report owned by user_id and queue its image and derived
+    images for deletion from S3 in the same transaction (see db/s3_outbox.py).
+    Returns the image_key ('' when there was no image), or None if not found.
     """
     with get_db_connection() as conn:
         cur = conn.cursor()
         try:
             cur.execute(
-                "DELETE FROM pollution_reports WHERE id=%s AND user_id=%s RETURNING image_key;",
+                """
+                DELETE FROM pollution_reports WHERE id=%s AND user_id=%s
+                RETURNING image_key, display_key, thumbnail_keys;
+                """,
                 (report_id, user_id),
             )
             row = cur.fetchone()
+            if row:
+                image_key, display_key, thumbnail_keys = row
+                enqueue_deletions(cur, [image_key, display_key, *(thumbnail_keys or {}).values()])
             conn.commit()
-            return row[0] if row else None
+            return (row[0] or "") if row else None
         except Exception:
             conn.rollback()
             raise
@@ -227,24 +341,15 @@ HEALTH_PROFILE_KEYS = [
 
 
 def get_health_profile(user_id: int):
-    """Return the health profile for a user or None if not yet created."""
+    """Return the health profile for a user or None if not yet created (served from the profile cache)."""
+    return user_cache.health_profiles.get(user_id, lambda: _load_health_profile(user_id))
+
+
+def _load_health_profile(user_id: int):
     with get_db_connection() as conn:
         cur = conn.cursor()
         try:
-            cur.execute(
-                """
-                SELECT id, user_id,
-                       has_asthma, has_copd, has_allergies,
-                       has_heart_condition,
-                       is_pregnant, takes_inhaler,
-                       smoking_status, fitness_level, outdoor_exposure,
-                       breathing_difficulty, custom_notes,
-                       created_at, updated_at
-                FROM user_health_profiles
-                WHERE user_id = %s;
-                """,
-                (user_id,),
-            )
+            execute_named(cur, "health_profile_by_user", (user_id,))
             row = cur.fetchone()
             return dict(zip(HEALTH_PROFILE_KEYS, row)) if row else None
         finally:
@@ -288,6 +393,7 @@ def upsert_health_profile(user_id: int, data: dict) -> dict:
             )
             row = cur.fetchone()
             conn.commit()
+            user_cache.health_profiles.invalidate(user_id)
             return dict(zip(HEALTH_PROFILE_KEYS, row))
         except Exception:
             conn.rollback()